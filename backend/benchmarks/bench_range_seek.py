@@ -0,0 +1,99 @@
+"""Bytes moved by a seek-heavy media playback session, with and without ranges.
+
+Uploads a synthetic MP4-sized file, then replays a player that seeks to
+random positions and reads a window at each one. The "full" client ignores
+ranges (what every seek cost before /download honoured Range), the "range"
+client sends Range + If-Range, and a final revisit uses If-None-Match.
+
+    cd backend && python benchmarks/bench_range_seek.py [--size-mb 64] [--seeks 40]
+"""
+import argparse
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+MP4_HEADER = b'\x00\x00\x00\x18ftypmp42\x00\x00\x00\x00mp42isom'
+
+
+def setup(size):
+    tmp = tempfile.mkdtemp(prefix='bench_range_')
+    os.environ.update({
+        'SECRET_KEY': 'bench-secret-key-not-for-production-use-0000',
+        'DATABASE_URL': 'sqlite:///:memory:',
+        'UPLOAD_FOLDER': tmp,
+        'RATELIMIT_ENABLED': 'False',
+        'TASK_WORKERS': '0',
+    })
+    from werkzeug.security import generate_password_hash
+    from src import create_app
+    from src.auth import generate_access_token
+    from src.extensions import db
+    from src.models import User
+
+    app = create_app()
+    app.config['MAX_CONTENT_LENGTH'] = size + 1024 * 1024
+    ctx = app.app_context()
+    ctx.push()
+    db.create_all()
+    user = User(first_name='Bench', last_name='User', email='bench@cloudspace.test',
+                password_hash=generate_password_hash('x'), is_verified=True,
+                storage_limit=size * 4)
+    db.session.add(user)
+    db.session.commit()
+    headers = {'Authorization': f'Bearer {generate_access_token(user.id)}'}
+
+    client = app.test_client()
+    body = MP4_HEADER + os.urandom(size - len(MP4_HEADER))
+    res = client.post('/api/files/upload', headers=headers, content_type='multipart/form-data',
+                      data={'file': (io.BytesIO(body), 'clip.mp4')})
+    assert res.status_code == 201, res.get_json()
+    return client, headers, res.get_json()['id']
+
+
+def run(client, headers, file_id, size, seeks, window):
+    url = f'/api/files/{file_id}/download?inline=true'
+    rng = random.Random(42)
+    offsets = [rng.randrange(0, size - window) for _ in range(seeks)]
+
+    start = time.perf_counter()
+    full = 0
+    for _ in offsets:
+        full += len(client.get(url, headers=headers).get_data())
+    full_time = time.perf_counter() - start
+
+    first = client.get(url, headers={**headers, 'Range': 'bytes=0-0'})
+    etag = first.headers['ETag']
+    start = time.perf_counter()
+    ranged = 0
+    for offset in offsets:
+        res = client.get(url, headers={**headers, 'Range': f'bytes={offset}-{offset + window - 1}', 'If-Range': etag})
+        assert res.status_code == 206
+        ranged += len(res.get_data())
+    range_time = time.perf_counter() - start
+
+    res = client.get(url, headers={**headers, 'If-None-Match': etag})
+    assert res.status_code == 304
+    revisit = len(res.get_data())
+
+    mb = 1024 * 1024
+    print(f'file {size / mb:.0f} MB, {seeks} seeks of {window / mb:.1f} MB')
+    print(f'  full refetch     : {full / mb:8.1f} MB  {full_time:6.2f}s')
+    print(f'  range + If-Range : {ranged / mb:8.1f} MB  {range_time:6.2f}s')
+    print(f'  saved            : {(1 - ranged / full) * 100:8.1f} %')
+    print(f'  revisit with If-None-Match: {res.status_code}, {revisit} bytes')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size-mb', type=int, default=64)
+    parser.add_argument('--seeks', type=int, default=40)
+    parser.add_argument('--window-mb', type=float, default=2)
+    args = parser.parse_args()
+    size = args.size_mb * 1024 * 1024
+    client, headers, file_id = setup(size)
+    run(client, headers, file_id, size, args.seeks, int(args.window_mb * 1024 * 1024))
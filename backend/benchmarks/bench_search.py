@@ -0,0 +1,101 @@
+"""Filename search latency at scale: ILIKE scan vs the search index.
+
+Seeds one user with --files rows (names drawn from a small vocabulary plus
+a serial, like a photo/camera dump) in a throw-away SQLite file, then times
+/api/search-style queries with the old ILIKE scan and with the configured
+backend (FTS5 trigram on SQLite). Point DATABASE_URL at an empty Postgres
+database to measure the pg_trgm backend instead.
+
+    cd backend && python benchmarks/bench_search.py [--files 1000000] [--repeat 5]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+WORDS = ['invoice', 'report', 'budget', 'photo', 'scan', 'draft', 'notes', 'contract',
+         'summary', 'backup', 'export', 'meeting', 'design', 'final', 'holiday', 'receipt']
+EXTS = ['.pdf', '.jpg', '.txt', '.docx', '.png', '.xlsx']
+QUERIES = ['budget', 'holiday 2019', 'IMG_0042', 'receipt_1234', 'zzz-no-match']
+
+
+def setup(n):
+    tmp = tempfile.mkdtemp(prefix='bench_search_')
+    os.environ.setdefault('DATABASE_URL', f'sqlite:///{tmp}/bench.db')
+    os.environ.update({
+        'SECRET_KEY': 'bench-secret-key-not-for-production-use-0000',
+        'UPLOAD_FOLDER': tmp,
+        'RATELIMIT_ENABLED': 'False',
+        'TASK_WORKERS': '0',
+    })
+    from werkzeug.security import generate_password_hash
+    from src import create_app
+    from src.extensions import db
+    from src.models import File, User
+
+    app = create_app()
+    ctx = app.app_context()
+    ctx.push()
+    user = User(first_name='Bench', last_name='User', email=f'{uuid.uuid4().hex}@cloudspace.test',
+                password_hash=generate_password_hash('x'), is_verified=True)
+    db.session.add(user)
+    db.session.commit()
+
+    rng = random.Random(7)
+    start = time.perf_counter()
+    batch = []
+    for i in range(n):
+        if i % 4 == 0:
+            name = f'IMG_{i:07d}.jpg'
+        else:
+            name = f'{rng.choice(WORDS)} {rng.choice(WORDS)} {rng.randrange(1990, 2030)}_{i}{rng.choice(EXTS)}'
+        file_id = str(uuid.uuid4())
+        batch.append({'id': file_id, 'name': name, 'owner_id': user.id, 'path': f'/{file_id}/',
+                      'icon': 'description', 'icon_color': 'text-slate-500', 'size': 1, 'is_folder': False,
+                      'is_trashed': False})
+        if len(batch) == 20000:
+            db.session.execute(File.__table__.insert(), batch)
+            batch = []
+    if batch:
+        db.session.execute(File.__table__.insert(), batch)
+    db.session.commit()
+    print(f'seeded {n} files in {time.perf_counter() - start:.1f}s ({db.engine.dialect.name})')
+    return user.id
+
+
+def timed(owner_id, index, q, repeat):
+    from src.extensions import db
+    from src.models import File
+    query = index.apply(File.query.filter(File.owner_id == owner_id, File.is_trashed == False), q)
+    query = query.order_by(*index.rank(q)).limit(30)
+    best = float('inf')
+    for _ in range(repeat):
+        db.session.expunge_all()
+        start = time.perf_counter()
+        rows = query.all()
+        best = min(best, time.perf_counter() - start)
+    return best, len(rows)
+
+
+def run(owner_id, repeat):
+    from src import search_index
+    scan, index = search_index.ScanSearch(), search_index.backend()
+    print(f'{"query":16} {"scan ms":>10} {type(index).__name__ + " ms":>18} {"hits":>6}')
+    for q in QUERIES:
+        scan_time, scan_hits = timed(owner_id, scan, q, repeat)
+        index_time, index_hits = timed(owner_id, index, q, repeat)
+        assert scan_hits == index_hits, (q, scan_hits, index_hits)
+        print(f'{q:16} {scan_time * 1000:10.1f} {index_time * 1000:18.1f} {index_hits:6}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--files', type=int, default=1_000_000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    run(setup(args.files), args.repeat)
@@ -0,0 +1,49 @@
+"""add resumable upload sessions
+
+Revision ID: 002_add_upload_sessions
+Revises: 001_add_sidebar_hover
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '002_add_upload_sessions'
+down_revision = '001_add_sidebar_hover'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # create_app() runs db.create_all() before migrations, so the tables may exist
+    if 'upload_session' in sa.inspect(op.get_bind()).get_table_names():
+        return
+
+    op.create_table(
+        'upload_session',
+        sa.Column('id', sa.String(36), primary_key=True),
+        sa.Column('user_id', sa.String(36), sa.ForeignKey('user.id'), nullable=False),
+        sa.Column('parent_id', sa.String(36), nullable=True),
+        sa.Column('name', sa.String(255), nullable=False),
+        sa.Column('size', sa.BigInteger(), nullable=False),
+        sa.Column('storage_path', sa.String(500), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('expires_at', sa.DateTime(), nullable=False),
+    )
+    op.create_index('ix_upload_session_user_id', 'upload_session', ['user_id'])
+    op.create_table(
+        'upload_chunk',
+        sa.Column('id', sa.String(36), primary_key=True),
+        sa.Column('session_id', sa.String(36), sa.ForeignKey('upload_session.id'), nullable=False),
+        sa.Column('offset', sa.BigInteger(), nullable=False),
+        sa.Column('length', sa.BigInteger(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+    )
+    op.create_index('ix_upload_chunk_session_id', 'upload_chunk', ['session_id'])
+
+
+def downgrade():
+    op.drop_index('ix_upload_chunk_session_id', table_name='upload_chunk')
+    op.drop_table('upload_chunk')
+    op.drop_index('ix_upload_session_user_id', table_name='upload_session')
+    op.drop_table('upload_session')
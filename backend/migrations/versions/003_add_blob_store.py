@@ -0,0 +1,37 @@
+"""add content-addressed blob store
+
+Revision ID: 003_add_blob_store
+Revises: 002_add_upload_sessions
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '003_add_blob_store'
+down_revision = '002_add_upload_sessions'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    # create_app() runs db.create_all() before migrations, so the table may exist
+    if 'blob' not in inspector.get_table_names():
+        op.create_table(
+            'blob',
+            sa.Column('sha256', sa.String(64), primary_key=True),
+            sa.Column('size', sa.BigInteger(), nullable=False),
+            sa.Column('storage_path', sa.String(500), nullable=False),
+            sa.Column('ref_count', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+        )
+    if 'sha256' not in {c['name'] for c in inspector.get_columns('file')}:
+        op.add_column('file', sa.Column('sha256', sa.String(64), nullable=True))
+        op.create_index('ix_file_sha256', 'file', ['sha256'])
+
+
+def downgrade():
+    op.drop_index('ix_file_sha256', table_name='file')
+    op.drop_column('file', 'sha256')
+    op.drop_table('blob')
@@ -0,0 +1,28 @@
+"""persist file checksums
+
+Revision ID: 004_add_file_checksums
+Revises: 003_add_blob_store
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '004_add_file_checksums'
+down_revision = '003_add_blob_store'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    conn = op.get_bind()
+    if 'sha1' not in {c['name'] for c in sa.inspect(conn).get_columns('file')}:
+        op.add_column('file', sa.Column('sha1', sa.String(40), nullable=True))
+
+    # Existing rows keep a NULL sha1: hashing every stored file here would run
+    # inside the single migration transaction at container start. The details
+    # endpoint fills them in the background, or run `flask fill-checksums`.
+
+
+def downgrade():
+    op.drop_column('file', 'sha1')
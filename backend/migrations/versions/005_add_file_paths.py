@@ -0,0 +1,46 @@
+"""add materialized folder paths to file
+
+Revision ID: 005_add_file_paths
+Revises: 004_add_file_checksums
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = '005_add_file_paths'
+down_revision = '004_add_file_checksums'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+    if 'path' not in {c['name'] for c in inspector.get_columns('file')}:
+        op.add_column('file', sa.Column(
+            'path', sa.Text().with_variant(postgresql.TEXT(collation='C'), 'postgresql'), nullable=True,
+        ))
+    if 'ix_file_owner_path' not in {i['name'] for i in inspector.get_indexes('file')}:
+        op.create_index('ix_file_owner_path', 'file', ['owner_id', 'path'])
+
+    # Fill one tree level per statement, roots (and orphans) first
+    conn.execute(sa.text(
+        "UPDATE file SET path = '/' || id || '/' WHERE path IS NULL AND "
+        "(parent_id IS NULL OR parent_id NOT IN (SELECT id FROM file))"
+    ))
+    while True:
+        result = conn.execute(sa.text(
+            "UPDATE file SET path = ("
+            "  SELECT p.path FROM file p WHERE p.id = file.parent_id"
+            ") || id || '/' "
+            "WHERE path IS NULL AND parent_id IN (SELECT id FROM file WHERE path IS NOT NULL)"
+        ))
+        if not result.rowcount:
+            break
+
+
+def downgrade():
+    op.drop_index('ix_file_owner_path', table_name='file')
+    op.drop_column('file', 'path')
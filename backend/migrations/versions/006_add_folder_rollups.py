@@ -0,0 +1,46 @@
+"""add folder rollup counters and backfill them
+
+Revision ID: 006_add_folder_rollups
+Revises: 005_add_file_paths
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '006_add_folder_rollups'
+down_revision = '005_add_file_paths'
+branch_labels = None
+depends_on = None
+
+COLUMNS = (
+    ('child_count', sa.Integer()),
+    ('tree_file_count', sa.Integer()),
+    ('tree_size', sa.BigInteger()),
+)
+
+
+def upgrade():
+    conn = op.get_bind()
+    existing = {c['name'] for c in sa.inspect(conn).get_columns('file')}
+    for name, type_ in COLUMNS:
+        if name not in existing:
+            op.add_column('file', sa.Column(name, type_, nullable=False, server_default='0'))
+
+    # Same definitions as src/tree.py: live content only, subtree by path range
+    conn.execute(sa.text(
+        "UPDATE file SET "
+        "child_count = (SELECT count(*) FROM file c WHERE c.parent_id = file.id AND c.is_trashed = :no), "
+        "tree_file_count = (SELECT count(*) FROM file d WHERE d.owner_id = file.owner_id "
+        "  AND d.path > file.path AND d.path < substr(file.path, 1, length(file.path) - 1) || '0' "
+        "  AND d.is_trashed = :no AND d.is_folder = :no), "
+        "tree_size = (SELECT coalesce(sum(d.size), 0) FROM file d WHERE d.owner_id = file.owner_id "
+        "  AND d.path > file.path AND d.path < substr(file.path, 1, length(file.path) - 1) || '0' "
+        "  AND d.is_trashed = :no AND d.is_folder = :no) "
+        "WHERE is_folder = :yes"
+    ), {'no': False, 'yes': True})
+
+
+def downgrade():
+    for name, _ in reversed(COLUMNS):
+        op.drop_column('file', name)
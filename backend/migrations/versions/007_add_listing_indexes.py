@@ -0,0 +1,32 @@
+"""add composite indexes for keyset-paginated folder listings
+
+Revision ID: 007_add_listing_indexes
+Revises: 006_add_folder_rollups
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '007_add_listing_indexes'
+down_revision = '006_add_folder_rollups'
+branch_labels = None
+depends_on = None
+
+INDEXES = {
+    'ix_file_listing_name': 'name',
+    'ix_file_listing_size': 'size',
+    'ix_file_listing_updated': 'updated_at',
+}
+
+
+def upgrade():
+    existing = {i['name'] for i in sa.inspect(op.get_bind()).get_indexes('file')}
+    for name, column in INDEXES.items():
+        if name not in existing:
+            op.create_index(name, 'file', ['owner_id', 'parent_id', 'is_trashed', 'is_folder', column, 'id'])
+
+
+def downgrade():
+    for name in INDEXES:
+        op.drop_index(name, table_name='file')
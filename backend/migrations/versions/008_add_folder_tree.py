@@ -0,0 +1,30 @@
+"""add user.tree_version and the folder-tree index
+
+Revision ID: 008_add_folder_tree
+Revises: 007_add_listing_indexes
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '008_add_folder_tree'
+down_revision = '007_add_listing_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if 'tree_version' not in {c['name'] for c in inspector.get_columns('user')}:
+        op.add_column('user', sa.Column('tree_version', sa.Integer(), nullable=False, server_default='0'))
+    if 'ix_file_folder_tree' not in {i['name'] for i in inspector.get_indexes('file')}:
+        op.create_index(
+            'ix_file_folder_tree', 'file',
+            ['owner_id', 'is_folder', 'is_trashed', 'path', 'parent_id', 'name', 'id'],
+        )
+
+
+def downgrade():
+    op.drop_index('ix_file_folder_tree', table_name='file')
+    op.drop_column('user', 'tree_version')
@@ -0,0 +1,65 @@
+"""add the filename search index (FTS5 trigram on SQLite, pg_trgm on PostgreSQL)
+
+Revision ID: 009_add_search_index
+Revises: 008_add_folder_tree
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlite3
+
+revision = '009_add_search_index'
+down_revision = '008_add_folder_tree'
+branch_labels = None
+depends_on = None
+
+# Same DDL as src/search_index.py; every statement is idempotent
+SQLITE_DDL = (
+    'CREATE TABLE IF NOT EXISTS file_search_docs ('
+    ' docid INTEGER PRIMARY KEY, file_id VARCHAR(36) NOT NULL UNIQUE, name TEXT NOT NULL)',
+    "CREATE VIRTUAL TABLE IF NOT EXISTS file_search USING fts5("
+    " name, content='file_search_docs', content_rowid='docid', tokenize='trigram')",
+    'CREATE TRIGGER IF NOT EXISTS file_search_docs_ai AFTER INSERT ON file_search_docs BEGIN'
+    ' INSERT INTO file_search(rowid, name) VALUES (new.docid, new.name); END',
+    'CREATE TRIGGER IF NOT EXISTS file_search_docs_ad AFTER DELETE ON file_search_docs BEGIN'
+    " INSERT INTO file_search(file_search, rowid, name) VALUES ('delete', old.docid, old.name); END",
+    'CREATE TRIGGER IF NOT EXISTS file_search_docs_au AFTER UPDATE OF name ON file_search_docs BEGIN'
+    " INSERT INTO file_search(file_search, rowid, name) VALUES ('delete', old.docid, old.name);"
+    ' INSERT INTO file_search(rowid, name) VALUES (new.docid, new.name); END',
+    'CREATE TRIGGER IF NOT EXISTS file_search_ai AFTER INSERT ON file BEGIN'
+    ' INSERT INTO file_search_docs(file_id, name) VALUES (new.id, new.name); END',
+    'CREATE TRIGGER IF NOT EXISTS file_search_au AFTER UPDATE OF name ON file BEGIN'
+    ' UPDATE file_search_docs SET name = new.name WHERE file_id = old.id; END',
+    'CREATE TRIGGER IF NOT EXISTS file_search_ad AFTER DELETE ON file BEGIN'
+    ' DELETE FROM file_search_docs WHERE file_id = old.id; END',
+    'INSERT INTO file_search_docs(file_id, name) SELECT id, name FROM file'
+    ' WHERE id NOT IN (SELECT file_id FROM file_search_docs)',
+)
+
+POSTGRES_DDL = (
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX IF NOT EXISTS ix_file_name_trgm ON file USING gin (name gin_trgm_ops)',
+)
+
+
+def upgrade():
+    conn = op.get_bind()
+    if conn.dialect.name == 'sqlite' and sqlite3.sqlite_version_info >= (3, 34):
+        statements = SQLITE_DDL
+    elif conn.dialect.name == 'postgresql':
+        statements = POSTGRES_DDL
+    else:
+        return
+    for statement in statements:
+        conn.exec_driver_sql(statement)
+
+
+def downgrade():
+    conn = op.get_bind()
+    if conn.dialect.name == 'sqlite':
+        for trigger in ('file_search_ai', 'file_search_au', 'file_search_ad'):
+            conn.exec_driver_sql(f'DROP TRIGGER IF EXISTS {trigger}')
+        conn.exec_driver_sql('DROP TABLE IF EXISTS file_search')
+        conn.exec_driver_sql('DROP TABLE IF EXISTS file_search_docs')
+    elif conn.dialect.name == 'postgresql':
+        conn.exec_driver_sql('DROP INDEX IF EXISTS ix_file_name_trgm')
@@ -0,0 +1,54 @@
+"""add the full-text index over file contents
+
+Revision ID: 010_add_content_index
+Revises: 009_add_search_index
+Create Date: 2026-10-18
+
+Existing files are indexed afterwards with `flask index-content`.
+"""
+from alembic import op
+
+revision = '010_add_content_index'
+down_revision = '009_add_search_index'
+branch_labels = None
+depends_on = None
+
+# Same DDL as src/content_index.py; every statement is idempotent
+SQLITE_DDL = (
+    'CREATE TABLE IF NOT EXISTS file_content_docs ('
+    ' docid INTEGER PRIMARY KEY, file_id VARCHAR(36) NOT NULL, seq INTEGER NOT NULL,'
+    ' body TEXT NOT NULL, UNIQUE (file_id, seq))',
+    "CREATE VIRTUAL TABLE IF NOT EXISTS file_content USING fts5("
+    " body, content='file_content_docs', content_rowid='docid', tokenize='unicode61 remove_diacritics 2')",
+    'CREATE TRIGGER IF NOT EXISTS file_content_docs_ai AFTER INSERT ON file_content_docs BEGIN'
+    ' INSERT INTO file_content(rowid, body) VALUES (new.docid, new.body); END',
+    'CREATE TRIGGER IF NOT EXISTS file_content_docs_ad AFTER DELETE ON file_content_docs BEGIN'
+    " INSERT INTO file_content(file_content, rowid, body) VALUES ('delete', old.docid, old.body); END",
+    'CREATE TRIGGER IF NOT EXISTS file_content_ad AFTER DELETE ON file BEGIN'
+    ' DELETE FROM file_content_docs WHERE file_id = old.id; END',
+)
+
+POSTGRES_DDL = (
+    'CREATE TABLE IF NOT EXISTS file_content ('
+    ' file_id VARCHAR(36) NOT NULL REFERENCES file (id) ON DELETE CASCADE, seq INTEGER NOT NULL,'
+    " body TEXT NOT NULL, tsv tsvector GENERATED ALWAYS AS (to_tsvector('simple', body)) STORED,"
+    ' PRIMARY KEY (file_id, seq))',
+    'CREATE INDEX IF NOT EXISTS ix_file_content_tsv ON file_content USING gin (tsv)',
+)
+
+
+def upgrade():
+    conn = op.get_bind()
+    statements = {'sqlite': SQLITE_DDL, 'postgresql': POSTGRES_DDL}.get(conn.dialect.name, ())
+    for statement in statements:
+        conn.exec_driver_sql(statement)
+
+
+def downgrade():
+    conn = op.get_bind()
+    if conn.dialect.name == 'sqlite':
+        conn.exec_driver_sql('DROP TRIGGER IF EXISTS file_content_ad')
+        conn.exec_driver_sql('DROP TABLE IF EXISTS file_content')
+        conn.exec_driver_sql('DROP TABLE IF EXISTS file_content_docs')
+    elif conn.dialect.name == 'postgresql':
+        conn.exec_driver_sql('DROP TABLE IF EXISTS file_content')
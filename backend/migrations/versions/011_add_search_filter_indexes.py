@@ -0,0 +1,52 @@
+"""add indexes for subtree and attribute search filters
+
+Revision ID: 011_add_search_filter_indexes
+Revises: 010_add_content_index
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '011_add_search_filter_indexes'
+down_revision = '010_add_content_index'
+branch_labels = None
+depends_on = None
+
+FILE_INDEXES = {
+    'ix_file_search_path': ['path'],
+    'ix_file_search_size': ['size'],
+    'ix_file_search_updated': ['updated_at'],
+    'ix_file_search_created': ['created_at'],
+    'ix_file_search_mime': ['mime_type'],
+    # Flags are not selective enough on their own; updated_at keeps the
+    # index ahead of ix_file_search_updated for the default ordering
+    'ix_file_search_starred': ['is_starred', 'updated_at'],
+    'ix_file_search_locked': ['is_locked', 'updated_at'],
+}
+# Prefixes of the indexes above
+REDUNDANT = {
+    'ix_file_owner_trashed': ['owner_id', 'is_trashed'],
+    'ix_file_owner_starred': ['owner_id', 'is_starred'],
+}
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    existing = {i['name'] for i in inspector.get_indexes('file')}
+    for name, columns in FILE_INDEXES.items():
+        if name not in existing:
+            op.create_index(name, 'file', ['owner_id', 'is_trashed', *columns])
+    for name in REDUNDANT:
+        if name in existing:
+            op.drop_index(name, table_name='file')
+    if 'ix_shared_file_with' not in {i['name'] for i in inspector.get_indexes('shared_file')}:
+        op.create_index('ix_shared_file_with', 'shared_file', ['shared_with_id', 'shared_by_id', 'file_id'])
+
+
+def downgrade():
+    op.drop_index('ix_shared_file_with', table_name='shared_file')
+    for name, columns in REDUNDANT.items():
+        op.create_index(name, 'file', columns)
+    for name in FILE_INDEXES:
+        op.drop_index(name, table_name='file')
@@ -0,0 +1,51 @@
+"""add per-category storage usage counters
+
+Revision ID: 012_add_storage_usage
+Revises: 011_add_search_filter_indexes
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '012_add_storage_usage'
+down_revision = '011_add_search_filter_indexes'
+branch_labels = None
+depends_on = None
+
+# Same rules as src.usage.STORAGE_CATEGORIES, first match wins
+CATEGORY = """
+    CASE
+        WHEN mime_type LIKE 'image/%' THEN 'Images'
+        WHEN mime_type LIKE 'video/%' THEN 'Videos'
+        WHEN mime_type LIKE 'application/pdf%' OR mime_type LIKE 'application/msword%'
+          OR mime_type LIKE 'application/vnd.openxmlformats-officedocument.wordprocessingml%'
+          OR mime_type LIKE 'text/%' THEN 'Documents'
+        WHEN mime_type LIKE 'application/vnd.ms-excel%'
+          OR mime_type LIKE 'application/vnd.openxmlformats-officedocument.spreadsheetml%' THEN 'Spreadsheets'
+        ELSE 'Other'
+    END
+"""
+
+
+def upgrade():
+    bind = op.get_bind()
+    if 'storage_usage' not in sa.inspect(bind).get_table_names():
+        op.create_table(
+            'storage_usage',
+            sa.Column('user_id', sa.String(36), sa.ForeignKey('user.id'), primary_key=True),
+            sa.Column('category', sa.String(20), primary_key=True),
+            sa.Column('bytes', sa.BigInteger(), nullable=False, server_default='0'),
+            sa.Column('files', sa.Integer(), nullable=False, server_default='0'),
+        )
+    if bind.execute(sa.text('SELECT 1 FROM storage_usage LIMIT 1')).first() is None:
+        bind.execute(sa.text(
+            'INSERT INTO storage_usage (user_id, category, bytes, files)'
+            ' SELECT owner_id, category, COALESCE(SUM(size), 0), COUNT(*)'
+            f' FROM (SELECT owner_id, size, {CATEGORY} AS category FROM file WHERE is_folder = :false) AS f'
+            ' GROUP BY owner_id, category'
+        ), {'false': False})
+
+
+def downgrade():
+    op.drop_table('storage_usage')
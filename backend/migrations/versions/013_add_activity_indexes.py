@@ -0,0 +1,31 @@
+"""add composite indexes for keyset-paginated activity history
+
+Revision ID: 013_add_activity_indexes
+Revises: 012_add_storage_usage
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '013_add_activity_indexes'
+down_revision = '012_add_storage_usage'
+branch_labels = None
+depends_on = None
+
+INDEXES = {
+    'ix_activity_user_created': ['user_id', 'created_at', 'id'],
+    'ix_activity_user_action': ['user_id', 'action', 'created_at', 'id'],
+}
+
+
+def upgrade():
+    existing = {i['name'] for i in sa.inspect(op.get_bind()).get_indexes('activity_log')}
+    for name, columns in INDEXES.items():
+        if name not in existing:
+            op.create_index(name, 'activity_log', columns)
+
+
+def downgrade():
+    for name in INDEXES:
+        op.drop_index(name, table_name='activity_log')
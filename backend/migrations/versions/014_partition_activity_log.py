@@ -0,0 +1,90 @@
+"""partition activity_log by month on PostgreSQL
+
+Revision ID: 014_partition_activity_log
+Revises: 013_add_activity_indexes
+Create Date: 2026-10-18
+
+The table is rebuilt as a range-partitioned table with one partition per
+month holding rows, a default partition and the next MONTHS_AHEAD months;
+`flask archive-activity` maintains them from then on. SQLite keeps its
+single table, bounded by the archive job alone.
+"""
+from datetime import datetime, timedelta, timezone
+from alembic import op
+import sqlalchemy as sa
+
+revision = '014_partition_activity_log'
+down_revision = '013_add_activity_indexes'
+branch_labels = None
+depends_on = None
+
+MONTHS_AHEAD = 2
+INDEXES = {
+    'ix_activity_log_created_at': ['created_at'],
+    'ix_activity_user_created': ['user_id', 'created_at', 'id'],
+    'ix_activity_user_action': ['user_id', 'action', 'created_at', 'id'],
+}
+
+
+def _next_month(month):
+    return (month.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def upgrade():
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return
+    relkind = bind.execute(sa.text("SELECT relkind FROM pg_class WHERE relname = 'activity_log'")).scalar()
+    if relkind == 'p':
+        return
+
+    op.execute('ALTER TABLE activity_log RENAME TO activity_log_old')
+    op.execute('ALTER INDEX activity_log_pkey RENAME TO activity_log_old_pkey')
+    for name in INDEXES:
+        op.execute(f'DROP INDEX IF EXISTS {name}')
+    op.execute('UPDATE activity_log_old SET created_at = now() WHERE created_at IS NULL')
+    op.execute(
+        'CREATE TABLE activity_log ('
+        ' id VARCHAR(36) NOT NULL,'
+        ' user_id VARCHAR(36) NOT NULL REFERENCES "user" (id),'
+        ' file_id VARCHAR(36) REFERENCES file (id),'
+        ' action VARCHAR(50) NOT NULL,'
+        ' details JSON,'
+        ' created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,'
+        ' PRIMARY KEY (id, created_at)'
+        ') PARTITION BY RANGE (created_at)'
+    )
+    op.execute('CREATE TABLE activity_log_default PARTITION OF activity_log DEFAULT')
+
+    oldest = bind.execute(sa.text('SELECT min(created_at) FROM activity_log_old')).scalar()
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    month = (oldest or now).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    last = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    for _ in range(MONTHS_AHEAD):
+        last = _next_month(last)
+    while month <= last:
+        op.execute(
+            f"CREATE TABLE activity_log_p{month:%Y%m} PARTITION OF activity_log"
+            f" FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{_next_month(month):%Y-%m-%d}')"
+        )
+        month = _next_month(month)
+
+    op.execute('INSERT INTO activity_log SELECT id, user_id, file_id, action, details, created_at FROM activity_log_old')
+    op.execute('DROP TABLE activity_log_old')
+    for name, columns in INDEXES.items():
+        op.create_index(name, 'activity_log', columns)
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return
+    op.execute('CREATE TABLE activity_log_flat (LIKE activity_log INCLUDING DEFAULTS)')
+    op.execute('INSERT INTO activity_log_flat SELECT * FROM activity_log')
+    op.execute('DROP TABLE activity_log CASCADE')
+    op.execute('ALTER TABLE activity_log_flat RENAME TO activity_log')
+    op.execute('ALTER TABLE activity_log ADD PRIMARY KEY (id)')
+    op.execute('ALTER TABLE activity_log ADD FOREIGN KEY (user_id) REFERENCES "user" (id)')
+    op.execute('ALTER TABLE activity_log ADD FOREIGN KEY (file_id) REFERENCES file (id)')
+    for name, columns in INDEXES.items():
+        op.create_index(name, 'activity_log', columns)
@@ -45,12 +45,32 @@ def create_app():
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     app.config['UPLOAD_FOLDER'] = os.getenv('UPLOAD_FOLDER', './uploads')
     app.config['MAX_CONTENT_LENGTH'] = 500 * 1024 * 1024  # 500 MB
+    app.config['TASK_WORKERS'] = int(os.getenv('TASK_WORKERS', '2'))
+    # When set (e.g. /_protected/), file bytes are handed to nginx via X-Accel-Redirect
+    app.config['ACCEL_REDIRECT_PREFIX'] = os.getenv('ACCEL_REDIRECT_PREFIX', '')
+    # Signed inline media URLs stay valid for MEDIA_URL_TTL to twice that (src/auth.py)
+    app.config['MEDIA_URL_TTL'] = int(os.getenv('MEDIA_URL_TTL', '3600'))
+    # In-memory name completions (src/suggest.py)
+    app.config['SUGGEST_CACHE_BYTES'] = int(os.getenv('SUGGEST_CACHE_BYTES', str(64 * 1024 * 1024)))
+    app.config['SUGGEST_TTL'] = int(os.getenv('SUGGEST_TTL', '300'))
+    # Per-process cache of dashboard counters (src/stats.py)
+    app.config['DASHBOARD_STATS_TTL'] = int(os.getenv('DASHBOARD_STATS_TTL', '30'))
+    # Activity history totals are approximate; recounted at most this often
+    app.config['HISTORY_TOTAL_TTL'] = int(os.getenv('HISTORY_TOTAL_TTL', '300'))
+    # Activity older than this moves to compressed per-user archives (src/retention.py)
+    app.config['ACTIVITY_RETENTION_DAYS'] = int(os.getenv('ACTIVITY_RETENTION_DAYS', '365'))
+    app.config['ACTIVITY_ARCHIVE_FOLDER'] = os.getenv(
+        'ACTIVITY_ARCHIVE_FOLDER', os.path.join(app.config['UPLOAD_FOLDER'], 'archive', 'activity'))
+    # Buffered activity logging (src/activity.py); 0 seconds writes each event inline
+    app.config['ACTIVITY_FLUSH_SECONDS'] = float(os.getenv('ACTIVITY_FLUSH_SECONDS', '2'))
+    app.config['ACTIVITY_BATCH_SIZE'] = int(os.getenv('ACTIVITY_BATCH_SIZE', '500'))
 
     # Ensure upload directories exist
     upload_folder = app.config['UPLOAD_FOLDER']
     os.makedirs(os.path.join(upload_folder, 'files'), exist_ok=True)
     os.makedirs(os.path.join(upload_folder, 'avatars'), exist_ok=True)
     os.makedirs(os.path.join(upload_folder, 'previews'), exist_ok=True)
+    os.makedirs(os.path.join(upload_folder, 'blobs'), exist_ok=True)
 
     # Init extensions
     from src.extensions import db, migrate, cors, limiter
@@ -60,6 +80,18 @@ def create_app():
         app.config['RATELIMIT_ENABLED'] = False
     limiter.init_app(app)
 
+    from src import activity, ingest, tasks, previews, tree, search_index, content_index, usage, retention  # noqa: F401 (indexes hook file DDL)
+    tasks.init_app(app)
+    activity.init_app(app)
+    app.cli.add_command(previews.backfill_command)
+    app.cli.add_command(tree.rollups_command)
+    app.cli.add_command(content_index.index_command)
+    app.cli.add_command(usage.reconcile_command)
+    app.cli.add_command(retention.archive_command)
+    app.cli.add_command(ingest.fill_checksums_command)
+    from src.routes import uploads
+    app.cli.add_command(uploads.purge_command)
+
     allowed_origins = os.getenv('ALLOWED_ORIGINS', 'http://localhost:5173').split(',')
     cors.init_app(app, resources={r"/api/*": {"origins": allowed_origins}})
 
@@ -87,7 +119,7 @@ def create_app():
 
     # Create tables and seed
     with app.app_context():
-        from src.models import User, File, ActivityLog, UserSettings, TokenBlocklist, GitHubConnection  # noqa: F401
+        from src.models import User, File, ActivityLog, UserSettings, TokenBlocklist, GitHubConnection, UploadSession, UploadChunk, Blob  # noqa: F401
         db.create_all()
         from src.seed import seed_data
         seed_data()
@@ -0,0 +1,187 @@
+import atexit
+import logging
+import threading
+from datetime import datetime, timezone
+from flask import current_app
+from sqlalchemy import event, insert, inspect
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from src.extensions import db
+from src.models import ActivityLog, File, User, generate_uuid
+
+logger = logging.getLogger(__name__)
+
+# Activity logging and feeds.
+#
+# Each action has a durability mode. TRANSACTIONAL rows are added to the
+# caller's session and commit or roll back with the change they describe.
+# BUFFERED rows wait for the caller's transaction to commit and then go to
+# the process-wide ActivitySink, which writes them with multi-row INSERTs
+# every ACTIVITY_FLUSH_SECONDS or ACTIVITY_BATCH_SIZE rows; a worker that
+# dies without a clean shutdown loses at most that window.
+#
+# Feeds render a page of ActivityLog rows together with the file and user
+# each row points at; resolve() loads those with one IN query per table.
+
+TRANSACTIONAL, BUFFERED = 'transactional', 'buffered'
+DURABILITY = {
+    # Security, sharing and deletion must never be missing from the log
+    'password_changed': TRANSACTIONAL,
+    'file_shared': TRANSACTIONAL,
+    'file_locked': TRANSACTIONAL,
+    'file_unlocked': TRANSACTIONAL,
+    'file_trashed': TRANSACTIONAL,
+    'file_restored': TRANSACTIONAL,
+}
+MAX_BUFFERED = 50000  # rows held in memory before new events are dropped
+
+
+class ActivitySink:
+    """In-memory buffer of activity rows written in bulk by a flusher thread.
+
+    The thread starts with the first row and wakes every `interval` seconds,
+    or as soon as `batch_size` rows are waiting. With an interval of 0 rows
+    are written as they arrive (used by the test-suite).
+    """
+
+    def __init__(self, app, batch_size, interval):
+        self.app = app
+        self.batch_size = batch_size
+        self.interval = interval
+        self._rows = []
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopping = False
+
+    def put(self, rows):
+        if self.interval <= 0:
+            self._write(rows)
+            return
+        with self._cond:
+            if len(self._rows) + len(rows) > MAX_BUFFERED:
+                logger.warning('Activity buffer full, dropping %d events', len(rows))
+                return
+            self._rows.extend(rows)
+            if self._thread is None and not self._stopping:
+                self._thread = threading.Thread(target=self._run, name='activity-sink', daemon=True)
+                self._thread.start()
+            if len(self._rows) >= self.batch_size:
+                self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._stopping and len(self._rows) < self.batch_size:
+                    self._cond.wait(self.interval)
+                rows, self._rows = self._rows, []
+                stopping = self._stopping
+            if rows:
+                self._write(rows)
+            if stopping:
+                return
+
+    def _write(self, rows):
+        with self.app.app_context():
+            for i in range(0, len(rows), self.batch_size):
+                batch = rows[i:i + self.batch_size]
+                try:
+                    with db.engine.begin() as conn:
+                        conn.execute(insert(ActivityLog.__table__), batch)
+                except IntegrityError:
+                    # Typically a file purged while its events were buffered
+                    self._write_each(batch)
+                except Exception:
+                    logger.exception('Could not write %d activity events', len(batch))
+
+    def _write_each(self, rows):
+        for row in rows:
+            try:
+                with db.engine.begin() as conn:
+                    conn.execute(insert(ActivityLog.__table__), row)
+            except IntegrityError:
+                logger.info('Dropping activity event for missing file %s', row['file_id'])
+
+    def flush(self):
+        """Write everything buffered so far from the calling thread."""
+        with self._cond:
+            rows, self._rows = self._rows, []
+        if rows:
+            self._write(rows)
+
+    def shutdown(self):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=30)
+        self.flush()
+
+
+def init_app(app):
+    sink = ActivitySink(app, app.config['ACTIVITY_BATCH_SIZE'], app.config['ACTIVITY_FLUSH_SECONDS'])
+    app.extensions['activity_sink'] = sink
+    # Gunicorn workers exit through sys.exit on a graceful stop, so this runs
+    atexit.register(sink.shutdown)
+
+
+def _row(user_id, action, file_id, details, created_at):
+    return {
+        'id': generate_uuid(), 'user_id': user_id, 'file_id': file_id, 'action': action,
+        'details': details, 'created_at': created_at,
+    }
+
+
+def record(user_id, action, file=None, details=None):
+    """Log action as part of the current transaction.
+
+    file is the File acted on, which may not have been flushed yet.
+    BUFFERED actions are only handed to the sink if the transaction commits.
+    """
+    if DURABILITY.get(action, BUFFERED) == TRANSACTIONAL:
+        db.session.add(ActivityLog(user_id=user_id, file=file, action=action, details=details))
+        return
+    db.session().info.setdefault('activity_events', []).append(
+        (user_id, action, file, details, datetime.now(timezone.utc)))
+
+
+def record_access(user_id, action, file):
+    """Log a read of file (view, download) that has no transaction to join."""
+    current_app.extensions['activity_sink'].put(
+        [_row(user_id, action, file.id, None, datetime.now(timezone.utc))])
+
+
+@event.listens_for(Session, 'after_commit')
+def _on_commit(session):
+    events = session.info.pop('activity_events', None)
+    if events:
+        # The identity key holds the id without reloading the expired object
+        current_app.extensions['activity_sink'].put([
+            _row(user_id, action, inspect(f).identity[0] if f is not None else None, details, created_at)
+            for user_id, action, f, details, created_at in events
+        ])
+
+
+@event.listens_for(Session, 'after_rollback')
+def _on_rollback(session):
+    session.info.pop('activity_events', None)
+
+
+def resolve(activities, users=False, file_criteria=()):
+    """[(activity, file or None, user or None)] in the order of activities.
+
+    file_criteria narrows which files are loaded (e.g. live files only); rows
+    whose file does not match get None, as do rows whose file is gone. Users
+    are only loaded when users is true.
+    """
+    file_ids = {a.file_id for a in activities if a.file_id}
+    files = {}
+    if file_ids:
+        files = {f.id: f for f in File.query.filter(File.id.in_(file_ids), *file_criteria)}
+
+    people = {}
+    if users:
+        user_ids = {a.user_id for a in activities}
+        if user_ids:
+            people = {u.id: u for u in User.query.filter(User.id.in_(user_ids))}
+
+    return [(a, files.get(a.file_id), people.get(a.user_id)) for a in activities]
@@ -1,5 +1,8 @@
 import jwt
+import hmac
+import time
 import uuid
+import hashlib
 from datetime import datetime, timezone, timedelta
 from functools import wraps
 from flask import request, jsonify, current_app, g
@@ -37,6 +40,36 @@ def decode_token(token):
         return None
 
 
+def _media_signature(file_id, owner_id, exp):
+    key = current_app.config['SECRET_KEY'].encode()
+    msg = f'media:{file_id}:{owner_id}:{exp}'.encode()
+    return hmac.new(key, msg, hashlib.sha256).hexdigest()[:32]
+
+
+def sign_media_url(file_id, owner_id, endpoint='media'):
+    """Signed inline URL for a file, valid for MEDIA_URL_TTL to 2 * MEDIA_URL_TTL.
+
+    The expiry is rounded up to the TTL window so every listing within the
+    same window hands out the exact same URL, which browsers and proxies can
+    then cache. endpoint is 'media' for the content or 'thumbnail' for its preview.
+    """
+    ttl = current_app.config['MEDIA_URL_TTL']
+    exp = (int(time.time()) // ttl + 2) * ttl
+    sig = _media_signature(file_id, owner_id, exp)
+    return f'/api/files/{file_id}/{endpoint}?o={owner_id}&exp={exp}&sig={sig}'
+
+
+def verify_media_signature(file_id, owner_id, exp, sig):
+    """Check a signed media URL without touching the database."""
+    try:
+        exp = int(exp)
+    except (TypeError, ValueError):
+        return False
+    if not owner_id or not sig or exp < time.time():
+        return False
+    return hmac.compare_digest(_media_signature(file_id, owner_id, exp), sig)
+
+
 def login_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
@@ -0,0 +1,114 @@
+import os
+import logging
+from datetime import datetime, timezone
+from flask import current_app
+from sqlalchemy import bindparam, update, delete
+from sqlalchemy.dialects import postgresql, sqlite
+from src import previews
+from src.extensions import db
+from src.models import Blob
+
+logger = logging.getLogger(__name__)
+
+# Content-addressed store: each distinct content lives once under
+# uploads/blobs/, keyed by SHA-256, with a reference count on its Blob row.
+#
+# The Blob row is the lock between store() and collect(): store() takes its
+# reference before placing the bytes, and collect() unlinks a file only while
+# its uncommitted DELETE still holds the row. A store() of the same content
+# therefore waits for collect() to commit and then writes the file anew.
+
+def blob_path(sha256):
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    return os.path.join(upload_folder, 'blobs', sha256[:2], sha256[2:4], sha256)
+
+
+def store(tmp_path, sha256, size):
+    """Take a reference and move a fully written temp file into the store.
+
+    The file is always put in place, replacing identical bytes if they are
+    already stored, so it cannot be lost to a concurrent collect().
+    Returns the blob path to record in File.storage_path.
+    """
+    path = blob_path(sha256)
+    # Atomic upsert so concurrent uploads of the same bytes both count
+    insert = postgresql.insert if db.engine.dialect.name == 'postgresql' else sqlite.insert
+    stmt = insert(Blob).values(
+        sha256=sha256,
+        size=size,
+        storage_path=path,
+        ref_count=1,
+        created_at=datetime.now(timezone.utc),
+    ).on_conflict_do_update(
+        index_elements=['sha256'],
+        set_={'ref_count': Blob.ref_count + 1},
+    )
+    db.session.execute(stmt)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    os.replace(tmp_path, path)
+    return path
+
+
+def acquire(sha256):
+    """Take another reference on an existing blob. Returns False if it is unknown."""
+    result = db.session.execute(
+        update(Blob)
+        .where(Blob.sha256 == sha256)
+        .values(ref_count=Blob.ref_count + 1)
+    )
+    return result.rowcount == 1
+
+
+def release(sha256, count=1):
+    """Drop references; call collect() after the commit to reclaim the bytes."""
+    db.session.execute(
+        update(Blob)
+        .where(Blob.sha256 == sha256)
+        .values(ref_count=Blob.ref_count - count)
+    )
+
+
+def release_many(counts):
+    """release() for {sha256: count} in a single executemany round trip."""
+    if not counts:
+        return
+    table = Blob.__table__
+    db.session.connection().execute(
+        update(table)
+        .where(table.c.sha256 == bindparam('digest'))
+        .values(ref_count=table.c.ref_count - bindparam('count')),
+        [{'digest': sha256, 'count': count} for sha256, count in counts.items()],
+    )
+
+
+COLLECT_BATCH = 500
+
+
+def collect(digests):
+    """Delete unreferenced blobs among digests and unlink their files.
+
+    Run after the releasing transaction committed; a blob re-acquired in the
+    meantime keeps a positive count and survives. Files are unlinked before
+    the DELETE commits, while it still locks the rows (see above).
+    """
+    removed = 0
+    digests = list(digests)
+    for i in range(0, len(digests), COLLECT_BATCH):
+        result = db.session.execute(
+            delete(Blob)
+            .where(Blob.sha256.in_(digests[i:i + COLLECT_BATCH]), Blob.ref_count <= 0)
+            .returning(Blob.sha256)
+            .execution_options(synchronize_session=False)
+        )
+        for sha256 in result.scalars():
+            path = blob_path(sha256)
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError:
+                logger.warning('Could not remove blob %s', path)
+            previews.remove(sha256)
+            removed += 1
+        db.session.commit()
+    return removed
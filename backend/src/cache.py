@@ -0,0 +1,64 @@
+import time
+import threading
+from collections import OrderedDict
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from src.extensions import db
+
+# Small per-process caches for derived per-user data. Writers call
+# invalidate() inside their transaction; the entry is dropped when the
+# session commits, so a reader never keeps a value older than its own
+# writes. Other processes catch up when the entry's TTL runs out.
+
+
+class TTLCache:
+    """Key -> value map with timestamped entries, oldest dropped past maxsize."""
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, ttl):
+        """The value stored under key less than ttl seconds ago, else None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, stored_at = entry
+            if time.monotonic() - stored_at >= ttl:
+                del self._entries[key]
+                return None
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (value, time.monotonic())
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def invalidate(cache, key, session=None):
+    """Drop key from cache once the current transaction commits."""
+    session = session if session is not None else db.session()
+    session.info.setdefault('cache_invalidations', set()).add((cache, key))
+
+
+@event.listens_for(Session, 'after_commit')
+def _on_commit(session):
+    for cache, key in session.info.pop('cache_invalidations', ()):
+        cache.discard(key)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _on_rollback(session):
+    session.info.pop('cache_invalidations', None)
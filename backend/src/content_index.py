@@ -0,0 +1,281 @@
+import os
+import re
+import codecs
+import shutil
+import logging
+import subprocess
+import tempfile
+import sqlite3
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import and_, column, delete, event, exists, func, insert, literal, literal_column, or_, select, table
+from src import tasks
+from src.extensions import db
+from src.models import File
+
+logger = logging.getLogger(__name__)
+
+# Full-text index over file bodies. Text is extracted on the task pool and
+# stored as CHUNK_CHARS pieces, one index document each, so neither the
+# extractor nor a snippet ever holds more than a chunk of a large file.
+
+TEXT_MIME_PREFIXES = ('text/', 'application/json', 'application/xml')
+READ_SIZE = 64 * 1024
+CHUNK_CHARS = 64 * 1024
+MAX_CHUNKS = 128  # index the first ~8 MB of text of a file
+PDF_TIMEOUT = 60
+SNIPPET_TOKENS = 16
+# Snippet highlight markers; control characters are stripped from extracted
+# text, so they cannot occur in a body
+MARK_START, MARK_END = '\x02', '\x03'
+_CONTROL = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f\x7f]')
+_WORD = re.compile(r'\w+')
+
+
+def can_index(mime_type):
+    if not mime_type:
+        return False
+    if mime_type == 'application/pdf':
+        return shutil.which('pdftotext') is not None
+    return mime_type.startswith(TEXT_MIME_PREFIXES)
+
+
+def _read_text(path):
+    """Yield decoded text from path, READ_SIZE bytes at a time."""
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    with open(path, 'rb') as fh:
+        while block := fh.read(READ_SIZE):
+            yield decoder.decode(block)
+    yield decoder.decode(b'', final=True)
+
+
+def _read_pdf(path):
+    with tempfile.TemporaryDirectory() as tmp:
+        out = os.path.join(tmp, 'text.txt')
+        subprocess.run(['pdftotext', '-enc', 'UTF-8', '-q', path, out],
+                       check=True, capture_output=True, timeout=PDF_TIMEOUT)
+        yield from _read_text(out)
+
+
+def chunks(pieces):
+    """Regroup text pieces into CHUNK_CHARS chunks split on whitespace."""
+    buf = ''
+    count = 0
+    for piece in pieces:
+        buf += _CONTROL.sub(' ', piece)
+        while len(buf) >= CHUNK_CHARS:
+            cut = buf.rfind(' ', 0, CHUNK_CHARS)
+            cut = CHUNK_CHARS if cut <= 0 else cut + 1
+            yield buf[:cut]
+            buf = buf[cut:]
+            count += 1
+            if count == MAX_CHUNKS:
+                return
+    if buf.strip():
+        yield buf
+
+
+def has_terms(q):
+    return bool(_WORD.search(q))
+
+
+def split_snippet(snippet):
+    """Turn a marked-up snippet into (text, [[start, end], ...] highlights)."""
+    text, highlights = '', []
+    for part in re.split(f'({MARK_START}|{MARK_END})', snippet or ''):
+        if part == MARK_START:
+            highlights.append([len(text), len(text)])
+        elif part == MARK_END:
+            if highlights:
+                highlights[-1][1] = len(text)
+        else:
+            text += part
+    return text, highlights
+
+
+class Fts5Content:
+    """SQLite FTS5 (unicode61 tokenizer) over file_content_docs."""
+
+    docs = table('file_content_docs', column('docid'), column('file_id'), column('seq'), column('body'))
+    _fts = table('file_content', column('rowid'))
+
+    DDL = (
+        'CREATE TABLE IF NOT EXISTS file_content_docs ('
+        ' docid INTEGER PRIMARY KEY, file_id VARCHAR(36) NOT NULL, seq INTEGER NOT NULL,'
+        ' body TEXT NOT NULL, UNIQUE (file_id, seq))',
+        "CREATE VIRTUAL TABLE IF NOT EXISTS file_content USING fts5("
+        " body, content='file_content_docs', content_rowid='docid', tokenize='unicode61 remove_diacritics 2')",
+        'CREATE TRIGGER IF NOT EXISTS file_content_docs_ai AFTER INSERT ON file_content_docs BEGIN'
+        ' INSERT INTO file_content(rowid, body) VALUES (new.docid, new.body); END',
+        'CREATE TRIGGER IF NOT EXISTS file_content_docs_ad AFTER DELETE ON file_content_docs BEGIN'
+        " INSERT INTO file_content(file_content, rowid, body) VALUES ('delete', old.docid, old.body); END",
+        'CREATE TRIGGER IF NOT EXISTS file_content_ad AFTER DELETE ON file BEGIN'
+        ' DELETE FROM file_content_docs WHERE file_id = old.id; END',
+    )
+
+    def install(self, conn):
+        for statement in self.DDL:
+            conn.exec_driver_sql(statement)
+
+    def uninstall(self, conn):
+        conn.exec_driver_sql('DROP TABLE IF EXISTS file_content')
+        conn.exec_driver_sql('DROP TABLE IF EXISTS file_content_docs')
+
+    def _match(self, q):
+        terms = ' '.join('"' + w + '"' for w in _WORD.findall(q))
+        return literal_column('file_content').op('MATCH')(terms)
+
+    def matches(self, q):
+        """(file_id, seq, score) of every matching chunk, lower score first."""
+        return (
+            select(self.docs.c.file_id, self.docs.c.seq, literal_column('file_content.rank').label('score'))
+            .join(self._fts, self._fts.c.rowid == self.docs.c.docid)
+            .where(self._match(q))
+        )
+
+    def snippets(self, q, keys):
+        """{(file_id, seq): marked-up snippet} for the given chunks."""
+        snippet = func.snippet(literal_column('file_content'), 0, MARK_START, MARK_END, '…', SNIPPET_TOKENS)
+        rows = db.session.execute(
+            select(self.docs.c.file_id, self.docs.c.seq, snippet)
+            .join(self._fts, self._fts.c.rowid == self.docs.c.docid)
+            .where(self._match(q), or_(*[and_(self.docs.c.file_id == f, self.docs.c.seq == s) for f, s in keys]))
+        )
+        return {(file_id, seq): text for file_id, seq, text in rows}
+
+
+class TsvectorContent(Fts5Content):
+    """PostgreSQL: generated tsvector column with a GIN index, ts_headline snippets."""
+
+    docs = table('file_content', column('file_id'), column('seq'), column('body'), column('tsv'))
+
+    DDL = (
+        'CREATE TABLE IF NOT EXISTS file_content ('
+        ' file_id VARCHAR(36) NOT NULL REFERENCES file (id) ON DELETE CASCADE, seq INTEGER NOT NULL,'
+        " body TEXT NOT NULL, tsv tsvector GENERATED ALWAYS AS (to_tsvector('simple', body)) STORED,"
+        ' PRIMARY KEY (file_id, seq))',
+        'CREATE INDEX IF NOT EXISTS ix_file_content_tsv ON file_content USING gin (tsv)',
+    )
+
+    def uninstall(self, conn):
+        conn.exec_driver_sql('DROP TABLE IF EXISTS file_content')
+
+    def _query(self, q):
+        return func.plainto_tsquery('simple', q)
+
+    def matches(self, q):
+        tsv = self.docs.c.tsv
+        return (
+            select(self.docs.c.file_id, self.docs.c.seq, (-func.ts_rank(tsv, self._query(q))).label('score'))
+            .where(tsv.op('@@')(self._query(q)))
+        )
+
+    def snippets(self, q, keys):
+        options = f'StartSel={MARK_START}, StopSel={MARK_END}, MaxWords={SNIPPET_TOKENS * 2}, MinWords={SNIPPET_TOKENS}'
+        rows = db.session.execute(
+            select(self.docs.c.file_id, self.docs.c.seq,
+                   func.ts_headline('simple', self.docs.c.body, self._query(q), options))
+            .where(or_(*[and_(self.docs.c.file_id == f, self.docs.c.seq == s) for f, s in keys]))
+        )
+        return {(file_id, seq): text for file_id, seq, text in rows}
+
+
+def backend_for(dialect_name):
+    if dialect_name == 'sqlite' and sqlite3.sqlite_version_info >= (3, 9):
+        return Fts5Content()
+    if dialect_name == 'postgresql':
+        return TsvectorContent()
+    return None
+
+
+def backend():
+    return backend_for(db.engine.dialect.name)
+
+
+@event.listens_for(File.__table__, 'after_create')
+def _install(target, connection, **kw):
+    index = backend_for(connection.dialect.name)
+    if index:
+        index.install(connection)
+
+
+@event.listens_for(File.__table__, 'before_drop')
+def _uninstall(target, connection, **kw):
+    index = backend_for(connection.dialect.name)
+    if index:
+        index.uninstall(connection)
+
+
+def index_content(file_id):
+    """Background task: (re)build the content index of one file."""
+    index = backend()
+    f = db.session.get(File, file_id)
+    if index is None or not f or f.is_folder or not f.storage_path or not can_index(f.mime_type):
+        return
+    docs = index.docs
+    db.session.execute(delete(docs).where(docs.c.file_id == f.id))
+
+    # Copies and re-uploads share their text with the first indexed file
+    if f.sha256:
+        twin = db.session.scalar(
+            select(File.id).where(
+                File.sha256 == f.sha256, File.id != f.id,
+                exists().where(docs.c.file_id == File.id),
+            ).limit(1)
+        )
+        if twin:
+            db.session.execute(insert(docs).from_select(
+                ['file_id', 'seq', 'body'],
+                select(literal(f.id), docs.c.seq, docs.c.body).where(docs.c.file_id == twin),
+            ))
+            db.session.commit()
+            return
+
+    read = _read_pdf if f.mime_type == 'application/pdf' else _read_text
+    try:
+        for seq, body in enumerate(chunks(read(f.storage_path))):
+            db.session.execute(insert(docs).values(file_id=f.id, seq=seq, body=body))
+    except (OSError, subprocess.SubprocessError) as e:
+        logger.warning('Text extraction failed for %s: %s', file_id, e)
+        db.session.rollback()
+        return
+    db.session.commit()
+
+
+def schedule(f):
+    """Queue content indexing for a freshly committed file."""
+    if can_index(f.mime_type):
+        tasks.submit(('content', f.id), index_content, f.id)
+
+
+@click.command('index-content')
+@click.option('--batch', default=200, help='Files loaded per query.')
+@with_appcontext
+def index_command(batch):
+    """Index the content of text and PDF files uploaded before content search existed."""
+    index = backend()
+    if index is None:
+        raise click.ClickException(f'Content search is not supported on {db.engine.dialect.name}')
+
+    done = 0
+    last_id = ''
+    while True:
+        rows = (
+            db.session.query(File.id, File.mime_type)
+            .filter(
+                File.is_folder == False, File.storage_path.isnot(None), File.id > last_id,
+                ~exists().where(index.docs.c.file_id == File.id),
+            )
+            .order_by(File.id)
+            .limit(batch)
+            .all()
+        )
+        if not rows:
+            break
+        last_id = rows[-1].id
+        for file_id, mime_type in rows:
+            if can_index(mime_type):
+                index_content(file_id)
+                done += 1
+        db.session.expunge_all()
+    click.echo(f'{done} files indexed')
@@ -0,0 +1,211 @@
+import os
+import uuid
+from datetime import datetime, timezone
+from urllib.parse import quote
+from flask import Response, current_app, request, send_file
+from werkzeug.http import http_date, is_resource_modified
+
+READ_SIZE = 64 * 1024
+# More parts than this is either a broken client or an amplification attempt
+MAX_RANGES = 16
+
+
+def content_etag(f):
+    """Strong validator for a stored file, derived from its content digest.
+
+    Stored content never changes under a File row, so the digest is stable
+    across renames, copies and re-deploys. Legacy rows without a digest fall
+    back to Werkzeug's path/mtime/size tag.
+    """
+    return f.sha256 or f.sha1 or None
+
+
+def _cache_control(resp, inline):
+    # Inline views (<img>, <video>) may be reused for a while; attachments
+    # always revalidate, which costs a 304 at most.
+    resp.headers['Cache-Control'] = 'private, max-age=3600' if inline else 'private, no-cache'
+    return resp
+
+
+def accel_path(path):
+    """Internal nginx URI for a file under UPLOAD_FOLDER, or None when the
+    offload is disabled or the file lives elsewhere."""
+    prefix = current_app.config.get('ACCEL_REDIRECT_PREFIX')
+    if not prefix:
+        return None
+    root = os.path.realpath(current_app.config['UPLOAD_FOLDER'])
+    real = os.path.realpath(path)
+    if os.path.commonpath([root, real]) != root:
+        return None
+    rel = os.path.relpath(real, root).replace(os.sep, '/')
+    return prefix.rstrip('/') + '/' + quote(rel)
+
+
+def accel_response(uri, mime_type, download_name=None, as_attachment=False):
+    """Empty response telling nginx to serve uri itself.
+
+    nginx then owns Range, If-Range and conditional GET, using its own
+    mtime/size validators; only the headers set here are passed through.
+    """
+    resp = Response(mimetype=mime_type)
+    resp.headers['X-Accel-Redirect'] = uri
+    if download_name:
+        disposition = 'attachment' if as_attachment else 'inline'
+        ascii_name = download_name.encode('ascii', 'ignore').decode().replace('"', '') or 'download'
+        resp.headers['Content-Disposition'] = (
+            f"{disposition}; filename=\"{ascii_name}\"; filename*=UTF-8''{quote(download_name)}"
+        )
+    return resp
+
+
+def _parse_ranges(header):
+    """Parse a bytes Range header into (start, stop) pairs, stop exclusive.
+
+    Unlike werkzeug.http.parse_range_header this accepts overlapping and
+    out-of-order ranges, which _satisfiable() then coalesces.
+    """
+    units, _, spec = (header or '').partition('=')
+    if units.strip().lower() != 'bytes':
+        return None
+    ranges = []
+    for item in spec.split(','):
+        first, sep, last = item.strip().partition('-')
+        try:
+            if not sep:
+                return None
+            if not first:
+                ranges.append((-int(last), None))
+            else:
+                start, stop = int(first), int(last) + 1 if last else None
+                if start < 0 or (stop is not None and stop <= start):
+                    return None
+                ranges.append((start, stop))
+        except ValueError:
+            return None
+    return ranges
+
+
+def _satisfiable(ranges, length):
+    """Resolve (start, stop) pairs against length, dropping unsatisfiable ones
+    and coalescing overlapping or adjacent ranges."""
+    spans = []
+    for start, stop in ranges:
+        if start < 0:
+            start, stop = max(length + start, 0), length
+        else:
+            stop = length if stop is None else min(stop, length)
+        if start < stop:
+            spans.append((start, stop))
+    spans.sort()
+    merged = []
+    for start, stop in spans:
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], stop))
+        else:
+            merged.append((start, stop))
+    return merged
+
+
+def _iter_parts(path, spans, boundary, mime_type, length):
+    with open(path, 'rb') as fh:
+        for start, stop in spans:
+            yield (
+                f'\r\n--{boundary}\r\n'
+                f'Content-Type: {mime_type}\r\n'
+                f'Content-Range: bytes {start}-{stop - 1}/{length}\r\n\r\n'
+            ).encode()
+            fh.seek(start)
+            remaining = stop - start
+            while remaining:
+                block = fh.read(min(READ_SIZE, remaining))
+                if not block:
+                    return
+                remaining -= len(block)
+                yield block
+        yield f'\r\n--{boundary}--\r\n'.encode()
+
+
+def _multipart_response(path, spans, mime_type, length, etag, last_modified):
+    boundary = uuid.uuid4().hex
+    head_size = 0
+    for start, stop in spans:
+        head_size += len(
+            f'\r\n--{boundary}\r\n'
+            f'Content-Type: {mime_type}\r\n'
+            f'Content-Range: bytes {start}-{stop - 1}/{length}\r\n\r\n'
+        ) + stop - start
+    head_size += len(f'\r\n--{boundary}--\r\n')
+
+    body = b'' if request.method == 'HEAD' else _iter_parts(path, spans, boundary, mime_type, length)
+    resp = Response(body, status=206, mimetype=f'multipart/byteranges; boundary={boundary}')
+    resp.headers['Content-Length'] = str(head_size)
+    resp.headers['Accept-Ranges'] = 'bytes'
+    resp.headers['Last-Modified'] = http_date(last_modified)
+    if etag:
+        resp.set_etag(etag)
+    return resp
+
+
+def send_stored_file(f, inline=False):
+    """Serve a File's content with validators, conditional GET and byte ranges.
+
+    Single ranges and If-Range are handled by send_file; multi-range requests
+    get a multipart/byteranges body read straight from disk. With
+    ACCEL_REDIRECT_PREFIX set the transfer is handed to nginx instead.
+    """
+    uri = accel_path(f.storage_path)
+    if uri:
+        resp = accel_response(uri, f.mime_type or 'application/octet-stream', f.name, as_attachment=not inline)
+        return _cache_control(resp, inline)
+
+    st = os.stat(f.storage_path)
+    mime_type = f.mime_type or 'application/octet-stream'
+    etag = content_etag(f)
+    last_modified = datetime.fromtimestamp(st.st_mtime, timezone.utc)
+
+    # RFC 9110: If-None-Match / If-Modified-Since win over Range
+    if etag and not is_resource_modified(request.environ, etag=f'"{etag}"', last_modified=last_modified):
+        resp = Response(status=304)
+        resp.set_etag(etag)
+        return _cache_control(resp, inline)
+
+    ranges = _parse_ranges(request.headers.get('Range'))
+    if ranges is not None and len(ranges) > 1 and st.st_size:
+        range_valid = 'If-Range' not in request.headers or not is_resource_modified(
+            request.environ,
+            etag=f'"{etag}"' if etag else None,
+            last_modified=last_modified,
+            ignore_if_range=False,
+        )
+        if range_valid and len(ranges) <= MAX_RANGES:
+            spans = _satisfiable(ranges, st.st_size)
+            if not spans:
+                resp = Response(status=416)
+                resp.headers['Content-Range'] = f'bytes */{st.st_size}'
+                return resp
+            if len(spans) > 1:
+                resp = _multipart_response(f.storage_path, spans, mime_type, st.st_size, etag, last_modified)
+                return _cache_control(resp, inline)
+            request.environ['HTTP_RANGE'] = f'bytes={spans[0][0]}-{spans[0][1] - 1}'
+        else:
+            # Stale validator or too many parts: send the whole file
+            request.environ.pop('HTTP_RANGE', None)
+
+    resp = send_file(
+        f.storage_path,
+        mimetype=mime_type,
+        as_attachment=not inline,
+        download_name=f.name,
+        conditional=True,
+        etag=etag if etag else True,
+        last_modified=last_modified,
+    )
+    return _cache_control(resp, inline)
+
+
+def send_derived_file(path, mime_type, etag):
+    """Serve a generated file (e.g. a preview) whose bytes never change under path."""
+    uri = accel_path(path)
+    if uri:
+        return accel_response(uri, mime_type)
+    return send_file(path, mimetype=mime_type, conditional=True, etag=etag)
@@ -0,0 +1,204 @@
+import os
+import uuid
+import hashlib
+import magic
+import click
+from flask.cli import with_appcontext
+from werkzeug.sansio.multipart import MultipartDecoder, Field, File as FilePart, Data, Epilogue, NeedData
+from sqlalchemy import update
+from src.extensions import db
+from src.models import File
+
+SNIFF_SIZE = 2048
+READ_SIZE = 64 * 1024
+MULTIPART_OVERHEAD = 16 * 1024  # headroom for boundaries, part headers and small fields
+
+TOO_LARGE_MESSAGE = 'File too large. Maximum size is 100 MB'
+QUOTA_MESSAGE = 'Storage quota exceeded. Free up space or upgrade your plan.'
+
+
+class IngestError(Exception):
+    """Raised when an upload has to be rejected mid-stream."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def check_declared_size(size, max_size, quota_left=None, overhead=0):
+    """Reject an upload from its declared size alone, before the body is read.
+
+    size is the Content-Length (or a client-declared file size) and may be
+    None for chunked bodies, in which case only an exhausted quota is caught
+    here and the streaming limits take over.
+    """
+    if quota_left is not None and quota_left <= 0:
+        raise IngestError(QUOTA_MESSAGE, 413)
+    if size is None:
+        return
+    payload = max(size - overhead, 0)
+    if payload > max_size:
+        raise IngestError(TOO_LARGE_MESSAGE, 413)
+    if quota_left is not None and payload > quota_left:
+        raise IngestError(QUOTA_MESSAGE, 413)
+
+
+class Ingest:
+    """Single pass over an upload: sniff, size, hash and write each block once.
+
+    Bytes go to a hidden temp file next to their final location and are only
+    moved into place once finish() succeeded, so a rejected or interrupted
+    upload never leaves a partial file behind.
+    """
+
+    def __init__(self, directory, max_size, quota_left=None, validate_mime=None):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.max_size = max_size
+        self.quota_left = quota_left
+        self.validate_mime = validate_mime
+        self.tmp_path = os.path.join(directory, f'.{uuid.uuid4()}.part')
+        self.size = 0
+        self.mime_type = None
+        self.sha1 = None
+        self.sha256 = None
+        self._sha1 = hashlib.sha1()
+        self._sha256 = hashlib.sha256()
+        self._head = bytearray()
+        self._fp = open(self.tmp_path, 'wb')
+
+    def write(self, block):
+        self.size += len(block)
+        if self.size > self.max_size:
+            raise IngestError(TOO_LARGE_MESSAGE, 413)
+        if self.quota_left is not None and self.size > self.quota_left:
+            raise IngestError(QUOTA_MESSAGE, 413)
+
+        if self.mime_type is None:
+            self._head += block
+            if len(self._head) >= SNIFF_SIZE:
+                self._sniff()
+
+        self._sha1.update(block)
+        self._sha256.update(block)
+        self._fp.write(block)
+
+    def _sniff(self):
+        # Validate MIME type via magic bytes (ignores browser-supplied Content-Type)
+        self.mime_type = magic.from_buffer(bytes(self._head[:SNIFF_SIZE]), mime=True)
+        self._head = None
+        if self.validate_mime:
+            error = self.validate_mime(self.mime_type)
+            if error:
+                raise IngestError(error, 400)
+
+    def finish(self):
+        """Close the temp file and finalize the digests; the caller moves it into place."""
+        if self.mime_type is None:
+            self._sniff()
+        self._fp.close()
+        self.sha1 = self._sha1.hexdigest()
+        self.sha256 = self._sha256.hexdigest()
+        return self.tmp_path
+
+    def abort(self):
+        if not self._fp.closed:
+            self._fp.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+
+def file_digests(path):
+    """Read a stored file once; returns (first SNIFF_SIZE bytes, sha1, sha256)."""
+    sha1 = hashlib.sha1()
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as fp:
+        head = block = fp.read(READ_SIZE)
+        while block:
+            sha1.update(block)
+            sha256.update(block)
+            block = fp.read(READ_SIZE)
+    return head[:SNIFF_SIZE], sha1.hexdigest(), sha256.hexdigest()
+
+
+def fill_checksums(file_id):
+    """Background task: persist the SHA-1 of a file stored before checksums were recorded."""
+    f = db.session.get(File, file_id)
+    if not f or f.sha1 or not f.storage_path or not os.path.exists(f.storage_path):
+        return
+    _, sha1, _ = file_digests(f.storage_path)
+    # Core UPDATE keeping updated_at: recording a checksum does not modify the file
+    db.session.execute(
+        update(File).where(File.id == f.id).values(sha1=sha1, updated_at=File.updated_at)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+
+
+@click.command('fill-checksums')
+@click.option('--batch', default=200, help='Files loaded per query.')
+@with_appcontext
+def fill_checksums_command(batch):
+    """Record the SHA-1 of files stored before checksums were persisted."""
+    done = 0
+    last_id = ''
+    while True:
+        rows = db.session.scalars(
+            db.select(File.id)
+            .where(File.sha1.is_(None), File.storage_path.isnot(None), File.id > last_id)
+            .order_by(File.id)
+            .limit(batch)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1]
+        for file_id in rows:
+            fill_checksums(file_id)
+            done += 1
+        db.session.expunge_all()
+    click.echo(f'{done} files checked')
+
+
+def stream_multipart(stream, boundary, on_file, max_bytes=None):
+    """Parse a multipart/form-data body straight off the request stream.
+
+    Unlike request.files nothing is spooled: on_file(field_name, filename) is
+    called when a file part starts and returns a sink with write(), or None to
+    skip that part. Parsing stops with a 413 as soon as more than max_bytes of
+    raw body have been read. Returns the plain (non-file) form fields as a dict.
+    """
+    decoder = MultipartDecoder(boundary)
+    fields = {}
+    current = None
+    sink = None
+    value = []
+    consumed = 0
+
+    while True:
+        block = stream.read(READ_SIZE)
+        consumed += len(block)
+        if max_bytes is not None and consumed > max_bytes:
+            raise IngestError(TOO_LARGE_MESSAGE, 413)
+        decoder.receive_data(block or None)
+        event = decoder.next_event()
+        while not isinstance(event, (Epilogue, NeedData)):
+            if isinstance(event, FilePart):
+                current = event
+                sink = on_file(event.name, event.filename)
+            elif isinstance(event, Field):
+                current = event
+                sink = None
+                value = []
+            elif isinstance(event, Data):
+                if isinstance(current, Field):
+                    value.append(event.data)
+                    if not event.more_data:
+                        fields[current.name] = b''.join(value).decode('utf-8', 'replace')
+                elif sink is not None:
+                    sink.write(event.data)
+            event = decoder.next_event()
+        if isinstance(event, Epilogue):
+            return fields
+        if not block:
+            raise IngestError('Upload was interrupted before it completed', 400)
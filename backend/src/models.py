@@ -1,5 +1,7 @@
 import uuid
 from datetime import datetime, timezone
+from sqlalchemy import event, select
+from sqlalchemy.dialects import postgresql
 from src.extensions import db
 
 
@@ -22,6 +24,8 @@ class User(db.Model):
     is_verified = db.Column(db.Boolean, default=False)
     storage_used = db.Column(db.BigInteger, default=0)
     storage_limit = db.Column(db.BigInteger, default=21474836480)  # 20 GB
+    # Bumped on every change to the live folder hierarchy (see src/tree.py)
+    tree_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
     updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc),
                            onupdate=lambda: datetime.now(timezone.utc))
@@ -45,6 +49,13 @@ class File(db.Model):
 
     parent_id = db.Column(db.String(36), db.ForeignKey('file.id'), nullable=True)
     owner_id = db.Column(db.String(36), db.ForeignKey('user.id'), nullable=False)
+    # Materialized path of ancestor ids, '/<root id>/.../<own id>/' (see src/tree.py).
+    # Byte-wise collation so prefix range scans use the index on PostgreSQL.
+    path = db.Column(db.Text().with_variant(postgresql.TEXT(collation='C'), 'postgresql'), nullable=True)
+    # Folder rollups over live (non-trashed) content, maintained by src/tree.py
+    child_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    tree_file_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    tree_size = db.Column(db.BigInteger, nullable=False, default=0, server_default='0')
 
     is_starred = db.Column(db.Boolean, default=False)
     is_locked = db.Column(db.Boolean, default=False)
@@ -54,6 +65,8 @@ class File(db.Model):
     original_parent_id = db.Column(db.String(36), nullable=True)
 
     storage_path = db.Column(db.String(500), nullable=True)
+    sha1 = db.Column(db.String(40), nullable=True)
+    sha256 = db.Column(db.String(64), nullable=True, index=True)
     preview_url = db.Column(db.String(500), nullable=True)
 
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
@@ -66,12 +79,110 @@ class File(db.Model):
 
     __table_args__ = (
         db.Index('ix_file_owner_parent', 'owner_id', 'parent_id'),
-        db.Index('ix_file_owner_starred', 'owner_id', 'is_starred'),
-        db.Index('ix_file_owner_trashed', 'owner_id', 'is_trashed'),
         db.Index('ix_file_owner_updated', 'owner_id', 'updated_at'),
+        db.Index('ix_file_owner_path', 'owner_id', 'path'),
+        # Keyset pagination of folder listings, one per sort column
+        db.Index('ix_file_listing_name', 'owner_id', 'parent_id', 'is_trashed', 'is_folder', 'name', 'id'),
+        db.Index('ix_file_listing_size', 'owner_id', 'parent_id', 'is_trashed', 'is_folder', 'size', 'id'),
+        db.Index('ix_file_listing_updated', 'owner_id', 'parent_id', 'is_trashed', 'is_folder', 'updated_at', 'id'),
+        # Search filters (routes/search.py); each can drive a query on its own
+        db.Index('ix_file_search_path', 'owner_id', 'is_trashed', 'path'),
+        db.Index('ix_file_search_size', 'owner_id', 'is_trashed', 'size'),
+        db.Index('ix_file_search_updated', 'owner_id', 'is_trashed', 'updated_at'),
+        db.Index('ix_file_search_created', 'owner_id', 'is_trashed', 'created_at'),
+        db.Index('ix_file_search_mime', 'owner_id', 'is_trashed', 'mime_type'),
+        db.Index('ix_file_search_starred', 'owner_id', 'is_trashed', 'is_starred', 'updated_at'),
+        db.Index('ix_file_search_locked', 'owner_id', 'is_trashed', 'is_locked', 'updated_at'),
+        # Covers the folder-tree query: live folders of an owner in path order
+        db.Index('ix_file_folder_tree', 'owner_id', 'is_folder', 'is_trashed', 'path', 'parent_id', 'name', 'id'),
     )
 
 
+@event.listens_for(File, 'before_insert')
+def _place_new_file(mapper, connection, target):
+    # New rows hang below their parent and count towards its rollups;
+    # moves, trash and restore go through src/tree.py
+    from src.tree import attach_statement, version_statement
+    if target.path is None:
+        if target.id is None:
+            target.id = generate_uuid()
+        parent_path = '/'
+        if target.parent_id:
+            # Routes check the parent first (tree.live_folder); this keeps a
+            # stray id from reaching another tree's rollups
+            parent = connection.execute(select(File.path, File.is_trashed).where(
+                File.id == target.parent_id, File.owner_id == target.owner_id, File.is_folder == True,
+            )).first()
+            if parent is None or (parent.is_trashed and not target.is_trashed):
+                raise ValueError(f'{target.parent_id} is not a live folder of {target.owner_id}')
+            parent_path = parent.path
+        target.path = parent_path + target.id + '/'
+    if target.parent_id and not target.is_trashed:
+        if target.is_folder:
+            stmt = attach_statement(target.owner_id, target.path, 1, target.tree_file_count or 0, target.tree_size or 0)
+        else:
+            stmt = attach_statement(target.owner_id, target.path, 1, 1, target.size or 0)
+        connection.execute(stmt)
+    if target.is_folder and not target.is_trashed:
+        connection.execute(version_statement(target.owner_id))
+
+
+@event.listens_for(File, 'before_insert')
+def _count_new_file(mapper, connection, target):
+    # Every stored file counts towards its owner's usage until it is purged
+    from src.usage import add_statement, category_for
+    if not target.is_folder:
+        connection.execute(add_statement(
+            connection.dialect.name, target.owner_id, category_for(target.mime_type), target.size or 0, 1,
+        ))
+
+
+class Blob(db.Model):
+    __tablename__ = 'blob'
+
+    sha256 = db.Column(db.String(64), primary_key=True)
+    size = db.Column(db.BigInteger, nullable=False)
+    storage_path = db.Column(db.String(500), nullable=False)
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+
+
+class StorageUsage(db.Model):
+    """Bytes and file count per user and storage category (see src/usage.py)."""
+    __tablename__ = 'storage_usage'
+
+    user_id = db.Column(db.String(36), db.ForeignKey('user.id'), primary_key=True)
+    category = db.Column(db.String(20), primary_key=True)
+    bytes = db.Column(db.BigInteger, nullable=False, default=0)
+    files = db.Column(db.Integer, nullable=False, default=0)
+
+
+class UploadSession(db.Model):
+    __tablename__ = 'upload_session'
+
+    id = db.Column(db.String(36), primary_key=True, default=generate_uuid)
+    user_id = db.Column(db.String(36), db.ForeignKey('user.id'), nullable=False, index=True)
+    parent_id = db.Column(db.String(36), nullable=True)
+    name = db.Column(db.String(255), nullable=False)
+    size = db.Column(db.BigInteger, nullable=False)
+    storage_path = db.Column(db.String(500), nullable=False)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+    chunks = db.relationship('UploadChunk', backref='session', lazy='dynamic',
+                             cascade='all, delete-orphan')
+
+
+class UploadChunk(db.Model):
+    __tablename__ = 'upload_chunk'
+
+    id = db.Column(db.String(36), primary_key=True, default=generate_uuid)
+    session_id = db.Column(db.String(36), db.ForeignKey('upload_session.id'), nullable=False, index=True)
+    offset = db.Column(db.BigInteger, nullable=False)
+    length = db.Column(db.BigInteger, nullable=False)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+
+
 class UserSettings(db.Model):
     __tablename__ = 'user_settings'
 
@@ -111,6 +222,10 @@ class SharedFile(db.Model):
     shared_by = db.relationship('User', foreign_keys=[shared_by_id])
     shared_with = db.relationship('User', foreign_keys=[shared_with_id])
 
+    __table_args__ = (
+        db.Index('ix_shared_file_with', 'shared_with_id', 'shared_by_id', 'file_id'),
+    )
+
 
 class ActivityLog(db.Model):
     __tablename__ = 'activity_log'
@@ -120,8 +235,17 @@ class ActivityLog(db.Model):
     file_id = db.Column(db.String(36), db.ForeignKey('file.id'), nullable=True)
     action = db.Column(db.String(50), nullable=False)
     details = db.Column(db.JSON, nullable=True)
+    # Part of the primary key because PostgreSQL partitions the table on it
+    # (see src/retention.py)
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc),
-                           index=True)
+                           primary_key=True, index=True)
+
+    __table_args__ = (
+        # Keyset pages of one user's history, optionally for a single action
+        db.Index('ix_activity_user_created', 'user_id', 'created_at', 'id'),
+        db.Index('ix_activity_user_action', 'user_id', 'action', 'created_at', 'id'),
+        {'postgresql_partition_by': 'RANGE (created_at)'},
+    )
 
 
 class GitHubConnection(db.Model):
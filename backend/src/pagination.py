@@ -0,0 +1,49 @@
+import json
+import base64
+from datetime import datetime
+from sqlalchemy import and_, or_
+
+# Keyset ("seek") pagination helpers. A cursor is the sort key of the last
+# row of a page, base64-encoded JSON; it only ever narrows the caller's own
+# query, so it is not signed.
+
+
+def encode_cursor(values):
+    def encode(v):
+        return {'dt': v.isoformat()} if isinstance(v, datetime) else v
+    raw = json.dumps([encode(v) for v in values], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token, length):
+    """Return the list of key values in token, or None if it is malformed."""
+    def decode(v):
+        return datetime.fromisoformat(v['dt']) if isinstance(v, dict) else v
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != length:
+            return None
+        return [decode(v) for v in values]
+    except (ValueError, TypeError, KeyError):
+        return None
+
+
+def after(keys, values):
+    """Filter for rows strictly after values in the order given by keys.
+
+    keys is a list of (column, descending) pairs, the same ones passed to
+    order_by, last key unique. Mixed directions are expanded into the
+    (a > x) OR (a = x AND b > y) ... form, which every dialect can match
+    against a composite index.
+    """
+    clauses = []
+    for i, (column, descending) in enumerate(keys):
+        equal = [c == v for (c, _), v in zip(keys[:i], values[:i])]
+        step = column < values[i] if descending else column > values[i]
+        clauses.append(and_(*equal, step))
+    return or_(*clauses)
+
+
+def order_by(keys):
+    return [column.desc() if descending else column.asc() for column, descending in keys]
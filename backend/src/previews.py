@@ -0,0 +1,144 @@
+import os
+import shutil
+import logging
+import subprocess
+import tempfile
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import update
+from src import tasks
+from src.extensions import db
+from src.models import File
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # previews are optional; uploads work without Pillow
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+PREVIEW_SIZE = (320, 320)
+PREVIEW_QUALITY = 80
+PDF_TIMEOUT = 30
+# Decoding more pixels than this for a 320px tile is not worth a worker
+MAX_SOURCE_PIXELS = 80_000_000
+IMAGE_MIME_TYPES = {
+    'image/jpeg', 'image/png', 'image/gif', 'image/webp', 'image/bmp', 'image/tiff',
+}
+
+
+def can_preview(mime_type):
+    if Image is None or not mime_type:
+        return False
+    if mime_type == 'application/pdf':
+        return shutil.which('pdftoppm') is not None
+    return mime_type in IMAGE_MIME_TYPES
+
+
+def preview_path(f):
+    """Previews are keyed by content, so copies and re-uploads share one."""
+    key = f.sha256 or f.id
+    return os.path.join(current_app.config['UPLOAD_FOLDER'], 'previews', key[:2], key + '.webp')
+
+
+def _render_image(src, dest):
+    with Image.open(src) as im:
+        if im.width * im.height > MAX_SOURCE_PIXELS:
+            raise ValueError(f'{im.width}x{im.height} image is too large to preview')
+        im.draft('RGB', PREVIEW_SIZE)  # JPEG: let libjpeg downscale while decoding
+        im = ImageOps.exif_transpose(im)
+        im.thumbnail(PREVIEW_SIZE)
+        if im.mode not in ('RGB', 'RGBA'):
+            im = im.convert('RGBA' if 'transparency' in im.info or im.mode in ('LA', 'PA') else 'RGB')
+        im.save(dest, 'WEBP', quality=PREVIEW_QUALITY, method=4)
+
+
+def _render_pdf(src, dest):
+    with tempfile.TemporaryDirectory() as tmp:
+        prefix = os.path.join(tmp, 'page')
+        subprocess.run(
+            ['pdftoppm', '-f', '1', '-l', '1', '-singlefile', '-png',
+             '-scale-to', str(max(PREVIEW_SIZE)), src, prefix],
+            check=True, capture_output=True, timeout=PDF_TIMEOUT,
+        )
+        _render_image(prefix + '.png', dest)
+
+
+def generate_preview(file_id):
+    """Background task: render the thumbnail of a file and set preview_url."""
+    f = db.session.get(File, file_id)
+    if not f or f.is_folder or not f.storage_path or not can_preview(f.mime_type):
+        return
+
+    dest = preview_path(f)
+    if not os.path.exists(dest):
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        tmp = f'{dest}.{os.getpid()}.{file_id}.part'
+        try:
+            if f.mime_type == 'application/pdf':
+                _render_pdf(f.storage_path, tmp)
+            else:
+                _render_image(f.storage_path, tmp)
+            os.replace(tmp, dest)
+        except Exception as e:
+            logger.warning('Preview failed for %s: %s', file_id, e)
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            return
+
+    # Core UPDATE keeping updated_at: a thumbnail does not modify the file
+    db.session.execute(
+        update(File).where(File.id == f.id)
+        .values(preview_url=f'/api/files/{f.id}/thumbnail', updated_at=File.updated_at)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+
+
+def schedule(f):
+    """Queue preview generation for a freshly committed file."""
+    if not f.preview_url and can_preview(f.mime_type):
+        tasks.submit(('preview', f.id), generate_preview, f.id)
+
+
+def remove(key):
+    """Drop the preview stored under key (a collected blob digest or legacy file id)."""
+    path = os.path.join(current_app.config['UPLOAD_FOLDER'], 'previews', key[:2], key + '.webp')
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+@click.command('backfill-previews')
+@click.option('--batch', default=200, help='Files loaded per query.')
+@with_appcontext
+def backfill_command(batch):
+    """Generate missing previews for files uploaded before the pipeline existed."""
+    if Image is None:
+        raise click.ClickException('Pillow is not installed')
+
+    done = failed = 0
+    last_id = ''
+    while True:
+        rows = (
+            db.session.query(File.id, File.mime_type)
+            .filter(File.is_folder == False, File.preview_url.is_(None), File.storage_path.isnot(None), File.id > last_id)
+            .order_by(File.id)
+            .limit(batch)
+            .all()
+        )
+        if not rows:
+            break
+        last_id = rows[-1].id
+        for file_id, mime_type in rows:
+            if not can_preview(mime_type):
+                continue
+            generate_preview(file_id)
+            if db.session.get(File, file_id).preview_url:
+                done += 1
+            else:
+                failed += 1
+        db.session.expunge_all()
+    click.echo(f'{done} previews generated, {failed} failed')
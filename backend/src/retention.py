@@ -0,0 +1,214 @@
+import os
+import re
+import gzip
+import json
+import shutil
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import delete, event, select
+from src.extensions import db
+from src.models import ActivityLog
+
+# ActivityLog retention. Rows older than ACTIVITY_RETENTION_DAYS leave the
+# hot table for one gzip'd JSON-lines file per user and month under
+# ACTIVITY_ARCHIVE_FOLDER, and history reads through to those files once the
+# hot rows run out. On PostgreSQL activity_log is range-partitioned by month,
+# so a month past the horizon ends up as an empty partition that is dropped
+# whole; on SQLite the batched deletes are what keep the table bounded.
+
+BATCH = 5000
+MONTHS_AHEAD = 2  # partitions created ahead of the current month
+_PARTITION = re.compile(r'^activity_log_p(\d{4})(\d{2})$')
+
+
+def month_start(dt):
+    return dt.replace(day=1, hour=0, minute=0, second=0, microsecond=0, tzinfo=None)
+
+
+def next_month(month):
+    return (month.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def horizon(now=None):
+    now = now or datetime.now(timezone.utc)
+    return now.replace(tzinfo=None) - timedelta(days=current_app.config['ACTIVITY_RETENTION_DAYS'])
+
+
+# -- PostgreSQL partitions ------------------------------------------------
+
+def _partition_name(month):
+    return f'activity_log_p{month:%Y%m}'
+
+
+def ensure_partitions(conn, now=None):
+    """Create the monthly partitions from the current month to MONTHS_AHEAD ahead.
+
+    Rows that landed in the default partition meanwhile are moved into the
+    new partition before it is attached, which PostgreSQL requires.
+    """
+    month = month_start(now or datetime.now(timezone.utc))
+    existing = set(_partitions(conn))
+    for _ in range(MONTHS_AHEAD + 1):
+        if month not in existing:
+            name = _partition_name(month)
+            # Bounds come from datetimes, not input, so they are inlined into the DDL
+            lo, hi = f"'{month:%Y-%m-%d}'", f"'{next_month(month):%Y-%m-%d}'"
+            in_range = f'created_at >= {lo} AND created_at < {hi}'
+            conn.exec_driver_sql(f'CREATE TABLE {name} (LIKE activity_log INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+            conn.exec_driver_sql(f'INSERT INTO {name} SELECT * FROM activity_log_default WHERE {in_range}')
+            conn.exec_driver_sql(f'DELETE FROM activity_log_default WHERE {in_range}')
+            conn.exec_driver_sql(f'ALTER TABLE activity_log ATTACH PARTITION {name} FOR VALUES FROM ({lo}) TO ({hi})')
+        month = next_month(month)
+
+
+def drop_partitions(conn, before):
+    """Drop the empty monthly partitions that end on or before `before`."""
+    dropped = 0
+    for month, name in sorted(_partitions(conn).items()):
+        if next_month(month) > before:
+            break
+        if conn.exec_driver_sql(f'SELECT 1 FROM {name} LIMIT 1').first() is None:
+            conn.exec_driver_sql(f'DROP TABLE {name}')
+            dropped += 1
+    return dropped
+
+
+def _partitions(conn):
+    rows = conn.exec_driver_sql(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid"
+        " WHERE i.inhparent = 'activity_log'::regclass"
+    )
+    months = {}
+    for (name,) in rows:
+        m = _PARTITION.match(name)
+        if m:
+            months[datetime(int(m.group(1)), int(m.group(2)), 1)] = name
+    return months
+
+
+@event.listens_for(ActivityLog.__table__, 'after_create')
+def _install(target, connection, **kw):
+    if connection.dialect.name == 'postgresql':
+        connection.exec_driver_sql('CREATE TABLE IF NOT EXISTS activity_log_default PARTITION OF activity_log DEFAULT')
+        ensure_partitions(connection)
+
+
+# -- Archive files --------------------------------------------------------
+
+def _user_dir(user_id):
+    return os.path.join(current_app.config['ACTIVITY_ARCHIVE_FOLDER'], user_id)
+
+
+def _record(row):
+    return {
+        'id': row.id, 'user_id': row.user_id, 'file_id': row.file_id, 'action': row.action,
+        'details': row.details, 'created_at': row.created_at.isoformat(),
+    }
+
+
+def _append(user_id, month, rows):
+    os.makedirs(_user_dir(user_id), exist_ok=True)
+    path = os.path.join(_user_dir(user_id), f'{month:%Y-%m}.jsonl.gz')
+    # Every append is a new gzip member; readers see one stream
+    with open(path, 'ab') as raw:
+        with gzip.GzipFile(fileobj=raw, mode='ab') as gz:
+            for row in rows:
+                gz.write(json.dumps(_record(row), separators=(',', ':')).encode() + b'\n')
+        raw.flush()
+        os.fsync(raw.fileno())
+
+
+def archive(before):
+    """Move every row created before `before` into the archive; return the count.
+
+    Rows are written and synced before they are deleted, so a crash can
+    only leave a row in both places; readers drop such duplicates.
+    """
+    table = ActivityLog.__table__
+    moved = 0
+    while True:
+        rows = db.session.execute(
+            select(table).where(table.c.created_at < before)
+            .order_by(table.c.created_at, table.c.id).limit(BATCH)
+        ).all()
+        if not rows:
+            return moved
+        groups = defaultdict(list)
+        for row in rows:
+            groups[(row.user_id, month_start(row.created_at))].append(row)
+        for (user_id, month), group in groups.items():
+            _append(user_id, month, group)
+        db.session.execute(delete(table).where(
+            table.c.created_at < before, table.c.id.in_([row.id for row in rows])))
+        db.session.commit()
+        moved += len(rows)
+
+
+def _load(path):
+    seen, rows = set(), []
+    with gzip.open(path, 'rt', encoding='utf-8') as fh:
+        for line in fh:
+            record = json.loads(line)
+            if record['id'] not in seen:
+                seen.add(record['id'])
+                record['created_at'] = datetime.fromisoformat(record['created_at'])
+                rows.append(record)
+    return rows
+
+
+def read_archive(user_id, limit, cursor=None, actions=None, after=None, before=None):
+    """Archived activity of user_id, newest first, as transient ActivityLog objects.
+
+    cursor is the (created_at, id) the page continues from; after/before and
+    actions filter like the history endpoint does.
+    """
+    directory = _user_dir(user_id)
+    if not os.path.isdir(directory):
+        return []
+    found = []
+    for name in sorted(os.listdir(directory), reverse=True):
+        try:
+            month = datetime.strptime(name[:7], '%Y-%m')
+        except ValueError:
+            continue
+        if (cursor and month > cursor[0]) or (before and month >= before):
+            continue
+        if after and next_month(month) <= after:
+            break
+        rows = [
+            r for r in _load(os.path.join(directory, name))
+            if (not cursor or (r['created_at'], r['id']) < tuple(cursor))
+            and (not actions or r['action'] in actions)
+            and (not after or r['created_at'] >= after)
+            and (not before or r['created_at'] < before)
+        ]
+        rows.sort(key=lambda r: (r['created_at'], r['id']), reverse=True)
+        found += rows
+        # Months are disjoint, so once one fills the page the rest are older
+        if len(found) >= limit:
+            break
+    return [ActivityLog(**r) for r in found[:limit]]
+
+
+def remove_archive(user_id):
+    shutil.rmtree(_user_dir(user_id), ignore_errors=True)
+
+
+@click.command('archive-activity')
+@click.option('--days', type=int, default=None, help='Override ACTIVITY_RETENTION_DAYS.')
+@with_appcontext
+def archive_command(days):
+    """Archive activity past the retention horizon and maintain partitions."""
+    if days is not None:
+        current_app.config['ACTIVITY_RETENTION_DAYS'] = days
+    cutoff = horizon()
+    moved = archive(cutoff)
+    dropped = 0
+    if db.engine.dialect.name == 'postgresql':
+        with db.engine.begin() as conn:
+            ensure_partitions(conn)
+            dropped = drop_partitions(conn, cutoff)
+    click.echo(f'{moved} activity rows archived, {dropped} partitions dropped')
@@ -1,6 +1,7 @@
 from flask import Blueprint, request, jsonify, g
 from sqlalchemy import func
-from datetime import datetime, timezone, timedelta
+from datetime import datetime, timezone
+from src import activity, stats
 from src.extensions import db
 from src.models import User, File, ActivityLog, SharedFile
 from src.utils import format_file_size, format_relative_time
@@ -35,47 +36,36 @@ ACTION_VERBS = {
 }
 
 
+# Activity rows read for quick access, however many are needed to fill it
+QUICK_ACCESS_SCAN = 200
+
+
 @dashboard_bp.route('/api/dashboard/stats')
 @login_required
 def dashboard_stats():
-    user = db.session.get(User, g.current_user_id)
+    counters = stats.get(g.current_user_id)
+    if counters is None:
+        return jsonify({'error': 'User not found'}), 404
     now = datetime.now(timezone.utc)
-    week_ago = now - timedelta(days=7)
-
-    total_files = File.query.filter_by(
-        owner_id=g.current_user_id, is_trashed=False
-    ).count()
-
-    files_this_week = File.query.filter(
-        File.owner_id == g.current_user_id,
-        File.is_trashed == False,
-        File.created_at >= week_ago,
-    ).count()
-
-    trash_items = File.query.filter_by(
-        owner_id=g.current_user_id, is_trashed=True
-    ).count()
 
     # Calculate auto-delete countdown
-    oldest_trash = File.query.filter_by(
-        owner_id=g.current_user_id, is_trashed=True
-    ).order_by(File.trashed_at.asc()).first()
-
-    if oldest_trash and oldest_trash.trashed_at:
-        days_in_trash = (now - oldest_trash.trashed_at.replace(tzinfo=timezone.utc)).days
+    oldest_trash = counters['oldest_trash']
+    if oldest_trash:
+        days_in_trash = (now - oldest_trash.replace(tzinfo=timezone.utc)).days
         auto_delete_days = max(30 - days_in_trash, 0)
         trash_auto_delete = f"{auto_delete_days}d"
     else:
         trash_auto_delete = "30d"
 
+    used, limit = counters['storage_used'], counters['storage_limit']
     return jsonify({
-        'total_files': total_files,
-        'total_files_change': f"+{files_this_week} this week",
-        'storage_used': format_file_size(user.storage_used),
-        'storage_percentage': round(user.storage_used / user.storage_limit * 100) if user.storage_limit else 0,
-        'shared_files': 0,
-        'shared_files_change': '+0 this week',
-        'trash_items': trash_items,
+        'total_files': counters['total_files'],
+        'total_files_change': f"+{counters['files_this_week']} this week",
+        'storage_used': format_file_size(used),
+        'storage_percentage': round(used / limit * 100) if limit else 0,
+        'shared_files': counters['shared_files'],
+        'shared_files_change': f"+{counters['shared_this_week']} this week",
+        'trash_items': counters['trash_items'],
         'trash_auto_delete': trash_auto_delete,
     })
 
@@ -90,12 +80,10 @@ def dashboard_activity():
     ).order_by(ActivityLog.created_at.desc()).limit(limit).all()
 
     result = []
-    for act in activities:
-        user = db.session.get(User, act.user_id)
+    for act, file_obj, user in activity.resolve(activities, users=True):
         if not user:
             continue
 
-        file_obj = db.session.get(File, act.file_id) if act.file_id else None
         initials = user.first_name[0] + user.last_name[0]
 
         is_current = user.id == g.current_user_id
@@ -124,12 +112,13 @@ def dashboard_activity():
 def dashboard_quick_access():
     limit = request.args.get('limit', 4, type=int)
 
-    # Get recent file activities for current user
+    # Only the most recent activities are considered; files beyond them come
+    # from the recent-uploads fallback below
     activities = ActivityLog.query.filter(
         ActivityLog.user_id == g.current_user_id,
         ActivityLog.file_id.isnot(None),
         ActivityLog.action.in_(['file_edited', 'file_viewed', 'file_uploaded']),
-    ).order_by(ActivityLog.created_at.desc()).all()
+    ).order_by(ActivityLog.created_at.desc()).limit(QUICK_ACCESS_SCAN).all()
 
     seen_files = set()
     result = []
@@ -140,13 +129,12 @@ def dashboard_quick_access():
         'file_uploaded': 'Uploaded',
     }
 
-    for act in activities:
+    live = (File.is_trashed == False, File.is_folder == False)
+    for act, file_obj, _ in activity.resolve(activities, file_criteria=live):
         if act.file_id in seen_files:
             continue
         seen_files.add(act.file_id)
-
-        file_obj = db.session.get(File, act.file_id)
-        if not file_obj or file_obj.is_trashed or file_obj.is_folder:
+        if not file_obj:
             continue
 
         label = action_labels.get(act.action, 'Accessed')
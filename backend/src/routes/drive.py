@@ -1,26 +1,25 @@
-import os
-from flask import Blueprint, request, jsonify, g
+from flask import Blueprint, Response, request, jsonify, g
+from sqlalchemy import and_, func, select
+from src import activity, pagination
 from src.extensions import db
-from src.models import File, ActivityLog
+from src.models import File, User
 from src.utils import format_file_size, format_relative_time
-from src.auth import login_required
+from src.auth import login_required, sign_media_url
+from src.tree import live_folder, under, load_ancestors
 
 drive_bp = Blueprint('drive', __name__)
 
+MAX_PAGE_SIZE = 500
+
 
 def build_breadcrumbs(folder):
-    """Build breadcrumb trail from a folder up to root."""
+    """Build breadcrumb trail from root down to folder."""
     crumbs = [{'id': None, 'name': 'My Drive'}]
     if folder is None:
         return crumbs
 
-    chain = []
-    current = folder
-    while current is not None:
-        chain.append({'id': current.id, 'name': current.name})
-        current = current.parent
-    chain.reverse()
-    return crumbs + chain
+    chain = load_ancestors(folder) + [folder]
+    return crumbs + [{'id': f.id, 'name': f.name} for f in chain]
 
 
 @drive_bp.route('/api/drive/contents')
@@ -44,18 +43,48 @@ def drive_contents():
     else:
         query = query.filter(File.parent_id.is_(None))
 
-    # Sort
     if sort_by == 'size':
         sort_col = File.size
     elif sort_by == 'modified':
         sort_col = File.updated_at
     else:
         sort_col = File.name
+    descending = order == 'desc'
+    keys = [(sort_col, descending), (File.id, descending)]
+
+    # Folders come first, so the listing is two keyset scans (folders, then
+    # files), each a pure range on the matching ix_file_listing_* index.
+    # The cursor is [is_folder, sort value, id] of the last row sent.
+    # Without limit the whole folder is returned, as before.
+    limit = request.args.get('limit', type=int)
+    if limit:
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+    cursor = None
+    if request.args.get('cursor'):
+        cursor = pagination.decode_cursor(request.args['cursor'], 3)
+        if cursor is None:
+            return jsonify({'error': 'Invalid cursor'}), 400
 
-    if order == 'desc':
-        sort_col = sort_col.desc()
+    items = []
+    for is_folder in (True, False):
+        if cursor and cursor[0] is False and is_folder:
+            continue
+        section = query.filter(File.is_folder == is_folder)
+        if cursor and cursor[0] is is_folder:
+            section = section.filter(pagination.after(keys, cursor[1:]))
+        section = section.order_by(*pagination.order_by(keys))
+        if limit:
+            items += section.limit(limit + 1 - len(items)).all()
+            if len(items) > limit:
+                break
+        else:
+            items += section.all()
 
-    items = query.order_by(sort_col).all()
+    next_cursor = None
+    if limit and len(items) > limit:
+        items = items[:limit]
+        last = items[-1]
+        next_cursor = pagination.encode_cursor([last.is_folder, getattr(last, sort_col.key), last.id])
 
     # Separate folders and files
     folders = []
@@ -63,13 +92,13 @@ def drive_contents():
 
     for item in items:
         if item.is_folder:
-            items_count = File.query.filter_by(
-                parent_id=item.id, is_trashed=False
-            ).count()
             folders.append({
                 'id': item.id,
                 'name': item.name,
-                'items_count': items_count,
+                'items_count': item.child_count,
+                'files_count': item.tree_file_count,
+                'size': item.tree_size,
+                'formatted_size': format_file_size(item.tree_size),
                 'icon': item.icon,
                 'icon_color': item.icon_color,
                 'icon_bg': item.icon_bg or 'bg-yellow-50 dark:bg-yellow-500/10',
@@ -80,7 +109,8 @@ def drive_contents():
                 'updated_at': item.updated_at.isoformat() + 'Z' if item.updated_at else None,
             })
         else:
-            has_content = bool(item.storage_path and os.path.exists(item.storage_path))
+            # Content is written before its row is committed; no stat per file
+            has_content = bool(item.storage_path)
             files.append({
                 'id': item.id,
                 'name': item.name,
@@ -93,6 +123,8 @@ def drive_contents():
                 'is_starred': item.is_starred,
                 'is_locked': item.is_locked,
                 'has_content': has_content,
+                'media_url': sign_media_url(item.id, item.owner_id) if has_content else None,
+                'thumbnail_url': sign_media_url(item.id, item.owner_id, 'thumbnail') if item.preview_url else None,
                 'updated_at': item.updated_at.isoformat() + 'Z' if item.updated_at else None,
                 'formatted_date': format_relative_time(item.updated_at),
             })
@@ -113,6 +145,7 @@ def drive_contents():
         'breadcrumbs': breadcrumbs,
         'folders': folders,
         'files': files,
+        'next_cursor': next_cursor,
     }
 
     return jsonify(result)
@@ -132,6 +165,8 @@ def create_folder():
 
     if parent_id in ('null', '', 'undefined', None):
         parent_id = None
+    if parent_id and not live_folder(g.current_user_id, parent_id):
+        return jsonify({'error': 'Parent folder not found'}), 404
 
     # Check duplicate name
     existing = File.query.filter_by(
@@ -155,12 +190,7 @@ def create_folder():
     )
     db.session.add(folder)
 
-    log = ActivityLog(
-        user_id=g.current_user_id,
-        file_id=folder.id,
-        action='folder_created',
-    )
-    db.session.add(log)
+    activity.record(g.current_user_id, 'folder_created', folder)
     db.session.commit()
 
     return jsonify({
@@ -170,3 +200,57 @@ def create_folder():
         'parent_id': folder.parent_id,
         'created_at': folder.created_at.isoformat() + 'Z',
     }), 201
+
+
+def _depth(path):
+    return func.length(path) - func.length(func.replace(path, '/', ''))
+
+
+@drive_bp.route('/api/drive/tree')
+@login_required
+def folder_tree():
+    """Live folders as a flat adjacency list, parents before children.
+
+    ?root=<folder id> limits the tree to that folder's subtree (root
+    included), ?depth=N to N levels below it. The response is tagged with
+    the user's tree_version, so clients can revalidate with If-None-Match
+    and get a 304 until a folder is created, renamed, moved, trashed or
+    restored.
+    """
+    root_id = request.args.get('root') or None
+    if root_id in ('null', 'undefined'):
+        root_id = None
+    depth = request.args.get('depth', type=int)
+    if depth is not None and depth < 1:
+        return jsonify({'error': 'depth must be at least 1'}), 400
+
+    version = db.session.scalar(select(User.tree_version).where(User.id == g.current_user_id))
+    etag = f'tree-{version}'
+    if request.if_none_match.contains(etag):
+        resp = Response(status=304)
+    else:
+        live = and_(File.owner_id == g.current_user_id, File.is_folder == True, File.is_trashed == False)
+        level = _depth(File.path).label('level')
+        query = select(File.id, File.parent_id, File.name, level).where(live).order_by(File.path)
+        base = 1
+        if root_id:
+            root_path = db.session.scalar(select(File.path).where(live, File.id == root_id))
+            if not root_path:
+                return jsonify({'error': 'Folder not found'}), 404
+            query = query.where(under(root_path))
+            base = root_path.count('/')
+        if depth is not None:
+            # One level more than asked, only to fill in has_children
+            query = query.where(level <= base + depth + 1)
+
+        rows = db.session.execute(query).all()
+        parents = {r.parent_id for r in rows}
+        folders = [
+            {'id': r.id, 'parent_id': r.parent_id, 'name': r.name, 'has_children': r.id in parents}
+            for r in rows if depth is None or r.level <= base + depth
+        ]
+        resp = jsonify({'version': version, 'root_id': root_id, 'folders': folders})
+
+    resp.set_etag(etag)
+    resp.headers['Cache-Control'] = 'private, no-cache'
+    return resp
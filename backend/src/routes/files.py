@@ -1,13 +1,23 @@
 import os
 import uuid
 import logging
-import magic
-from flask import Blueprint, request, jsonify, current_app, send_file, g
+import time
+from flask import Blueprint, Response, request, jsonify, current_app, g
 from werkzeug.utils import secure_filename
+from sqlalchemy import or_
+from src import activity, blobstore, content_index, previews, tasks
+from src.downloads import send_derived_file, send_stored_file
 from src.extensions import db
-from src.models import File, User, ActivityLog, SharedFile
+from src.models import File, User, SharedFile
 from src.utils import get_icon_for_mime, format_file_size, format_relative_time
-from src.auth import login_required
+from src.auth import login_required, sign_media_url, verify_media_signature
+from src.tree import (
+    attach, collect_subtree, detach, is_descendant, live_folder, load_ancestors, reparent, touch, trash_subtree,
+)
+from src.zipstream import build_entries, content_disposition, iter_zip
+from src.ingest import (
+    Ingest, IngestError, MULTIPART_OVERHEAD, check_declared_size, fill_checksums, stream_multipart,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -36,106 +46,221 @@ ALLOWED_MIME_PREFIXES = [
 BLOCKED_MIME_TYPES = {'image/svg+xml', 'text/html', 'application/xhtml+xml'}
 
 
-@files_bp.route('/api/files/upload', methods=['POST'])
-@login_required
-def upload_file():
-    if 'file' not in request.files:
-        return jsonify({'error': 'No file provided'}), 400
-
-    file = request.files['file']
-    if file.filename == '':
-        return jsonify({'error': 'No file selected'}), 400
-
-    # Sanitize filename
-    original_name = file.filename
-    safe_name = secure_filename(file.filename)
+def validate_upload_name(filename):
+    """Return (safe_name, ext, error) for a client-supplied filename."""
+    safe_name = secure_filename(filename or '')
     if not safe_name:
-        return jsonify({'error': 'Invalid filename'}), 400
+        return None, None, 'Invalid filename'
 
-    # Validate extension
     ext = os.path.splitext(safe_name)[1].lower()
     if ext and ext not in ALLOWED_EXTENSIONS:
-        return jsonify({'error': f'File type {ext} is not allowed'}), 400
-
-    # Validate MIME type via magic bytes (ignores browser-supplied Content-Type)
-    real_mime = magic.from_buffer(file.read(2048), mime=True)
-    file.seek(0)
-    if real_mime in BLOCKED_MIME_TYPES:
-        return jsonify({'error': f'File type {real_mime} is not allowed'}), 400
-    if not any(real_mime.startswith(p) for p in ALLOWED_MIME_PREFIXES):
-        return jsonify({'error': f'File type {real_mime} is not allowed'}), 400
-    mime_type = real_mime
-
-    # Check file size
-    file.seek(0, os.SEEK_END)
-    file_size = file.tell()
-    file.seek(0)
-    if file_size > MAX_FILE_SIZE:
-        return jsonify({'error': 'File too large. Maximum size is 100 MB'}), 413
-
-    # Check user storage quota
-    user = db.session.get(User, g.current_user_id)
-    if user and (user.storage_used + file_size) > user.storage_limit:
-        return jsonify({'error': 'Storage quota exceeded. Free up space or upgrade your plan.'}), 413
+        return None, None, f'File type {ext} is not allowed'
+    return safe_name, ext, None
 
-    parent_id = request.form.get('parent_id')
-    if parent_id in ('null', '', 'undefined', 'None'):
-        parent_id = None
 
-    # Save to user-specific directory
-    upload_folder = current_app.config['UPLOAD_FOLDER']
-    user_dir = os.path.join(upload_folder, 'files', g.current_user_id)
-    os.makedirs(user_dir, exist_ok=True)
-
-    file_uuid = str(uuid.uuid4())
-    stored_name = file_uuid + ext
-    save_path = os.path.join(user_dir, stored_name)
-    file.save(save_path)
+def validate_mime(mime_type):
+    """Return an error message if content of this MIME type may not be stored."""
+    if mime_type in BLOCKED_MIME_TYPES:
+        return f'File type {mime_type} is not allowed'
+    if not any(mime_type.startswith(p) for p in ALLOWED_MIME_PREFIXES):
+        return f'File type {mime_type} is not allowed'
+    return None
 
-    file_size = os.path.getsize(save_path)
 
-    icon, icon_color, icon_bg = get_icon_for_mime(mime_type, original_name)
+def record_upload(user, name, mime_type, size, storage_path, parent_id, sha1=None, sha256=None):
+    """Create the File row and activity entry for content already on disk."""
+    icon, icon_color, icon_bg = get_icon_for_mime(mime_type, name)
 
     new_file = File(
-        name=original_name,
+        name=name,
         is_folder=False,
         mime_type=mime_type,
-        size=file_size,
+        size=size,
         icon=icon,
         icon_color=icon_color,
         icon_bg=icon_bg,
-        owner_id=g.current_user_id,
+        owner_id=user.id,
         parent_id=parent_id,
-        storage_path=save_path,
+        storage_path=storage_path,
+        sha1=sha1,
+        sha256=sha256,
     )
     db.session.add(new_file)
     db.session.flush()  # ensure new_file.id is set before creating the activity log
 
     # Update user storage usage
-    if user:
-        user.storage_used = (user.storage_used or 0) + file_size
-
-    log = ActivityLog(
-        user_id=g.current_user_id,
-        file_id=new_file.id,
-        action='file_uploaded',
-        details={'size': file_size},
-    )
-    db.session.add(log)
+    user.storage_used = (user.storage_used or 0) + size
+
+    activity.record(user.id, 'file_uploaded', new_file, {'size': size})
+    return new_file
+
+
+def serialize_upload(f):
+    return {
+        'id': f.id,
+        'name': f.name,
+        'size': f.size,
+        'formatted_size': format_file_size(f.size),
+        'mime_type': f.mime_type,
+        'icon': f.icon,
+        'icon_color': f.icon_color,
+        'icon_bg': f.icon_bg,
+        'created_at': f.created_at.isoformat() + 'Z',
+    }
+
+
+@files_bp.route('/api/files/upload', methods=['POST'])
+@login_required
+def upload_file():
+    boundary = request.mimetype_params.get('boundary')
+    if request.mimetype != 'multipart/form-data' or not boundary:
+        return jsonify({'error': 'No file provided'}), 400
+
+    # Pre-flight: reject from Content-Length and quota before reading the body
+    user = db.session.get(User, g.current_user_id)
+    quota_left = user.storage_limit - (user.storage_used or 0)
+    try:
+        check_declared_size(request.content_length, MAX_FILE_SIZE, quota_left,
+                            overhead=MULTIPART_OVERHEAD)
+    except IngestError as e:
+        return jsonify({'error': e.message}), e.status
+
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    user_dir = os.path.join(upload_folder, 'files', g.current_user_id)
+    received = {}
+
+    def on_file(field_name, filename):
+        if field_name != 'file' or 'ingest' in received:
+            return None
+        if not filename:
+            raise IngestError('No file selected', 400)
+
+        # Sanitize filename and validate extension before any byte is stored
+        _, ext, error = validate_upload_name(filename)
+        if error:
+            raise IngestError(error, 400)
+
+        received['name'] = filename
+        received['ext'] = ext
+        received['ingest'] = Ingest(
+            user_dir,
+            max_size=MAX_FILE_SIZE,
+            quota_left=quota_left,
+            validate_mime=validate_mime,
+        )
+        return received['ingest']
+
+    # Sniff, size-check, hash and store the body in one pass over the stream
+    save_path = None
+    try:
+        form = stream_multipart(request.stream, boundary.encode(), on_file,
+                                max_bytes=MAX_FILE_SIZE + MULTIPART_OVERHEAD)
+        if 'ingest' not in received:
+            return jsonify({'error': 'No file provided'}), 400
+        parent_id = form.get('parent_id')
+        if parent_id in ('null', '', 'undefined', 'None'):
+            parent_id = None
+        if parent_id and not live_folder(g.current_user_id, parent_id):
+            return jsonify({'error': 'Destination folder not found'}), 404
+        ingest = received['ingest']
+        save_path = blobstore.store(ingest.finish(), ingest.sha256, ingest.size)
+    except IngestError as e:
+        return jsonify({'error': e.message}), e.status
+    except ValueError:
+        return jsonify({'error': 'Malformed upload'}), 400
+    finally:
+        if save_path is None and 'ingest' in received:
+            received['ingest'].abort()
+
+    new_file = record_upload(user, received['name'], ingest.mime_type, ingest.size, save_path,
+                             parent_id, sha1=ingest.sha1, sha256=ingest.sha256)
     db.session.commit()
-    logger.info('File uploaded: %s (%s bytes) by user %s', new_file.name, file_size, g.current_user_id)
+    previews.schedule(new_file)
+    content_index.schedule(new_file)
+    logger.info('File uploaded: %s (%s bytes) by user %s', new_file.name, ingest.size, g.current_user_id)
+
+    return jsonify({**serialize_upload(new_file), 'sha256': ingest.sha256}), 201
+
+
+@files_bp.route('/api/files/upload/preflight', methods=['POST'])
+@login_required
+def upload_preflight():
+    """Let clients learn whether an upload will be accepted before sending it."""
+    data = request.get_json() or {}
+    name = data.get('name') or ''
+    size = data.get('size')
+
+    if name:
+        _, _, error = validate_upload_name(name)
+        if error:
+            return jsonify({'error': error}), 400
+    if size is not None and (not isinstance(size, int) or isinstance(size, bool) or size < 0):
+        return jsonify({'error': 'size must be a non-negative integer'}), 400
+
+    user = db.session.get(User, g.current_user_id)
+    quota_left = user.storage_limit - (user.storage_used or 0)
+    try:
+        check_declared_size(size, MAX_FILE_SIZE, quota_left)
+    except IngestError as e:
+        return jsonify({'error': e.message}), e.status
 
     return jsonify({
-        'id': new_file.id,
-        'name': new_file.name,
-        'size': new_file.size,
-        'formatted_size': format_file_size(new_file.size),
-        'mime_type': new_file.mime_type,
-        'icon': new_file.icon,
-        'icon_color': new_file.icon_color,
-        'icon_bg': new_file.icon_bg,
-        'created_at': new_file.created_at.isoformat() + 'Z',
-    }), 201
+        'ok': True,
+        'max_size': MAX_FILE_SIZE,
+        'quota_left': max(quota_left, 0),
+    })
+
+
+@files_bp.route('/api/files/upload/instant', methods=['POST'])
+@login_required
+def upload_instant():
+    """Create a file from content the server already holds, skipping the upload.
+
+    Only content the caller can already read (own files or files shared with
+    them) is matched, so the probe cannot reveal what other users store.
+    """
+    data = request.get_json() or {}
+    name = (data.get('name') or '').strip()
+    sha256 = (data.get('sha256') or '').strip().lower()
+    size = data.get('size')
+
+    if not name:
+        return jsonify({'error': 'No file selected'}), 400
+    _, _, error = validate_upload_name(name)
+    if error:
+        return jsonify({'error': error}), 400
+    if len(sha256) != 64 or not isinstance(size, int) or isinstance(size, bool):
+        return jsonify({'error': 'sha256 and size are required'}), 400
+
+    user = db.session.get(User, g.current_user_id)
+    try:
+        check_declared_size(size, MAX_FILE_SIZE, user.storage_limit - (user.storage_used or 0))
+    except IngestError as e:
+        return jsonify({'error': e.message}), e.status
+
+    parent_id = data.get('parent_id')
+    if parent_id in ('null', '', 'undefined', 'None'):
+        parent_id = None
+    if parent_id and not live_folder(g.current_user_id, parent_id):
+        return jsonify({'error': 'Destination folder not found'}), 404
+
+    shared_ids = db.session.query(SharedFile.file_id).filter(SharedFile.shared_with_id == g.current_user_id)
+    source = File.query.filter(
+        File.sha256 == sha256,
+        File.size == size,
+        or_(File.owner_id == g.current_user_id, File.id.in_(shared_ids)),
+    ).first()
+    if not source or not blobstore.acquire(sha256):
+        return jsonify({'found': False}), 404
+
+    new_file = record_upload(user, name, source.mime_type, size, source.storage_path,
+                             parent_id, sha1=source.sha1, sha256=sha256)
+    db.session.commit()
+    previews.schedule(new_file)
+    content_index.schedule(new_file)
+    logger.info('File uploaded instantly: %s (%s bytes) by user %s', new_file.name, size, g.current_user_id)
+
+    return jsonify({**serialize_upload(new_file), 'sha256': sha256, 'instant': True}), 201
 
 
 @files_bp.route('/api/files/<file_id>', methods=['DELETE'])
@@ -148,20 +273,11 @@ def trash_file(file_id):
         return jsonify({'error': 'File not found'}), 404
 
     now = datetime.now(timezone.utc)
-    f.original_parent_id = f.parent_id
-    f.is_trashed = True
-    f.trashed_at = now
-
-    # If folder, trash children recursively
-    if f.is_folder:
-        _trash_children(f.id, now)
-
-    log = ActivityLog(
-        user_id=g.current_user_id,
-        file_id=f.id,
-        action='file_trashed',
-    )
-    db.session.add(log)
+    if not f.is_trashed:
+        detach(f)
+    trash_subtree(f, now)
+
+    activity.record(g.current_user_id, 'file_trashed', f)
     db.session.commit()
     logger.info('File trashed: %s by user %s', f.name, g.current_user_id)
 
@@ -172,16 +288,6 @@ def trash_file(file_id):
     })
 
 
-def _trash_children(folder_id, now):
-    children = File.query.filter_by(parent_id=folder_id, is_trashed=False).all()
-    for child in children:
-        child.original_parent_id = child.parent_id
-        child.is_trashed = True
-        child.trashed_at = now
-        if child.is_folder:
-            _trash_children(child.id, now)
-
-
 @files_bp.route('/api/files/<file_id>/download')
 @login_required
 def download_file(file_id):
@@ -194,12 +300,51 @@ def download_file(file_id):
 
     inline = request.args.get('inline') == 'true'
     logger.info('File downloaded: %s by user %s', f.name, g.current_user_id)
-    return send_file(
-        f.storage_path,
-        mimetype=f.mime_type or 'application/octet-stream',
-        as_attachment=not inline,
-        download_name=f.name,
-    )
+    # Players and resumed downloads fetch ranges; log the first request only
+    if request.range is None or request.range.ranges[0][0] == 0:
+        activity.record_access(g.current_user_id, 'file_viewed' if inline else 'file_downloaded', f)
+    return send_stored_file(f, inline=inline)
+
+
+def _signed_file():
+    """Resolve the File behind a signed media URL, or return an error response."""
+    file_id = request.view_args['file_id']
+    owner_id = request.args.get('o')
+    if not verify_media_signature(file_id, owner_id, request.args.get('exp'), request.args.get('sig')):
+        return None, (jsonify({'error': 'Invalid or expired link'}), 403)
+
+    f = File.query.filter_by(id=file_id, owner_id=owner_id).first()
+    if not f or not f.storage_path or not os.path.exists(f.storage_path):
+        return None, (jsonify({'error': 'File not found'}), 404)
+    return f, None
+
+
+def _public_until_expiry(resp):
+    # Same URL for the whole signing window: shareable by any cache until exp
+    resp.headers['Cache-Control'] = f"public, max-age={max(int(request.args['exp']) - int(time.time()), 0)}"
+    return resp
+
+
+@files_bp.route('/api/files/<file_id>/media')
+def serve_media(file_id):
+    """Inline content behind a signed URL from sign_media_url (no JWT, no user lookup)."""
+    f, error = _signed_file()
+    if error:
+        return error
+    return _public_until_expiry(send_stored_file(f, inline=True))
+
+
+@files_bp.route('/api/files/<file_id>/thumbnail')
+def serve_thumbnail(file_id):
+    """WebP preview written by previews.generate_preview, behind a signed URL."""
+    f, error = _signed_file()
+    if error:
+        return error
+
+    path = previews.preview_path(f)
+    if not f.preview_url or not os.path.exists(path):
+        return jsonify({'error': 'Preview not available'}), 404
+    return _public_until_expiry(send_derived_file(path, 'image/webp', etag=f'{f.sha256 or f.id}-preview'))
 
 
 @files_bp.route('/api/files/<file_id>/star', methods=['PUT'])
@@ -212,12 +357,7 @@ def toggle_star(file_id):
     f.is_starred = not f.is_starred
     action = 'file_starred' if f.is_starred else 'file_unstarred'
 
-    log = ActivityLog(
-        user_id=g.current_user_id,
-        file_id=f.id,
-        action=action,
-    )
-    db.session.add(log)
+    activity.record(g.current_user_id, action, f)
     db.session.commit()
 
     return jsonify({
@@ -255,14 +395,10 @@ def rename_file(file_id):
 
     old_name = f.name
     f.name = new_name
+    if f.is_folder and not f.is_trashed:
+        touch(f.owner_id)
 
-    log = ActivityLog(
-        user_id=g.current_user_id,
-        file_id=f.id,
-        action='file_renamed',
-        details={'old_name': old_name, 'new_name': new_name},
-    )
-    db.session.add(log)
+    activity.record(g.current_user_id, 'file_renamed', f, {'old_name': old_name, 'new_name': new_name})
     db.session.commit()
 
     return jsonify({
@@ -272,16 +408,6 @@ def rename_file(file_id):
     })
 
 
-def _is_descendant(potential_child_id, ancestor_id):
-    """Return True if potential_child_id is inside ancestor_id's subtree."""
-    item = db.session.get(File, potential_child_id)
-    while item and item.parent_id:
-        if item.parent_id == ancestor_id:
-            return True
-        item = db.session.get(File, item.parent_id)
-    return False
-
-
 @files_bp.route('/api/files/<file_id>/lock', methods=['PUT'])
 @login_required
 def toggle_lock(file_id):
@@ -309,7 +435,7 @@ def toggle_lock(file_id):
         f.lock_password_hash = None
         action = 'file_unlocked'
 
-    db.session.add(ActivityLog(user_id=g.current_user_id, file_id=f.id, action=action))
+    activity.record(g.current_user_id, action, f)
     db.session.commit()
     return jsonify({'id': f.id, 'is_locked': f.is_locked})
 
@@ -349,13 +475,14 @@ def move_file(file_id):
     if destination_id in ('null', '', 'undefined', 'None'):
         destination_id = None
 
+    dest = None
     if destination_id:
-        dest = File.query.filter_by(id=destination_id, owner_id=g.current_user_id, is_folder=True).first()
+        dest = live_folder(g.current_user_id, destination_id)
         if not dest:
             return jsonify({'error': 'Destination folder not found'}), 404
         if destination_id == file_id:
             return jsonify({'error': 'Cannot move a folder into itself'}), 400
-        if f.is_folder and _is_descendant(destination_id, file_id):
+        if f.is_folder and is_descendant(destination_id, file_id):
             return jsonify({'error': 'Cannot move a folder into one of its subfolders'}), 400
 
     existing = File.query.filter(
@@ -369,11 +496,12 @@ def move_file(file_id):
         return jsonify({'error': 'An item with this name already exists at the destination'}), 400
 
     old_parent = f.parent_id
-    f.parent_id = destination_id
-    db.session.add(ActivityLog(
-        user_id=g.current_user_id, file_id=f.id, action='file_moved',
-        details={'from': old_parent, 'to': destination_id},
-    ))
+    if not f.is_trashed:
+        detach(f)
+    reparent(f, dest)
+    if not f.is_trashed:
+        attach(f)
+    activity.record(g.current_user_id, 'file_moved', f, {'from': old_parent, 'to': destination_id})
     db.session.commit()
     return jsonify({'id': f.id, 'parent_id': f.parent_id})
 
@@ -381,45 +509,32 @@ def move_file(file_id):
 @files_bp.route('/api/files/<file_id>', methods=['GET'])
 @login_required
 def get_file_details(file_id):
-    import hashlib
-
     f = File.query.filter_by(id=file_id, owner_id=g.current_user_id).first()
     if not f:
         return jsonify({'error': 'File not found'}), 404
 
-    # Build path
-    path_parts = []
-    current = f.parent
-    while current:
-        path_parts.insert(0, current.name)
-        current = current.parent
+    path_parts = [a.name for a in load_ancestors(f)]
     path = '/My Drive' + ('/' + '/'.join(path_parts) if path_parts else '')
 
     # Owner email
     owner = db.session.get(User, f.owner_id)
     owner_email = owner.email if owner else None
 
-    # SHA1 for files with content (skip if > 500 MB)
-    sha1 = None
+    # Checksums are recorded at upload time; older files get theirs in the background
     has_content = bool(f.storage_path and os.path.exists(f.storage_path))
-    if has_content and f.size and f.size <= 500 * 1024 * 1024:
-        h = hashlib.sha1()
-        with open(f.storage_path, 'rb') as fp:
-            while chunk := fp.read(65536):
-                h.update(chunk)
-        sha1 = h.hexdigest()
+    if has_content and not f.sha1:
+        tasks.submit(('checksums', f.id), fill_checksums, f.id)
 
-    items_count = None
-    if f.is_folder:
-        items_count = File.query.filter_by(parent_id=f.id, is_trashed=False).count()
+    items_count = f.child_count if f.is_folder else None
+    size = f.tree_size if f.is_folder else f.size
 
     return jsonify({
         'id': f.id,
         'name': f.name,
         'is_folder': f.is_folder,
         'mime_type': f.mime_type,
-        'size': f.size,
-        'formatted_size': format_file_size(f.size),
+        'size': size,
+        'formatted_size': format_file_size(size),
         'icon': f.icon,
         'icon_color': f.icon_color,
         'icon_bg': f.icon_bg or ('bg-yellow-50 dark:bg-yellow-500/10' if f.is_folder else 'bg-slate-50 dark:bg-[#151e26]'),
@@ -430,9 +545,10 @@ def get_file_details(file_id):
         'updated_at': f.updated_at.isoformat() + 'Z' if f.updated_at else None,
         'parent_id': f.parent_id,
         'owner_email': owner_email,
-        'sha1': sha1,
+        'sha1': f.sha1,
         'path': path,
         'items_count': items_count,
+        'files_count': f.tree_file_count if f.is_folder else None,
     })
 
 
@@ -484,10 +600,7 @@ def share_file(file_id):
             shared_with_id=target_user.id,
             permission=permission,
         ))
-        db.session.add(ActivityLog(
-            user_id=g.current_user_id, file_id=file_id, action='file_shared',
-            details={'with': email, 'permission': permission},
-        ))
+        activity.record(g.current_user_id, 'file_shared', f, {'with': email, 'permission': permission})
     db.session.commit()
 
     return jsonify({
@@ -514,68 +627,68 @@ def unshare_file(file_id, share_id):
     return jsonify({'deleted': True})
 
 
-def _add_folder_to_zip(zf, folder, prefix):
-    children = File.query.filter_by(parent_id=folder.id, is_trashed=False).all()
-    for child in children:
-        if child.is_folder:
-            _add_folder_to_zip(zf, child, f"{prefix}/{child.name}")
-        elif child.storage_path and os.path.exists(child.storage_path):
-            zf.write(child.storage_path, f"{prefix}/{child.name}")
+def _zip_response(roots, download_name):
+    # One query for every subtree, then stream the archive as it is built
+    items = collect_subtree([f.id for f in roots], g.current_user_id)
+    entries = build_entries(roots, items)
+    return Response(
+        iter_zip(entries),
+        mimetype='application/zip',
+        headers={
+            'Content-Disposition': content_disposition(download_name),
+            'X-Accel-Buffering': 'no',
+        },
+    )
 
 
 @files_bp.route('/api/files/<file_id>/download-zip')
 @login_required
 def download_folder_zip(file_id):
-    import io
-    import zipfile
-
     folder = File.query.filter_by(id=file_id, owner_id=g.current_user_id, is_folder=True).first()
     if not folder:
         return jsonify({'error': 'Folder not found'}), 404
 
-    buf = io.BytesIO()
-    with zipfile.ZipFile(buf, 'w', zipfile.ZIP_DEFLATED) as zf:
-        _add_folder_to_zip(zf, folder, folder.name)
-    buf.seek(0)
+    return _zip_response([folder], f"{folder.name}.zip")
 
-    return send_file(
-        buf,
-        mimetype='application/zip',
-        as_attachment=True,
-        download_name=f"{folder.name}.zip",
-    )
+
+@files_bp.route('/api/files/download-zip', methods=['POST'])
+@login_required
+def download_selection_zip():
+    data = request.get_json() or {}
+    ids = data.get('ids') or []
+    if not isinstance(ids, list) or not ids:
+        return jsonify({'error': 'ids must be a non-empty list'}), 400
+
+    roots = File.query.filter(
+        File.id.in_(ids),
+        File.owner_id == g.current_user_id,
+        File.is_trashed == False,
+    ).all()
+    if not roots:
+        return jsonify({'error': 'File not found'}), 404
+
+    name = data.get('name') or (f"{roots[0].name}.zip" if len(roots) == 1 else 'CloudSpace.zip')
+    return _zip_response(roots, name)
 
 
 @files_bp.route('/api/files/starred', methods=['GET'])
 @login_required
 def list_starred():
-    from sqlalchemy import func
     items = File.query.filter_by(
         owner_id=g.current_user_id,
         is_starred=True,
         is_trashed=False,
     ).order_by(File.updated_at.desc()).all()
 
-    # Pre-fetch child counts for all folders in one query (avoid N+1)
-    folder_ids = [f.id for f in items if f.is_folder]
-    child_counts = {}
-    if folder_ids:
-        rows = (
-            db.session.query(File.parent_id, func.count(File.id))
-            .filter(File.parent_id.in_(folder_ids), File.is_trashed == False)
-            .group_by(File.parent_id)
-            .all()
-        )
-        child_counts = {parent_id: count for parent_id, count in rows}
-
     def serialize(f):
+        size = f.tree_size if f.is_folder else f.size
         return {
             'id': f.id,
             'name': f.name,
             'is_folder': f.is_folder,
             'mime_type': f.mime_type,
-            'size': f.size,
-            'formatted_size': format_file_size(f.size) if f.size else '--',
+            'size': size,
+            'formatted_size': format_file_size(size) if size else '--',
             'icon': f.icon,
             'icon_color': f.icon_color,
             'icon_bg': f.icon_bg or ('bg-yellow-50 dark:bg-yellow-500/10' if f.is_folder else 'bg-slate-50'),
@@ -583,7 +696,7 @@ def list_starred():
             'is_locked': f.is_locked,
             'updated_at': f.updated_at.isoformat() + 'Z' if f.updated_at else None,
             'relative_time': format_relative_time(f.updated_at) if f.updated_at else None,
-            'items_count': child_counts.get(f.id, 0) if f.is_folder else None,
+            'items_count': f.child_count if f.is_folder else None,
         }
 
     folders = [serialize(f) for f in items if f.is_folder]
@@ -611,22 +724,9 @@ def list_recent():
             seen.add(act.file_id)
             unique_acts.append(act)
 
-    # Bulk-fetch all files in one query (avoid N+1)
-    file_ids = [act.file_id for act in unique_acts]
-    files_map = {}
-    if file_ids:
-        rows = File.query.filter(
-            File.id.in_(file_ids),
-            File.is_trashed == False,
-            File.is_folder == False,
-        ).all()
-        files_map = {f.id: f for f in rows}
-
-    ordered_files = [
-        (files_map[act.file_id], act)
-        for act in unique_acts
-        if act.file_id in files_map
-    ]
+    # One query for every file on the page; trashed and missing files drop out
+    live = (File.is_trashed == False, File.is_folder == False)
+    ordered_files = [(f, act) for act, f, _ in activity.resolve(unique_acts, file_criteria=live) if f]
 
     now = datetime.now(timezone.utc)
     today = now.date()
@@ -707,6 +807,8 @@ def list_gallery():
             'size': f.size,
             'formatted_size': format_file_size(f.size) if f.size else '--',
             'created_at': f.created_at.isoformat() + 'Z' if f.created_at else None,
+            'media_url': sign_media_url(f.id, f.owner_id),
+            'thumbnail_url': sign_media_url(f.id, f.owner_id, 'thumbnail') if f.preview_url else None,
         } for f in images],
         'total': total,
         'page': page,
@@ -726,6 +828,8 @@ def copy_file(file_id):
 
     data = request.get_json() or {}
     destination_id = data.get('destination_id') or f.parent_id
+    if destination_id and not live_folder(g.current_user_id, destination_id):
+        return jsonify({'error': 'Destination folder not found'}), 404
 
     base, ext = os.path.splitext(f.name)
     copy_name = f"{base} (copie){ext}"
@@ -737,8 +841,13 @@ def copy_file(file_id):
         copy_name = f"{base} (copie {counter}){ext}"
         counter += 1
 
+    # Content-addressed files are copied by reference; only legacy per-user files are duplicated
     new_storage_path = None
-    if f.storage_path and os.path.exists(f.storage_path):
+    new_sha256 = None
+    if f.sha256 and blobstore.acquire(f.sha256):
+        new_storage_path = f.storage_path
+        new_sha256 = f.sha256
+    elif f.storage_path and os.path.exists(f.storage_path):
         upload_folder = current_app.config['UPLOAD_FOLDER']
         user_dir = os.path.join(upload_folder, 'files', g.current_user_id)
         os.makedirs(user_dir, exist_ok=True)
@@ -758,6 +867,8 @@ def copy_file(file_id):
         owner_id=g.current_user_id,
         parent_id=destination_id,
         storage_path=new_storage_path,
+        sha1=f.sha1 if new_storage_path else None,
+        sha256=new_sha256,
     )
     db.session.add(new_file)
 
@@ -765,11 +876,10 @@ def copy_file(file_id):
     if user and f.size:
         user.storage_used = (user.storage_used or 0) + f.size
 
-    db.session.add(ActivityLog(
-        user_id=g.current_user_id, file_id=new_file.id, action='file_copied',
-        details={'original_id': file_id},
-    ))
+    activity.record(g.current_user_id, 'file_copied', new_file, {'original_id': file_id})
     db.session.commit()
+    previews.schedule(new_file)
+    content_index.schedule(new_file)
 
     return jsonify({
         'id': new_file.id,
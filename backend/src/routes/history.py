@@ -1,8 +1,12 @@
 from collections import defaultdict
 from datetime import datetime, timezone, timedelta
-from flask import Blueprint, request, jsonify, g
+from flask import Blueprint, request, jsonify, g, current_app
+from sqlalchemy import func, select
+from src import activity, pagination, retention
+from src.cache import TTLCache
 from src.extensions import db
-from src.models import ActivityLog, File
+from src.models import ActivityLog
+from src.utils import parse_datetime
 from src.auth import login_required
 
 history_bp = Blueprint('history', __name__)
@@ -51,18 +55,59 @@ ACTION_LABELS = {
 
 DEFAULT_ICON = ('history', 'text-slate-500', 'bg-slate-500/10')
 
+DEFAULT_PAGE_SIZE = 30
+MAX_PAGE_SIZE = 100
+HISTORY_KEYS = [(ActivityLog.created_at, True), (ActivityLog.id, True)]
+
+totals_cache = TTLCache()
+
 
 @history_bp.route('/api/activity/history')
 @login_required
 def get_history():
-    page = request.args.get('page', 1, type=int)
-    per_page = 30
+    """One page of the user's activity, newest first.
+
+    Keyset-paginated on (created_at, id): pass back next_cursor to continue.
+    ?action=a,b limits the actions, ?after / ?before (ISO 8601) the dates.
+    """
+    limit = max(1, min(request.args.get('limit', DEFAULT_PAGE_SIZE, type=int), MAX_PAGE_SIZE))
 
-    total = ActivityLog.query.filter_by(user_id=g.current_user_id).count()
+    criteria = [ActivityLog.user_id == g.current_user_id]
+    actions = [a for a in request.args.get('action', '').split(',') if a]
+    if actions:
+        criteria.append(ActivityLog.action.in_(actions))
+    try:
+        after = parse_datetime(request.args['after']) if request.args.get('after') else None
+        before = parse_datetime(request.args['before']) if request.args.get('before') else None
+    except ValueError:
+        return jsonify({'error': 'Invalid date filter'}), 400
+    if after:
+        criteria.append(ActivityLog.created_at >= after)
+    if before:
+        criteria.append(ActivityLog.created_at < before)
 
-    activities = ActivityLog.query.filter_by(
-        user_id=g.current_user_id,
-    ).order_by(ActivityLog.created_at.desc()).offset((page - 1) * per_page).limit(per_page).all()
+    query = ActivityLog.query.filter(*criteria)
+    cursor = None
+    if request.args.get('cursor'):
+        cursor = pagination.decode_cursor(request.args['cursor'], 2)
+        if cursor is None or not isinstance(cursor[0], datetime):
+            return jsonify({'error': 'Invalid cursor'}), 400
+        query = query.filter(pagination.after(HISTORY_KEYS, cursor))
+
+    # One row past the page tells whether there is another
+    activities = query.order_by(*pagination.order_by(HISTORY_KEYS)).limit(limit + 1).all()
+    if len(activities) <= limit:
+        # Older rows may have been moved to the archive, which is all older still
+        last = [activities[-1].created_at, activities[-1].id] if activities else cursor
+        activities += retention.read_archive(
+            g.current_user_id, limit + 1 - len(activities), cursor=last,
+            actions=actions, after=after, before=before,
+        )
+    next_cursor = None
+    if len(activities) > limit:
+        activities = activities[:limit]
+        last = activities[-1]
+        next_cursor = pagination.encode_cursor([last.created_at, last.id])
 
     now = datetime.now(timezone.utc)
     today = now.date()
@@ -71,7 +116,7 @@ def get_history():
     groups = defaultdict(list)
     group_order = []
 
-    for act in activities:
+    for act, file_obj, _ in activity.resolve(activities):
         act_date = act.created_at.date() if act.created_at else today
         if act_date == today:
             label = "Aujourd'hui"
@@ -83,7 +128,6 @@ def get_history():
         if label not in group_order:
             group_order.append(label)
 
-        file_obj = db.session.get(File, act.file_id) if act.file_id else None
         icon, icon_color, icon_bg = ACTION_ICONS.get(act.action, DEFAULT_ICON)
         action_label = ACTION_LABELS.get(act.action, act.action)
         time_str = act.created_at.strftime('%H:%M') if act.created_at else ''
@@ -103,8 +147,20 @@ def get_history():
     result = [{'date': d, 'events': groups[d]} for d in group_order]
     return jsonify({
         'groups': result,
-        'total': total,
-        'page': page,
-        'per_page': per_page,
-        'has_more': (page * per_page) < total,
+        'total': _approximate_total(criteria),
+        'per_page': limit,
+        'has_more': next_cursor is not None,
+        'next_cursor': next_cursor,
     })
+
+
+def _approximate_total(criteria):
+    """Hot-table row count for the current filters, recounted at most every
+    HISTORY_TOTAL_TTL seconds. Archived rows are not counted."""
+    key = (g.current_user_id, request.args.get('action', ''), request.args.get('after', ''),
+           request.args.get('before', ''))
+    total = totals_cache.get(key, current_app.config['HISTORY_TOTAL_TTL'])
+    if total is None:
+        total = db.session.scalar(select(func.count()).select_from(ActivityLog).where(*criteria))
+        totals_cache.set(key, total)
+    return total
@@ -1,14 +1,19 @@
 import os
 import uuid
+import mimetypes
 import magic
 import logging
 from flask import Blueprint, request, jsonify, current_app, g
 from werkzeug.security import generate_password_hash, check_password_hash
-from werkzeug.utils import secure_filename
+from werkzeug.utils import safe_join, secure_filename
 from sqlalchemy import text
+from src import activity, blobstore, previews, retention
 from src.extensions import db
-from src.models import User, File, ActivityLog, SharedFile, UserSettings, GitHubConnection, EmailVerificationToken
+from src.models import User, File, ActivityLog, SharedFile, UserSettings, GitHubConnection, EmailVerificationToken, StorageUsage, UploadSession
 from src.auth import login_required
+from src.routes.uploads import discard_sessions
+from src.downloads import accel_path, accel_response
+from src.ingest import MULTIPART_OVERHEAD
 
 logger = logging.getLogger(__name__)
 
@@ -64,14 +69,7 @@ def update_profile():
     if 'bio' in data:
         user.bio = data['bio'].strip()
 
-    db.session.commit()
-
-    log = ActivityLog(
-        user_id=user.id,
-        action='settings_updated',
-        details={'updated_fields': list(data.keys())},
-    )
-    db.session.add(log)
+    activity.record(user.id, 'settings_updated', details={'updated_fields': list(data.keys())})
     db.session.commit()
 
     return jsonify({
@@ -92,6 +90,10 @@ def upload_avatar():
     if not user:
         return jsonify({'error': 'User not found'}), 404
 
+    # Reject oversized bodies from Content-Length before parsing the form
+    if request.content_length and request.content_length > MAX_AVATAR_SIZE + MULTIPART_OVERHEAD:
+        return jsonify({'error': 'File too large (max 5 MB)'}), 413
+
     if 'avatar' not in request.files:
         return jsonify({'error': 'No file provided'}), 400
 
@@ -129,10 +131,7 @@ def upload_avatar():
         f.write(data)
 
     user.avatar_url = f"/api/user/avatar/{filename}"
-    db.session.commit()
-
-    log = ActivityLog(user_id=user.id, action='avatar_changed', details={})
-    db.session.add(log)
+    activity.record(user.id, 'avatar_changed', details={})
     db.session.commit()
 
     return jsonify({'avatar_url': user.avatar_url})
@@ -144,6 +143,13 @@ def serve_avatar(filename):
     from flask import send_from_directory
     upload_folder = current_app.config.get('UPLOAD_FOLDER', '/app/uploads')
     avatars_dir = os.path.join(upload_folder, 'avatars')
+
+    path = safe_join(avatars_dir, filename)
+    uri = accel_path(path) if path else None
+    if uri:
+        if not os.path.isfile(path):
+            return jsonify({'error': 'Avatar not found'}), 404
+        return accel_response(uri, mimetypes.guess_type(filename)[0] or 'application/octet-stream')
     return send_from_directory(avatars_dir, filename)
 
 
@@ -168,10 +174,7 @@ def change_password():
         return jsonify({'error': 'New password must be at least 8 characters'}), 400
 
     user.password_hash = generate_password_hash(new_password)
-    db.session.commit()
-
-    log = ActivityLog(user_id=user.id, action='password_changed', details={})
-    db.session.add(log)
+    activity.record(user.id, 'password_changed', details={})
     db.session.commit()
 
     return jsonify({'message': 'Password changed successfully'})
@@ -192,6 +195,8 @@ def delete_account():
         return jsonify({'error': 'Incorrect password'}), 401
 
     upload_folder = current_app.config.get('UPLOAD_FOLDER', '/app/uploads')
+    # Buffered events of this user would otherwise land after the delete
+    current_app.extensions['activity_sink'].flush()
 
     # Delete avatar file from disk
     if user.avatar_url and user.avatar_url.startswith('/api/user/avatar/'):
@@ -205,14 +210,19 @@ def delete_account():
     # Collect all file IDs owned by user (for FK cleanup)
     file_ids = [f.id for f in File.query.filter_by(owner_id=user.id).all()]
 
+    digests = set()
     if file_ids:
-        # Delete physical files from disk
+        # Release shared blobs and delete legacy physical files from disk
         for f in File.query.filter(File.id.in_(file_ids), File.is_folder == False).all():
-            if f.storage_path and os.path.exists(f.storage_path):
+            if f.sha256:
+                blobstore.release(f.sha256)
+                digests.add(f.sha256)
+            elif f.storage_path and os.path.exists(f.storage_path):
                 try:
                     os.remove(f.storage_path)
                 except OSError:
                     pass
+                previews.remove(f.id)
 
         # Remove FK references before deleting files
         ActivityLog.query.filter(ActivityLog.file_id.in_(file_ids)).delete(synchronize_session=False)
@@ -228,11 +238,15 @@ def delete_account():
         (SharedFile.shared_by_id == user.id) | (SharedFile.shared_with_id == user.id)
     ).delete(synchronize_session=False)
     UserSettings.query.filter_by(user_id=user.id).delete(synchronize_session=False)
+    StorageUsage.query.filter_by(user_id=user.id).delete(synchronize_session=False)
     GitHubConnection.query.filter_by(user_id=user.id).delete(synchronize_session=False)
     EmailVerificationToken.query.filter_by(user_id=user.id).delete(synchronize_session=False)
+    discard_sessions(UploadSession.user_id == user.id)
 
     db.session.delete(user)
     db.session.commit()
+    blobstore.collect(digests)
+    retention.remove_archive(user.id)
 
     logger.info(f'Account deleted: {user.email}')
     return jsonify({'message': 'Account deleted successfully'}), 200
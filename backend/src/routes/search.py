@@ -1,12 +1,21 @@
 from flask import Blueprint, request, jsonify, g
-from sqlalchemy import or_
+from sqlalchemy import and_, func, or_, select
+from src import content_index, search_index, suggest
 from src.extensions import db
-from src.models import File
-from src.utils import format_file_size, format_relative_time
+from src.models import File, SharedFile
+from src.tree import under
+from src.utils import format_file_size, format_relative_time, parse_datetime
 from src.auth import login_required
 
 search_bp = Blueprint('search', __name__)
 
+MAX_SUGGESTIONS = 20
+
+FILTER_ARGS = (
+    'owner', 'folder', 'type', 'min_size', 'max_size', 'modified_after', 'modified_before',
+    'created_after', 'created_before', 'starred', 'locked',
+)
+
 TYPE_MIME_MAP = {
     'image':       ['image/'],
     'video':       ['video/'],
@@ -22,43 +31,155 @@ TYPE_MIME_MAP = {
 }
 
 
+def _serialize(f):
+    return {
+        'id': f.id,
+        'name': f.name,
+        'is_folder': f.is_folder,
+        'mime_type': f.mime_type,
+        'size': f.size,
+        'formatted_size': format_file_size(f.size) if f.size else '--',
+        'icon': f.icon,
+        'icon_color': f.icon_color,
+        'icon_bg': f.icon_bg or 'bg-slate-50',
+        'parent_id': f.parent_id,
+        'updated_at': f.updated_at.isoformat() + 'Z' if f.updated_at else None,
+        'relative_time': format_relative_time(f.updated_at) if f.updated_at else None,
+    }
+
+
+def _prefix(column, prefix):
+    # The range lets the (owner_id, is_trashed, mime_type) index seek; LIKE
+    # keeps the match exact under any collation
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return and_(column >= prefix, column < upper, column.like(prefix + '%'))
+
+
+def _filters(args, user_id):
+    """Criteria for the scope and attribute filters in args.
+
+    Returns (criteria, error) where error is a (message, status) pair. Every
+    filter is a bound on a column of an (owner_id, is_trashed, <column>)
+    index, so any one of them (or the subtree range) can drive the query.
+    """
+    owner = args.get('owner', 'me')
+    if owner == 'me':
+        criteria = [File.owner_id == user_id]
+    else:
+        shared = select(SharedFile.file_id).where(SharedFile.shared_with_id == user_id)
+        if owner != 'others':
+            shared = shared.where(SharedFile.shared_by_id == owner)
+        criteria = [File.id.in_(shared)]
+    criteria.append(File.is_trashed == False)
+
+    folder_id = args.get('folder')
+    if folder_id:
+        folder = File.query.filter_by(id=folder_id, owner_id=user_id, is_folder=True, is_trashed=False).first()
+        if not folder:
+            return None, ('Folder not found', 404)
+        criteria += [File.owner_id == user_id, under(folder.path), File.id != folder.id]
+
+    prefixes = TYPE_MIME_MAP.get(args.get('type', ''))
+    if prefixes:
+        criteria.append(or_(*[_prefix(File.mime_type, p) for p in prefixes]))
+
+    try:
+        for name, column, op in (
+            ('min_size', File.size, '>='), ('max_size', File.size, '<='),
+        ):
+            if args.get(name):
+                criteria.append(column.op(op)(int(args[name])))
+        for name, column, op in (
+            ('modified_after', File.updated_at, '>='), ('modified_before', File.updated_at, '<'),
+            ('created_after', File.created_at, '>='), ('created_before', File.created_at, '<'),
+        ):
+            if args.get(name):
+                criteria.append(column.op(op)(parse_datetime(args[name])))
+    except ValueError:
+        return None, ('Invalid size or date filter', 400)
+
+    for name, column in (('starred', File.is_starred), ('locked', File.is_locked)):
+        if args.get(name) in ('true', '1'):
+            criteria.append(column == True)
+        elif args.get(name) in ('false', '0'):
+            criteria.append(column == False)
+    return criteria, None
+
+
+def _content_search(q, criteria, limit):
+    index = content_index.backend()
+    if index is None:
+        return jsonify({'error': 'Content search is not available'}), 400
+
+    # Best matching chunk per live file of the user, then snippets for those only
+    matches = index.matches(q).subquery()
+    best = (
+        select(
+            matches.c.file_id, matches.c.seq, matches.c.score,
+            func.row_number().over(partition_by=matches.c.file_id, order_by=matches.c.score).label('n'),
+        )
+        .join(File, File.id == matches.c.file_id)
+        .where(*criteria)
+        .subquery()
+    )
+    rows = db.session.execute(
+        select(File, best.c.seq)
+        .join(best, best.c.file_id == File.id)
+        .where(best.c.n == 1)
+        .order_by(best.c.score)
+        .limit(limit)
+    ).all()
+    snippets = index.snippets(q, [(f.id, seq) for f, seq in rows]) if rows else {}
+
+    results = []
+    for f, seq in rows:
+        snippet, highlights = content_index.split_snippet(snippets.get((f.id, seq)))
+        results.append({**_serialize(f), 'snippet': snippet, 'highlights': highlights})
+    return jsonify({'results': results, 'total': len(results), 'query': q, 'scope': 'content'})
+
+
 @search_bp.route('/api/search')
 @login_required
 def search():
     q = request.args.get('q', '').strip()
-    file_type = request.args.get('type', '')
+    scope = request.args.get('scope', 'name')
     limit = request.args.get('limit', 30, type=int)
+    filtered = any(request.args.get(name) for name in FILTER_ARGS)
 
-    if not q or len(q) < 2:
+    # Filters alone are a valid search; a text query needs two characters
+    if (not q and not filtered) or (q and len(q) < 2):
         return jsonify({'results': [], 'total': 0})
 
-    query = File.query.filter(
-        File.owner_id == g.current_user_id,
-        File.is_trashed == False,
-        File.name.ilike(f'%{q}%'),
-    )
+    criteria, error = _filters(request.args, g.current_user_id)
+    if error:
+        return jsonify({'error': error[0]}), error[1]
 
-    if file_type and file_type in TYPE_MIME_MAP:
-        prefixes = TYPE_MIME_MAP[file_type]
-        query = query.filter(or_(*[File.mime_type.like(p + '%') for p in prefixes]))
+    if scope == 'content':
+        if not content_index.has_terms(q):
+            return jsonify({'results': [], 'total': 0})
+        return _content_search(q, criteria, limit)
 
-    results = query.order_by(File.updated_at.desc()).limit(limit).all()
+    query = File.query.filter(*criteria)
+    if q:
+        index = search_index.backend()
+        query = index.apply(query, q).order_by(*index.rank(q))
+    else:
+        query = query.order_by(File.updated_at.desc())
+    results = query.limit(limit).all()
 
     return jsonify({
-        'results': [{
-            'id': f.id,
-            'name': f.name,
-            'is_folder': f.is_folder,
-            'mime_type': f.mime_type,
-            'size': f.size,
-            'formatted_size': format_file_size(f.size) if f.size else '--',
-            'icon': f.icon,
-            'icon_color': f.icon_color,
-            'icon_bg': f.icon_bg or 'bg-slate-50',
-            'parent_id': f.parent_id,
-            'updated_at': f.updated_at.isoformat() + 'Z' if f.updated_at else None,
-            'relative_time': format_relative_time(f.updated_at) if f.updated_at else None,
-        } for f in results],
+        'results': [_serialize(f) for f in results],
         'total': len(results),
         'query': q,
     })
+
+
+@search_bp.route('/api/search/suggest')
+@login_required
+def search_suggest():
+    """Name completions for the search box, answered from memory."""
+    q = request.args.get('q', '').strip().lower()
+    limit = max(1, min(request.args.get('limit', 8, type=int), MAX_SUGGESTIONS))
+    if not q:
+        return jsonify({'suggestions': [], 'query': q})
+    return jsonify({'suggestions': suggest.cache.complete(g.current_user_id, q, limit), 'query': q})
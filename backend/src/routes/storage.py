@@ -1,98 +1,43 @@
 from flask import Blueprint, jsonify, g
-from sqlalchemy import func
 from src.extensions import db
-from src.models import User, File
+from src.models import User, StorageUsage
+from src.usage import STORAGE_CATEGORIES, OTHER
 from src.utils import format_file_size
 from src.auth import login_required
 
 storage_bp = Blueprint('storage', __name__)
 
-# MIME type categories for storage breakdown
-STORAGE_CATEGORIES = [
-    ('Images', ['image/'], 'image'),
-    ('Videos', ['video/'], 'play_circle'),
-    ('Documents', ['application/pdf', 'application/msword',
-                   'application/vnd.openxmlformats-officedocument.wordprocessingml',
-                   'text/'], 'description'),
-    ('Spreadsheets', ['application/vnd.ms-excel',
-                      'application/vnd.openxmlformats-officedocument.spreadsheetml'], 'table_chart'),
-]
-
 
 @storage_bp.route('/api/user/storage')
 @login_required
 def user_storage():
     user = db.session.get(User, g.current_user_id)
 
-    # Calculate real storage from files
-    all_files = File.query.filter_by(
-        owner_id=g.current_user_id, is_folder=False, is_trashed=False
-    ).all()
-
-    total_used = sum(f.size for f in all_files)
-
-    # Build breakdown
-    categorized = {cat[0]: 0 for cat in STORAGE_CATEGORIES}
-    categorized['Other'] = 0
-
-    for f in all_files:
-        matched = False
-        if f.mime_type:
-            for cat_name, patterns, _ in STORAGE_CATEGORIES:
-                for pattern in patterns:
-                    if f.mime_type.startswith(pattern):
-                        categorized[cat_name] += f.size
-                        matched = True
-                        break
-                if matched:
-                    break
-        if not matched:
-            categorized['Other'] += f.size
-
-    # Use the declared storage_used from user if it's larger (for seed data realism)
-    display_used = max(total_used, user.storage_used)
-
-    percentage = round(display_used / user.storage_limit * 100) if user.storage_limit else 0
+    # One counter row per category, kept current on upload, copy and purge
+    sizes = dict(
+        db.session.query(StorageUsage.category, StorageUsage.bytes)
+        .filter(StorageUsage.user_id == user.id)
+        .all()
+    )
+    used = user.storage_used or 0
+    percentage = round(used / user.storage_limit * 100) if user.storage_limit else 0
 
     breakdown = []
-    icons = {cat[0]: cat[2] for cat in STORAGE_CATEGORIES}
-    icons['Other'] = 'folder_zip'
-
-    # For seed data realism, if real files are tiny, use proportional display
-    if total_used < user.storage_used:
-        # Use seed-declared breakdown proportions
-        seed_breakdown = [
-            ('Images', 5798205850, 'image'),
-            ('Videos', 4402341478, 'play_circle'),
-            ('Documents', 3435973837, 'description'),
-            ('Spreadsheets', 1610612736, 'table_chart'),
-            ('Other', 1073741824, 'folder_zip'),
-        ]
-        for cat_name, cat_size, cat_icon in seed_breakdown:
-            pct = round(cat_size / display_used * 100) if display_used else 0
-            breakdown.append({
-                'type': cat_name,
-                'size': cat_size,
-                'formatted': format_file_size(cat_size),
-                'percent': pct,
-                'icon': cat_icon,
-            })
-    else:
-        for cat_name, cat_size in categorized.items():
-            pct = round(cat_size / display_used * 100) if display_used else 0
-            breakdown.append({
-                'type': cat_name,
-                'size': cat_size,
-                'formatted': format_file_size(cat_size),
-                'percent': pct,
-                'icon': icons.get(cat_name, 'folder_zip'),
-            })
+    for cat_name, cat_icon in [(c[0], c[2]) for c in STORAGE_CATEGORIES] + [OTHER]:
+        cat_size = sizes.get(cat_name, 0)
+        breakdown.append({
+            'type': cat_name,
+            'size': cat_size,
+            'formatted': format_file_size(cat_size),
+            'percent': round(cat_size / used * 100) if used else 0,
+            'icon': cat_icon,
+        })
 
     return jsonify({
-        'used': display_used,
+        'used': used,
         'limit': user.storage_limit,
         'percentage': percentage,
-        'formatted_used': format_file_size(display_used),
+        'formatted_used': format_file_size(used),
         'formatted_limit': format_file_size(user.storage_limit),
         'breakdown': breakdown,
     })
@@ -1,9 +1,10 @@
-import os
 from flask import Blueprint, jsonify, g
+from src import activity
 from src.extensions import db
-from src.models import File, User, ActivityLog
+from src.models import File, User
 from src.utils import format_file_size, format_relative_time
 from src.auth import login_required
+from src.tree import Purge, attach, recompute, reparent, restore_subtree
 
 trash_bp = Blueprint('trash', __name__)
 
@@ -52,37 +53,29 @@ def restore_item(file_id):
     if not f:
         return jsonify({'error': 'Item not found in trash'}), 404
 
+    # Back into the original folder if it is still live, else to the root
+    parent = None
+    if f.original_parent_id:
+        parent = File.query.filter_by(
+            id=f.original_parent_id, owner_id=g.current_user_id, is_trashed=False
+        ).first()
+
+    if f.is_folder:
+        restore_subtree(f)
     f.is_trashed = False
-    f.parent_id = f.original_parent_id
+    reparent(f, parent)
     f.original_parent_id = None
     f.trashed_at = None
-
-    # Restore children if folder
     if f.is_folder:
-        _restore_children(f.id)
+        recompute(f)
+    attach(f)
 
-    log = ActivityLog(
-        user_id=g.current_user_id,
-        file_id=f.id,
-        action='file_restored',
-    )
-    db.session.add(log)
+    activity.record(g.current_user_id, 'file_restored', f)
     db.session.commit()
 
     return jsonify({'id': f.id, 'restored': True})
 
 
-def _restore_children(folder_id):
-    children = File.query.filter_by(parent_id=folder_id, is_trashed=True).all()
-    for child in children:
-        child.is_trashed = False
-        child.parent_id = child.original_parent_id or folder_id
-        child.original_parent_id = None
-        child.trashed_at = None
-        if child.is_folder:
-            _restore_children(child.id)
-
-
 @trash_bp.route('/api/trash/<file_id>', methods=['DELETE'])
 @login_required
 def delete_permanently(file_id):
@@ -92,16 +85,18 @@ def delete_permanently(file_id):
     if not f:
         return jsonify({'error': 'Item not found in trash'}), 404
 
-    freed = _delete_file_tree(f)
+    purge = Purge(g.current_user_id)
+    purge.run([f])
 
     # Update user storage
     user = db.session.get(User, g.current_user_id)
     if user:
-        user.storage_used = max(0, (user.storage_used or 0) - freed)
+        user.storage_used = max(0, (user.storage_used or 0) - purge.freed)
 
     db.session.commit()
+    purge.finish()
 
-    return jsonify({'id': file_id, 'deleted': True, 'freed': freed})
+    return jsonify({'id': file_id, 'deleted': True, 'freed': purge.freed})
 
 
 @trash_bp.route('/api/trash', methods=['DELETE'])
@@ -111,36 +106,15 @@ def empty_trash():
         owner_id=g.current_user_id, is_trashed=True
     ).all()
 
-    # Only top-level trashed items (children will be handled recursively)
-    total_freed = 0
-    for f in items:
-        total_freed += _delete_file_tree(f)
+    # Nested trashed items fall inside their trashed ancestor's range
+    purge = Purge(g.current_user_id)
+    purge.run(items)
 
     user = db.session.get(User, g.current_user_id)
     if user:
-        user.storage_used = max(0, (user.storage_used or 0) - total_freed)
+        user.storage_used = max(0, (user.storage_used or 0) - purge.freed)
 
     db.session.commit()
+    purge.finish()
 
-    return jsonify({'deleted_count': len(items), 'freed': total_freed})
-
-
-def _delete_file_tree(f):
-    """Permanently delete a file/folder and its children. Returns bytes freed."""
-    freed = 0
-
-    if f.is_folder:
-        children = File.query.filter_by(parent_id=f.id).all()
-        for child in children:
-            freed += _delete_file_tree(child)
-
-    # Delete physical file
-    if f.storage_path and os.path.exists(f.storage_path):
-        freed += os.path.getsize(f.storage_path)
-        os.remove(f.storage_path)
-
-    # Delete related activity logs
-    ActivityLog.query.filter_by(file_id=f.id).delete()
-
-    db.session.delete(f)
-    return freed
+    return jsonify({'deleted_count': len(items), 'freed': purge.freed})
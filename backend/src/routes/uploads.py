@@ -0,0 +1,314 @@
+import os
+import uuid
+import logging
+import magic
+from datetime import datetime, timezone, timedelta
+from flask import Blueprint, request, jsonify, current_app, g
+import click
+from flask.cli import with_appcontext
+from werkzeug.http import parse_content_range_header
+from sqlalchemy import delete, func, select
+from src import blobstore, content_index, previews
+from src.extensions import db
+from src.models import User, UploadSession, UploadChunk
+from src.auth import login_required
+from src.tree import live_folder
+from src.ingest import IngestError, QUOTA_MESSAGE, check_declared_size, file_digests
+from src.routes.files import (
+    MAX_FILE_SIZE, validate_upload_name, validate_mime, record_upload, serialize_upload,
+)
+
+logger = logging.getLogger(__name__)
+
+uploads_bp = Blueprint('uploads', __name__)
+
+SESSION_TTL = timedelta(hours=24)
+CHUNK_SIZE = 8 * 1024 * 1024  # suggested client chunk size
+COPY_BUFFER = 64 * 1024
+SWEEP_BATCH = 200  # expired sessions removed per sweep
+
+
+def _received_ranges(session):
+    """Merge the recorded chunks into sorted, non-overlapping [start, end) ranges."""
+    chunks = session.chunks.order_by(UploadChunk.offset).all()
+    ranges = []
+    for c in chunks:
+        start, end = c.offset, c.offset + c.length
+        if ranges and start <= ranges[-1][1]:
+            ranges[-1][1] = max(ranges[-1][1], end)
+        else:
+            ranges.append([start, end])
+    return ranges
+
+
+def _contiguous_offset(ranges):
+    if ranges and ranges[0][0] == 0:
+        return ranges[0][1]
+    return 0
+
+
+def _serialize_session(session, ranges=None):
+    if ranges is None:
+        ranges = _received_ranges(session)
+    return {
+        'id': session.id,
+        'name': session.name,
+        'size': session.size,
+        'parent_id': session.parent_id,
+        'offset': _contiguous_offset(ranges),
+        'received': ranges,
+        'chunk_size': CHUNK_SIZE,
+        'expires_at': session.expires_at.isoformat() + 'Z',
+    }
+
+
+def _remove_file(path):
+    if os.path.exists(path):
+        try:
+            os.remove(path)
+        except OSError:
+            logger.warning('Could not remove upload session file %s', path)
+
+
+def _discard_session(session):
+    _remove_file(session.storage_path)
+    db.session.delete(session)
+
+
+def _claim_session(session):
+    """Delete the session's rows ahead of the commit; False if another request
+    got there first. Concurrent claims wait on the row lock until the winner's
+    transaction ends."""
+    db.session.execute(
+        delete(UploadChunk).where(UploadChunk.session_id == session.id)
+        .execution_options(synchronize_session=False)
+    )
+    result = db.session.execute(
+        delete(UploadSession).where(UploadSession.id == session.id)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+def discard_sessions(*criteria, limit=None):
+    """Delete the sessions matching criteria, their chunks and their files.
+
+    Returns the number of sessions removed; the caller commits.
+    """
+    sessions = db.session.execute(
+        select(UploadSession.id, UploadSession.storage_path).where(*criteria).limit(limit)
+    ).all()
+    ids = [s.id for s in sessions]
+    if ids:
+        db.session.execute(delete(UploadChunk).where(UploadChunk.session_id.in_(ids)))
+        db.session.execute(
+            delete(UploadSession).where(UploadSession.id.in_(ids))
+            .execution_options(synchronize_session=False)
+        )
+    for s in sessions:
+        _remove_file(s.storage_path)
+    return len(ids)
+
+
+def _expired():
+    return UploadSession.expires_at < datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _reserved_bytes(user_id):
+    """Bytes set aside by the user's open sessions, which count against the quota."""
+    return db.session.scalar(
+        select(func.coalesce(func.sum(UploadSession.size), 0))
+        .where(UploadSession.user_id == user_id, ~_expired())
+    )
+
+
+@click.command('purge-upload-sessions')
+@with_appcontext
+def purge_command():
+    """Remove expired upload sessions and their partial files."""
+    done = 0
+    while removed := discard_sessions(_expired(), limit=SWEEP_BATCH):
+        db.session.commit()
+        done += removed
+    click.echo(f'{done} expired upload sessions removed')
+
+
+def _get_session(session_id):
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    return UploadSession.query.filter(
+        UploadSession.id == session_id,
+        UploadSession.user_id == g.current_user_id,
+        UploadSession.expires_at >= now,
+    ).first()
+
+
+@uploads_bp.route('/api/files/uploads', methods=['POST'])
+@login_required
+def create_upload_session():
+    data = request.get_json() or {}
+    name = (data.get('name') or '').strip()
+    size = data.get('size')
+
+    if not name:
+        return jsonify({'error': 'No file selected'}), 400
+    _, ext, error = validate_upload_name(name)
+    if error:
+        return jsonify({'error': error}), 400
+
+    if not isinstance(size, int) or isinstance(size, bool) or size < 0:
+        return jsonify({'error': 'A non-negative integer size is required'}), 400
+
+    user = db.session.get(User, g.current_user_id)
+    try:
+        # Open sessions hold their full size on disk until committed or expired
+        quota_left = user.storage_limit - (user.storage_used or 0) - _reserved_bytes(user.id)
+        check_declared_size(size, MAX_FILE_SIZE, quota_left)
+    except IngestError as e:
+        return jsonify({'error': e.message}), e.status
+
+    parent_id = data.get('parent_id')
+    if parent_id in ('null', '', 'undefined', 'None'):
+        parent_id = None
+    if parent_id and not live_folder(g.current_user_id, parent_id):
+        return jsonify({'error': 'Destination folder not found'}), 404
+
+    # Opportunistic sweep over all users; `flask purge-upload-sessions` does the rest
+    discard_sessions(_expired(), limit=SWEEP_BATCH)
+
+    # Chunks are written straight into the session's storage file
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    user_dir = os.path.join(upload_folder, 'files', g.current_user_id)
+    os.makedirs(user_dir, exist_ok=True)
+    save_path = os.path.join(user_dir, str(uuid.uuid4()) + ext)
+    with open(save_path, 'wb') as fp:
+        fp.truncate(size)
+
+    session = UploadSession(
+        user_id=g.current_user_id,
+        parent_id=parent_id,
+        name=name,
+        size=size,
+        storage_path=save_path,
+        expires_at=datetime.now(timezone.utc) + SESSION_TTL,
+    )
+    db.session.add(session)
+    db.session.commit()
+
+    return jsonify(_serialize_session(session, [])), 201
+
+
+@uploads_bp.route('/api/files/uploads/<session_id>', methods=['GET'])
+@login_required
+def get_upload_session(session_id):
+    session = _get_session(session_id)
+    if not session:
+        return jsonify({'error': 'Upload session not found'}), 404
+    return jsonify(_serialize_session(session))
+
+
+@uploads_bp.route('/api/files/uploads/<session_id>', methods=['PUT'])
+@login_required
+def upload_chunk(session_id):
+    session = _get_session(session_id)
+    if not session:
+        return jsonify({'error': 'Upload session not found'}), 404
+
+    content_range = parse_content_range_header(request.headers.get('Content-Range'))
+    if content_range is None or content_range.units != 'bytes' or content_range.start is None:
+        return jsonify({'error': 'A Content-Range header (bytes start-end/size) is required'}), 400
+    if content_range.length not in (None, session.size) or content_range.stop > session.size:
+        return jsonify({'error': 'Content-Range does not match the upload size'}), 416
+
+    # Reject before reading the body if it cannot be the announced range
+    start, stop = content_range.start, content_range.stop
+    expected = stop - start
+    if request.content_length is not None and request.content_length != expected:
+        return jsonify({'error': 'Content-Length does not match Content-Range'}), 400
+
+    # Stream the body into place; several chunks may be written concurrently
+    written = 0
+    with open(session.storage_path, 'r+b') as fp:
+        fp.seek(start)
+        while written < expected:
+            block = request.stream.read(min(COPY_BUFFER, expected - written))
+            if not block:
+                break
+            fp.write(block)
+            written += len(block)
+
+    # Record whatever arrived so an interrupted chunk can be resumed
+    if written:
+        db.session.add(UploadChunk(session_id=session.id, offset=start, length=written))
+        db.session.commit()
+
+    if written < expected:
+        return jsonify({
+            'error': 'Incomplete chunk',
+            **_serialize_session(session),
+        }), 400
+
+    return jsonify(_serialize_session(session))
+
+
+@uploads_bp.route('/api/files/uploads/<session_id>/commit', methods=['POST'])
+@login_required
+def commit_upload_session(session_id):
+    session = _get_session(session_id)
+    if not session:
+        return jsonify({'error': 'Upload session not found'}), 404
+
+    ranges = _received_ranges(session)
+    if session.size and ranges != [[0, session.size]]:
+        return jsonify({
+            'error': 'Upload is incomplete',
+            **_serialize_session(session, ranges),
+        }), 409
+
+    # The folder may have been trashed or deleted since the session started
+    if session.parent_id and not live_folder(g.current_user_id, session.parent_id):
+        return jsonify({'error': 'Destination folder not found'}), 404
+
+    name, size, parent_id, tmp_path = session.name, session.size, session.parent_id, session.storage_path
+    if not _claim_session(session):
+        db.session.rollback()
+        return jsonify({'error': 'Upload session is already being committed'}), 409
+
+    # Chunks arrive out of order, so the digests need one read of the assembled file
+    head, sha1, sha256 = file_digests(tmp_path)
+
+    # Validate MIME type via magic bytes (ignores browser-supplied Content-Type)
+    mime_type = magic.from_buffer(head, mime=True)
+    error = validate_mime(mime_type)
+    if error:
+        _remove_file(tmp_path)
+        db.session.commit()
+        return jsonify({'error': error}), 400
+
+    user = db.session.get(User, g.current_user_id)
+    if (user.storage_used + size) > user.storage_limit:
+        # Give the session back so the client can abort it or retry later
+        db.session.rollback()
+        return jsonify({'error': QUOTA_MESSAGE}), 413
+
+    storage_path = blobstore.store(tmp_path, sha256, size)
+    new_file = record_upload(user, name, mime_type, size,
+                             storage_path, parent_id, sha1=sha1, sha256=sha256)
+    db.session.commit()
+    previews.schedule(new_file)
+    content_index.schedule(new_file)
+    logger.info('File uploaded in chunks: %s (%s bytes) by user %s',
+                new_file.name, new_file.size, g.current_user_id)
+
+    return jsonify(serialize_upload(new_file)), 201
+
+
+@uploads_bp.route('/api/files/uploads/<session_id>', methods=['DELETE'])
+@login_required
+def abort_upload_session(session_id):
+    session = _get_session(session_id)
+    if not session:
+        return jsonify({'error': 'Upload session not found'}), 404
+
+    _discard_session(session)
+    db.session.commit()
+    return jsonify({'id': session_id, 'aborted': True})
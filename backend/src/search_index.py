@@ -0,0 +1,141 @@
+import sqlite3
+from sqlalchemy import case, column, event, func, literal_column, table
+from src.extensions import db
+from src.models import File
+
+# Filename search. Each backend owns the index DDL for its database, installed
+# together with the file table (create_all) or by migration 009, and turns a
+# query string into a filter on File. Trashed rows stay indexed; callers
+# filter them out like everywhere else.
+
+# Trigram indexes cannot answer shorter substrings; those fall back to a scan
+MIN_INDEXED_LENGTH = 3
+
+
+def _like_pattern(q):
+    return '%' + q.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+
+class ScanSearch:
+    """ILIKE over the owner's rows. Used where no text index is available."""
+
+    def install(self, conn):
+        pass
+
+    def uninstall(self, conn):
+        pass
+
+    def apply(self, query, q):
+        """Narrow a File query to names containing q (case-insensitive)."""
+        return query.filter(File.name.ilike(_like_pattern(q), escape='\\'))
+
+    def rank(self, q):
+        """ORDER BY terms: exact name, then prefix, then word start, then any
+        substring; shorter names first, most recent last."""
+        name, q = func.lower(File.name), q.lower()
+        return [
+            case(
+                (name == q, 0),
+                (name.startswith(q, autoescape=True), 1),
+                (name.contains(' ' + q, autoescape=True), 2),
+                else_=3,
+            ),
+            func.length(File.name),
+            File.updated_at.desc(),
+        ]
+
+
+_docs = table('file_search_docs', column('docid'), column('file_id'))
+_fts = table('file_search', column('rowid'))
+
+
+class Fts5Search(ScanSearch):
+    """SQLite FTS5 with the trigram tokenizer (SQLite 3.34+).
+
+    file_search is an external-content index over file_search_docs, whose
+    INTEGER PRIMARY KEY gives FTS a rowid that VACUUM cannot renumber.
+    Triggers on file keep both in step with inserts, renames and deletes,
+    including the bulk statements in src/tree.py.
+    """
+
+    DDL = (
+        'CREATE TABLE IF NOT EXISTS file_search_docs ('
+        ' docid INTEGER PRIMARY KEY, file_id VARCHAR(36) NOT NULL UNIQUE, name TEXT NOT NULL)',
+        "CREATE VIRTUAL TABLE IF NOT EXISTS file_search USING fts5("
+        " name, content='file_search_docs', content_rowid='docid', tokenize='trigram')",
+        'CREATE TRIGGER IF NOT EXISTS file_search_docs_ai AFTER INSERT ON file_search_docs BEGIN'
+        ' INSERT INTO file_search(rowid, name) VALUES (new.docid, new.name); END',
+        'CREATE TRIGGER IF NOT EXISTS file_search_docs_ad AFTER DELETE ON file_search_docs BEGIN'
+        " INSERT INTO file_search(file_search, rowid, name) VALUES ('delete', old.docid, old.name); END",
+        'CREATE TRIGGER IF NOT EXISTS file_search_docs_au AFTER UPDATE OF name ON file_search_docs BEGIN'
+        " INSERT INTO file_search(file_search, rowid, name) VALUES ('delete', old.docid, old.name);"
+        ' INSERT INTO file_search(rowid, name) VALUES (new.docid, new.name); END',
+        'CREATE TRIGGER IF NOT EXISTS file_search_ai AFTER INSERT ON file BEGIN'
+        ' INSERT INTO file_search_docs(file_id, name) VALUES (new.id, new.name); END',
+        'CREATE TRIGGER IF NOT EXISTS file_search_au AFTER UPDATE OF name ON file BEGIN'
+        ' UPDATE file_search_docs SET name = new.name WHERE file_id = old.id; END',
+        'CREATE TRIGGER IF NOT EXISTS file_search_ad AFTER DELETE ON file BEGIN'
+        ' DELETE FROM file_search_docs WHERE file_id = old.id; END',
+        # Backfill, a no-op when the file table is new
+        'INSERT INTO file_search_docs(file_id, name) SELECT id, name FROM file'
+        ' WHERE id NOT IN (SELECT file_id FROM file_search_docs)',
+    )
+
+    def install(self, conn):
+        for statement in self.DDL:
+            conn.exec_driver_sql(statement)
+
+    def uninstall(self, conn):
+        conn.exec_driver_sql('DROP TABLE IF EXISTS file_search')
+        conn.exec_driver_sql('DROP TABLE IF EXISTS file_search_docs')
+
+    def apply(self, query, q):
+        if len(q) < MIN_INDEXED_LENGTH:
+            return super().apply(query, q)
+        # Joined rather than IN (subquery) so the MATCH drives the plan; with
+        # IN, SQLite walks every row of the owner and probes the hit list.
+        phrase = '"' + q.replace('"', '""') + '"'
+        return (
+            query.join(_docs, _docs.c.file_id == File.id)
+            .join(_fts, _fts.c.rowid == _docs.c.docid)
+            .filter(literal_column('file_search').op('MATCH')(phrase))
+        )
+
+
+class TrigramSearch(ScanSearch):
+    """PostgreSQL pg_trgm: a GIN index on file.name serves ILIKE '%q%' directly."""
+
+    DDL = (
+        'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+        'CREATE INDEX IF NOT EXISTS ix_file_name_trgm ON file USING gin (name gin_trgm_ops)',
+    )
+
+    def install(self, conn):
+        for statement in self.DDL:
+            conn.exec_driver_sql(statement)
+
+    def rank(self, q):
+        exact, *rest = super().rank(q)
+        return [exact, func.similarity(File.name, q).desc(), *rest]
+
+
+def backend_for(dialect_name):
+    if dialect_name == 'sqlite' and sqlite3.sqlite_version_info >= (3, 34):
+        return Fts5Search()
+    if dialect_name == 'postgresql':
+        return TrigramSearch()
+    return ScanSearch()
+
+
+def backend():
+    return backend_for(db.engine.dialect.name)
+
+
+@event.listens_for(File.__table__, 'after_create')
+def _install(target, connection, **kw):
+    backend_for(connection.dialect.name).install(connection)
+
+
+@event.listens_for(File.__table__, 'before_drop')
+def _uninstall(target, connection, **kw):
+    backend_for(connection.dialect.name).uninstall(connection)
@@ -7,7 +7,7 @@ from src.utils import get_icon_for_mime
 
 def seed_data():
     """Seed initial data if the database is empty."""
-    if User.query.first() is not None:
+    if db.session.query(User.id).first() is not None:
         return
 
     user = User(
@@ -20,7 +20,6 @@ def seed_data():
         role='Designer',
         is_online=True,
         is_verified=True,
-        storage_used=16324091904,
         storage_limit=21474836480,
     )
     db.session.add(user)
@@ -29,19 +28,19 @@ def seed_data():
         User(id='user-sarah-001', first_name='Sarah', last_name='Miller',
              email='sarah.miller@cloudspace.com',
              password_hash=generate_password_hash('password123'),
-             role='Designer', is_online=True, is_verified=True, storage_used=5*1024**3),
+             role='Designer', is_online=True, is_verified=True),
         User(id='user-mike-001', first_name='Mike', last_name='Ross',
              email='mike.ross@cloudspace.com',
              password_hash=generate_password_hash('password123'),
-             role='Finance', is_online=True, is_verified=True, storage_used=2*1024**3),
+             role='Finance', is_online=True, is_verified=True),
         User(id='user-jessica-001', first_name='Jessica', last_name='Pearson',
              email='jessica.pearson@cloudspace.com',
              password_hash=generate_password_hash('password123'),
-             role='Manager', is_online=False, is_verified=True, storage_used=3*1024**3),
+             role='Manager', is_online=False, is_verified=True),
         User(id='user-david-001', first_name='David', last_name='Kim',
              email='david.kim@cloudspace.com',
              password_hash=generate_password_hash('password123'),
-             role='Marketing', is_online=True, is_verified=True, storage_used=8*1024**3),
+             role='Marketing', is_online=True, is_verified=True),
     ]
     db.session.add_all(team)
 
@@ -93,6 +92,7 @@ def seed_data():
         )
         db.session.add(f)
         file_objs.append(f)
+    user.storage_used = sum(size for _, _, size in files_data)
 
     db.session.flush()
 
@@ -109,6 +109,7 @@ def seed_data():
                 updated_at=now - timedelta(days=j),
             )
             db.session.add(child)
+            user.storage_used += child.size
 
     activities = [
         ('user-sarah-001', file_objs[0].id, 'file_uploaded',
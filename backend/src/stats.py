@@ -0,0 +1,104 @@
+from datetime import datetime, timezone, timedelta
+from flask import current_app
+from sqlalchemy import and_, case, event, func, inspect, select, true
+from sqlalchemy.orm import Session
+from src import cache
+from src.extensions import db
+from src.models import File, SharedFile, User
+
+# Dashboard counters. All of them come from one statement of scalar
+# subqueries, each answered from an index range of the user's own rows, and
+# the result is cached for DASHBOARD_STATS_TTL seconds. File and share
+# writes invalidate it at commit; the bulk statements in src/tree.py call
+# changed(). A share recipient is not told when the owner trashes the file,
+# so their count can lag by one TTL.
+
+stats_cache = cache.TTLCache()
+
+
+def _count_since(column, since):
+    return func.coalesce(func.sum(case((column >= since, 1), else_=0)), 0)
+
+
+def _query(user_id, week_ago):
+    files = (
+        select(func.count(), _count_since(File.created_at, week_ago))
+        .where(File.owner_id == user_id, File.is_trashed == False)
+        .subquery()
+    )
+    trash = (
+        select(func.count(), func.min(File.trashed_at))
+        .where(File.owner_id == user_id, File.is_trashed == True)
+        .subquery()
+    )
+    shared = (
+        select(func.count(), _count_since(SharedFile.created_at, week_ago))
+        .join(File, and_(File.id == SharedFile.file_id, File.is_trashed == False))
+        .where(SharedFile.shared_with_id == user_id)
+        .subquery()
+    )
+    # Each subquery is a single row; the joins just put them side by side
+    return (
+        select(User.storage_used, User.storage_limit, *files.c, *trash.c, *shared.c)
+        .select_from(User).join(files, true()).join(trash, true()).join(shared, true())
+        .where(User.id == user_id)
+    )
+
+
+def load(user_id, now=None):
+    """The dashboard counters of user_id, straight from the database."""
+    now = now or datetime.now(timezone.utc)
+    row = db.session.execute(_query(user_id, now - timedelta(days=7))).first()
+    if row is None:
+        return None
+    used, limit, total, this_week, trash_items, oldest_trash, shared, shared_this_week = row
+    return {
+        'storage_used': used or 0,
+        'storage_limit': limit,
+        'total_files': total,
+        'files_this_week': this_week,
+        'trash_items': trash_items,
+        'oldest_trash': oldest_trash,
+        'shared_files': shared,
+        'shared_this_week': shared_this_week,
+    }
+
+
+def get(user_id):
+    stats = stats_cache.get(user_id, current_app.config['DASHBOARD_STATS_TTL'])
+    if stats is None:
+        stats = load(user_id)
+        if stats is not None:
+            stats_cache.set(user_id, stats)
+    return stats
+
+
+def changed(user_id):
+    """Drop user_id's counters once the current transaction commits."""
+    cache.invalidate(stats_cache, user_id)
+
+
+@event.listens_for(File, 'after_insert')
+@event.listens_for(File, 'after_delete')
+def _on_file_write(mapper, connection, target):
+    cache.invalidate(stats_cache, target.owner_id, Session.object_session(target))
+
+
+@event.listens_for(File, 'after_update')
+def _on_file_update(mapper, connection, target):
+    state = inspect(target)
+    if state.attrs.is_trashed.history.has_changes() or state.attrs.size.history.has_changes():
+        cache.invalidate(stats_cache, target.owner_id, Session.object_session(target))
+
+
+@event.listens_for(User, 'after_update')
+def _on_user_update(mapper, connection, target):
+    state = inspect(target)
+    if state.attrs.storage_used.history.has_changes() or state.attrs.storage_limit.history.has_changes():
+        cache.invalidate(stats_cache, target.id, Session.object_session(target))
+
+
+@event.listens_for(SharedFile, 'after_insert')
+@event.listens_for(SharedFile, 'after_delete')
+def _on_share_write(mapper, connection, target):
+    cache.invalidate(stats_cache, target.shared_with_id, Session.object_session(target))
@@ -0,0 +1,197 @@
+import re
+import time
+import threading
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from flask import current_app
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+from src.extensions import db
+from src.models import File
+
+# Name completions for the search box, served from memory.
+#
+# Each user's live (non-trashed) names are kept as one sorted list of
+# (key, name, id, is_folder) tuples, where key is the lower-cased name or the
+# part of it starting at a later word; a prefix lookup is a bisect plus a
+# short walk. Lists are built on first use, dropped least recently used when
+# SUGGEST_CACHE_BYTES is exceeded, and patched in place by the File hooks
+# below once the session commits. Bulk statements (src/tree.py) call
+# changed() instead, which drops the user's list at commit. Other processes
+# see a change within SUGGEST_TTL seconds at most.
+
+ENTRY_OVERHEAD = 120  # rough bytes per tuple beyond the two strings
+_WORD_START = re.compile(r'[\s_\-.(\[]+(?=\w)')
+
+
+def _keys(name):
+    lowered = name.lower()
+    keys = [lowered]
+    for m in _WORD_START.finditer(lowered):
+        keys.append(lowered[m.end():])
+    return keys
+
+
+def _entries(file_id, name, is_folder):
+    return [(key, name, file_id, bool(is_folder)) for key in _keys(name)]
+
+
+def _cost(entry):
+    return len(entry[0]) + len(entry[1]) + ENTRY_OVERHEAD
+
+
+class _UserIndex:
+    __slots__ = ('entries', 'size', 'built_at')
+
+    def __init__(self, entries, built_at):
+        self.entries = sorted(entries)
+        self.size = sum(_cost(e) for e in self.entries)
+        self.built_at = built_at
+
+    def add(self, file_id, name, is_folder):
+        for entry in _entries(file_id, name, is_folder):
+            insort(self.entries, entry)
+            self.size += _cost(entry)
+
+    def remove(self, file_id, name, is_folder):
+        for entry in _entries(file_id, name, is_folder):
+            i = bisect_left(self.entries, entry)
+            if i < len(self.entries) and self.entries[i] == entry:
+                del self.entries[i]
+                self.size -= _cost(entry)
+
+    def complete(self, prefix, limit):
+        results, seen = [], set()
+        i = bisect_left(self.entries, (prefix,))
+        while i < len(self.entries) and len(results) < limit:
+            key, name, file_id, is_folder = self.entries[i]
+            if not key.startswith(prefix):
+                break
+            if file_id not in seen:
+                seen.add(file_id)
+                results.append({'id': file_id, 'name': name, 'is_folder': is_folder})
+            i += 1
+        return results
+
+
+class SuggestCache:
+    """LRU of per-user name indexes bounded by an approximate byte budget."""
+
+    def __init__(self):
+        self._users = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def _build(self, owner_id):
+        rows = db.session.execute(
+            select(File.id, File.name, File.is_folder)
+            .where(File.owner_id == owner_id, File.is_trashed == False)
+        )
+        entries = []
+        for file_id, name, is_folder in rows:
+            entries.extend(_entries(file_id, name, is_folder))
+        return _UserIndex(entries, time.monotonic())
+
+    def complete(self, owner_id, prefix, limit):
+        ttl = current_app.config['SUGGEST_TTL']
+        with self._lock:
+            index = self._users.get(owner_id)
+            if index is not None and time.monotonic() - index.built_at < ttl:
+                self._users.move_to_end(owner_id)
+                return index.complete(prefix, limit)
+
+        index = self._build(owner_id)
+        with self._lock:
+            self._drop(owner_id)
+            self._users[owner_id] = index
+            self._size += index.size
+            self._evict(current_app.config['SUGGEST_CACHE_BYTES'], keep=owner_id)
+            return index.complete(prefix, limit)
+
+    def _drop(self, owner_id):
+        index = self._users.pop(owner_id, None)
+        if index is not None:
+            self._size -= index.size
+
+    def _evict(self, budget, keep):
+        while self._size > budget and len(self._users) > 1:
+            owner_id = next(iter(self._users))
+            if owner_id == keep:
+                self._users.move_to_end(owner_id)
+                continue
+            self._drop(owner_id)
+
+    def apply(self, ops):
+        """Patch cached indexes with committed (op, owner_id, ...) changes."""
+        with self._lock:
+            for op, owner_id, *args in ops:
+                index = self._users.get(owner_id)
+                if index is None:
+                    continue
+                self._size -= index.size
+                if op == 'add':
+                    index.add(*args)
+                elif op == 'remove':
+                    index.remove(*args)
+                else:
+                    del self._users[owner_id]
+                    continue
+                self._size += index.size
+
+    def clear(self):
+        with self._lock:
+            self._users.clear()
+            self._size = 0
+
+
+cache = SuggestCache()
+
+
+def _pending(session):
+    return session.info.setdefault('suggest_ops', [])
+
+
+def changed(owner_id):
+    """Drop owner_id's index once the current transaction commits."""
+    _pending(db.session()).append(('drop', owner_id))
+
+
+@event.listens_for(File, 'after_insert')
+def _on_insert(mapper, connection, target):
+    if not target.is_trashed:
+        _pending(Session.object_session(target)).append(
+            ('add', target.owner_id, target.id, target.name, target.is_folder))
+
+
+@event.listens_for(File, 'after_update')
+def _on_update(mapper, connection, target):
+    state = inspect(target)
+    name, trashed = state.attrs.name.history, state.attrs.is_trashed.history
+    if not name.has_changes() and not trashed.has_changes():
+        return
+    old_name = name.deleted[0] if name.deleted else target.name
+    old_trashed = trashed.deleted[0] if trashed.deleted else target.is_trashed
+    ops = _pending(Session.object_session(target))
+    if not old_trashed:
+        ops.append(('remove', target.owner_id, target.id, old_name, target.is_folder))
+    if not target.is_trashed:
+        ops.append(('add', target.owner_id, target.id, target.name, target.is_folder))
+
+
+@event.listens_for(File, 'after_delete')
+def _on_delete(mapper, connection, target):
+    if not target.is_trashed:
+        _pending(Session.object_session(target)).append(
+            ('remove', target.owner_id, target.id, target.name, target.is_folder))
+
+
+@event.listens_for(Session, 'after_commit')
+def _on_commit(session):
+    ops = session.info.pop('suggest_ops', None)
+    if ops:
+        cache.apply(ops)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _on_rollback(session):
+    session.info.pop('suggest_ops', None)
@@ -0,0 +1,64 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+MAX_PENDING = 256
+
+
+class TaskPool:
+    """Small bounded background pool for best-effort work (checksums, previews...).
+
+    Tasks run inside an app context. Submitting the same key twice while the
+    first is still pending is a no-op, and when MAX_PENDING tasks are queued
+    new ones are dropped; callers must be able to retry later.
+    """
+
+    def __init__(self, app, workers):
+        self.app = app
+        self.workers = workers
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='task') if workers else None
+        self._slots = threading.BoundedSemaphore(MAX_PENDING)
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def submit(self, key, fn, *args):
+        if self._executor is None:
+            # Inline mode (TASK_WORKERS=0), used by the test-suite
+            fn(*args)
+            return True
+
+        with self._lock:
+            if key in self._pending:
+                return True
+            if not self._slots.acquire(blocking=False):
+                logger.warning('Task queue full, dropping %s', key)
+                return False
+            self._pending.add(key)
+        self._executor.submit(self._run, key, fn, args)
+        return True
+
+    def _run(self, key, fn, args):
+        try:
+            with self.app.app_context():
+                fn(*args)
+        except Exception:
+            logger.exception('Background task %s failed', key)
+        finally:
+            with self._lock:
+                self._pending.discard(key)
+            self._slots.release()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+
+def init_app(app):
+    app.extensions['tasks'] = TaskPool(app, app.config['TASK_WORKERS'])
+
+
+def submit(key, fn, *args):
+    return current_app.extensions['tasks'].submit(key, fn, *args)
@@ -0,0 +1,287 @@
+import os
+import logging
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import and_, case, delete, func, literal, or_, select, update
+from sqlalchemy.orm import aliased
+from src import blobstore, previews, stats, suggest, usage
+from src.extensions import db
+from src.models import ActivityLog, File, SharedFile, User
+
+logger = logging.getLogger(__name__)
+
+# File.path holds the ids from the root down to the row itself,
+# '/<root id>/<child id>/.../<own id>/'. Ids never contain '/', so a subtree is
+# the contiguous key range [path, path-with-'/'-bumped-to-'0') of the
+# (owner_id, path) index and ancestors are read straight off the string.
+
+
+# Path and rollup bookkeeping is not an edit of the rows it touches; without
+# this File.updated_at's onupdate would re-date every ancestor or descendant
+_KEEP_MTIME = {'updated_at': File.updated_at}
+
+
+def ancestor_ids(f):
+    """Ids of f's ancestors, root first, without touching the database."""
+    return f.path.strip('/').split('/')[:-1] if f.path else []
+
+
+def load_ancestors(f):
+    """Ancestor rows of f, root first, in one primary-key query."""
+    ids = ancestor_ids(f)
+    if not ids:
+        return []
+    by_id = {a.id: a for a in File.query.filter(File.id.in_(ids), File.owner_id == f.owner_id)}
+    return [by_id[i] for i in ids if i in by_id]
+
+
+def under(path):
+    """Filter matching path and every row below it."""
+    return and_(File.path >= path, File.path < path[:-1] + '0')
+
+
+def is_descendant(file_id, ancestor_id):
+    """True if file_id sits anywhere below ancestor_id."""
+    path = db.session.scalar(select(File.path).where(File.id == file_id))
+    return bool(path) and f'/{ancestor_id}/' in path[:-len(file_id) - 1]
+
+
+def live_folder(owner_id, folder_id):
+    """owner_id's non-trashed folder folder_id, or None; the only valid
+    parent for a new item."""
+    return File.query.filter_by(id=folder_id, owner_id=owner_id, is_folder=True, is_trashed=False).first()
+
+
+def reparent(f, parent):
+    """Set f.parent_id to parent (a File or None) and rewrite the paths of its subtree."""
+    old_path = f.path
+    new_path = (parent.path if parent else '/') + f.id + '/'
+    f.parent_id = parent.id if parent else None
+    if old_path == new_path:
+        return
+    if f.is_folder:
+        touch(f.owner_id)
+    db.session.execute(
+        update(File)
+        .where(File.owner_id == f.owner_id, under(old_path))
+        .values(path=literal(new_path) + func.substr(File.path, len(old_path) + 1), **_KEEP_MTIME)
+        .execution_options(synchronize_session='fetch')
+    )
+
+
+def version_statement(owner_id):
+    """UPDATE bumping the owner's tree_version, the tag of /api/drive/tree."""
+    return (
+        update(User)
+        .where(User.id == owner_id)
+        .values(tree_version=User.tree_version + 1)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def touch(owner_id):
+    """Record a change to the live folder hierarchy (new, renamed, moved,
+    trashed or restored folder)."""
+    db.session.execute(version_statement(owner_id))
+
+
+def attach_statement(owner_id, path, children, files, size):
+    """UPDATE adding an item's weight to the rollups of owner_id's ancestors in path."""
+    ids = path.strip('/').split('/')[:-1]
+    return (
+        update(File)
+        .where(File.id.in_(ids), File.owner_id == owner_id)
+        .values(
+            child_count=File.child_count + case((File.id == ids[-1], children), else_=0),
+            tree_file_count=File.tree_file_count + files,
+            tree_size=File.tree_size + size,
+            **_KEEP_MTIME,
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _weight(f):
+    if f.is_folder:
+        return f.tree_file_count or 0, f.tree_size or 0
+    return 1, f.size or 0
+
+
+def attach(f):
+    """Count f (and for folders its live content) in its ancestors' rollups."""
+    if f.parent_id:
+        files, size = _weight(f)
+        db.session.execute(attach_statement(f.owner_id, f.path, 1, files, size))
+
+
+def detach(f):
+    """Inverse of attach(), before f leaves its ancestors or the live tree."""
+    if f.parent_id:
+        files, size = _weight(f)
+        db.session.execute(attach_statement(f.owner_id, f.path, -1, -files, -size))
+
+
+def _expected_rollups():
+    """Correlated subqueries computing a folder's rollups from scratch."""
+    d = aliased(File)
+    upper = func.substr(File.path, 1, func.length(File.path) - 1, type_=db.Text) + '0'
+    below = and_(
+        d.owner_id == File.owner_id, d.path > File.path, d.path < upper,
+        d.is_trashed == False, d.is_folder == False,
+    )
+    return {
+        'child_count': select(func.count()).where(d.parent_id == File.id, d.is_trashed == False).scalar_subquery(),
+        'tree_file_count': select(func.count()).where(below).scalar_subquery(),
+        'tree_size': select(func.coalesce(func.sum(d.size), 0)).where(below).scalar_subquery(),
+    }
+
+
+def recompute(f):
+    """Rebuild the rollups of every folder in f's subtree (used after restore)."""
+    db.session.execute(
+        update(File)
+        .where(File.owner_id == f.owner_id, under(f.path), File.is_folder == True)
+        .values(**_expected_rollups(), **_KEEP_MTIME)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.expire(f, ['child_count', 'tree_file_count', 'tree_size'])
+
+
+@click.command('verify-rollups')
+@click.option('--repair', is_flag=True, help='Rewrite the folders whose counters drifted.')
+@with_appcontext
+def rollups_command(repair):
+    """Compare stored folder rollups with the live tree."""
+    expected = _expected_rollups()
+    drift = and_(File.is_folder == True, File.is_trashed == False, or_(
+        File.child_count != expected['child_count'],
+        File.tree_file_count != expected['tree_file_count'],
+        File.tree_size != expected['tree_size'],
+    ))
+    ids = db.session.scalars(select(File.id).where(drift)).all()
+    for file_id in ids:
+        click.echo(f'drift: {file_id}')
+    if repair and ids:
+        for i in range(0, len(ids), 500):
+            db.session.execute(
+                update(File)
+                .where(File.id.in_(ids[i:i + 500]))
+                .values(**_expected_rollups(), **_KEEP_MTIME)
+                .execution_options(synchronize_session=False)
+            )
+        db.session.commit()
+    click.echo(f"{len(ids)} folders out of date{', repaired' if repair and ids else ''}")
+
+
+def _top_paths(roots):
+    """Paths of roots minus those already inside another root's subtree."""
+    kept = []
+    for path in sorted(r.path for r in roots if r.path):
+        if not kept or not path.startswith(kept[-1]):
+            kept.append(path)
+    return kept
+
+
+def subtree_filter(roots, owner_id):
+    """Filter for the roots and everything below them (trashed or not)."""
+    return and_(File.owner_id == owner_id, or_(*[under(p) for p in _top_paths(roots)]))
+
+
+def collect_subtree(root_ids, owner_id):
+    """Load the roots and all their non-trashed descendants in a single query."""
+    roots = File.query.filter(File.id.in_(root_ids), File.owner_id == owner_id).all()
+    if not roots:
+        return []
+    return File.query.filter(subtree_filter(roots, owner_id), File.is_trashed == False).all()
+
+
+def trash_subtree(f, now):
+    """Trash f and every live item below it in one UPDATE."""
+    db.session.execute(
+        update(File)
+        .where(File.owner_id == f.owner_id, under(f.path), File.is_trashed == False)
+        .values(original_parent_id=File.parent_id, is_trashed=True, trashed_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    if f.is_folder:
+        touch(f.owner_id)
+    suggest.changed(f.owner_id)
+    stats.changed(f.owner_id)
+    db.session.expire(f)
+
+
+def restore_subtree(f):
+    """Restore the trashed items below f (f itself is reparented by the caller)."""
+    db.session.execute(
+        update(File)
+        .where(File.owner_id == f.owner_id, under(f.path), File.id != f.id, File.is_trashed == True)
+        .values(
+            parent_id=func.coalesce(File.original_parent_id, File.parent_id),
+            original_parent_id=None, is_trashed=False, trashed_at=None,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    touch(f.owner_id)
+    suggest.changed(f.owner_id)
+    stats.changed(f.owner_id)
+
+
+class Purge:
+    """Set-based permanent deletion of whole subtrees.
+
+    run() releases blob references, drops dependent rows and deletes the files
+    with a handful of statements per batch of roots; finish() must be called
+    after the commit to reclaim blobs and unlink legacy files.
+    """
+
+    BATCH = 200  # subtree ranges per statement
+
+    def __init__(self, owner_id):
+        self.owner_id = owner_id
+        self.freed = 0
+        self.digests = set()
+        self.legacy = []
+
+    def run(self, roots):
+        paths = _top_paths(roots)
+        for i in range(0, len(paths), self.BATCH):
+            self._run_batch(paths[i:i + self.BATCH])
+
+    def _run_batch(self, paths):
+        scope = and_(File.owner_id == self.owner_id, or_(*[under(p) for p in paths]))
+        ids = select(File.id).where(scope)
+
+        counts = {}
+        for sha256, count, size in db.session.execute(
+            select(File.sha256, func.count(), func.coalesce(func.sum(File.size), 0))
+            .where(scope, File.sha256.isnot(None))
+            .group_by(File.sha256)
+        ):
+            counts[sha256] = count
+            self.freed += size
+        blobstore.release_many(counts)
+        self.digests.update(counts)
+
+        for file_id, storage_path, size in db.session.execute(
+            select(File.id, File.storage_path, File.size)
+            .where(scope, File.sha256.is_(None), File.storage_path.isnot(None))
+        ):
+            self.legacy.append((file_id, storage_path))
+            self.freed += size or 0
+
+        usage.release(self.owner_id, scope)
+        stats.changed(self.owner_id)
+        db.session.execute(delete(ActivityLog).where(ActivityLog.file_id.in_(ids)).execution_options(synchronize_session=False))
+        db.session.execute(delete(SharedFile).where(SharedFile.file_id.in_(ids)).execution_options(synchronize_session=False))
+        db.session.execute(delete(File).where(scope).execution_options(synchronize_session=False))
+
+    def finish(self):
+        blobstore.collect(self.digests)
+        for file_id, storage_path in self.legacy:
+            try:
+                os.remove(storage_path)
+            except FileNotFoundError:
+                pass
+            except OSError:
+                logger.warning('Could not remove %s', storage_path)
+            previews.remove(file_id)
@@ -0,0 +1,115 @@
+from collections import defaultdict
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from src.extensions import db
+from src.models import File, StorageUsage, User
+
+# Per-user storage counters by category. A file is counted from insert (see
+# models._count_new_file) until it is purged, trash included, the same span
+# user.storage_used covers; /api/user/storage reads a handful of rows
+# instead of every File.
+
+# (category, MIME prefixes, icon), first match wins
+STORAGE_CATEGORIES = [
+    ('Images', ['image/'], 'image'),
+    ('Videos', ['video/'], 'play_circle'),
+    ('Documents', ['application/pdf', 'application/msword',
+                   'application/vnd.openxmlformats-officedocument.wordprocessingml',
+                   'text/'], 'description'),
+    ('Spreadsheets', ['application/vnd.ms-excel',
+                      'application/vnd.openxmlformats-officedocument.spreadsheetml'], 'table_chart'),
+]
+OTHER = ('Other', 'folder_zip')
+
+
+def category_for(mime_type):
+    if mime_type:
+        for name, prefixes, _ in STORAGE_CATEGORIES:
+            if mime_type.startswith(tuple(prefixes)):
+                return name
+    return OTHER[0]
+
+
+def add_statement(dialect_name, user_id, category, size, files):
+    """Upsert adding size bytes and files files to one counter."""
+    insert = postgresql.insert if dialect_name == 'postgresql' else sqlite.insert
+    table = StorageUsage.__table__
+    stmt = insert(table).values(user_id=user_id, category=category, bytes=size, files=files)
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c.user_id, table.c.category],
+        set_={'bytes': table.c.bytes + stmt.excluded.bytes, 'files': table.c.files + stmt.excluded.files},
+    )
+
+
+def release(user_id, scope):
+    """Subtract the files matched by scope from user_id's counters, before they are deleted."""
+    totals = _by_category(db.session.execute(
+        select(File.mime_type, func.count(), func.coalesce(func.sum(File.size), 0))
+        .where(scope, File.is_folder == False)
+        .group_by(File.mime_type)
+    ))
+    dialect = db.engine.dialect.name
+    for category, (files, size) in totals.items():
+        db.session.execute(add_statement(dialect, user_id, category, -size, -files))
+
+
+def _by_category(rows):
+    totals = defaultdict(lambda: [0, 0])
+    for mime_type, files, size in rows:
+        entry = totals[category_for(mime_type)]
+        entry[0] += files
+        entry[1] += size
+    return totals
+
+
+def _actual():
+    """{user_id: {category: [files, bytes]}} computed from the file table."""
+    query = (
+        select(File.owner_id, File.mime_type, func.count(), func.coalesce(func.sum(File.size), 0))
+        .where(File.is_folder == False)
+        .group_by(File.owner_id, File.mime_type)
+    )
+    per_user = defaultdict(list)
+    for owner_id, mime_type, files, size in db.session.execute(query):
+        per_user[owner_id].append((mime_type, files, size))
+    return {owner_id: _by_category(rows) for owner_id, rows in per_user.items()}
+
+
+def reconcile(repair=False):
+    """Compare counters and storage_used with a GROUP BY over file; return the drifted user ids."""
+    actual = _actual()
+    stored = defaultdict(dict)
+    for row in StorageUsage.query.all():
+        stored[row.user_id][row.category] = [row.files, row.bytes]
+
+    drifted = []
+    for user in User.query.all():
+        expected = {c: v for c, v in actual.get(user.id, {}).items() if v != [0, 0]}
+        current = {c: v for c, v in stored.get(user.id, {}).items() if v != [0, 0]}
+        used = sum(size for _, size in expected.values())
+        if expected == current and (user.storage_used or 0) == used:
+            continue
+        drifted.append(user.id)
+        if repair:
+            db.session.execute(delete(StorageUsage).where(StorageUsage.user_id == user.id))
+            db.session.add_all(
+                StorageUsage(user_id=user.id, category=c, files=files, bytes=size)
+                for c, (files, size) in expected.items()
+            )
+            user.storage_used = used
+    if repair and drifted:
+        db.session.commit()
+    return drifted
+
+
+@click.command('reconcile-storage')
+@click.option('--repair', is_flag=True, help='Rewrite the counters that drifted and storage_used.')
+@with_appcontext
+def reconcile_command(repair):
+    """Check per-category storage counters against the file table."""
+    drifted = reconcile(repair)
+    for user_id in drifted:
+        click.echo(f'drift: {user_id}')
+    click.echo(f"{len(drifted)} users out of date{', repaired' if repair and drifted else ''}")
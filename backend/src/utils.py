@@ -139,3 +139,14 @@ def format_relative_time(dt):
         return f"{days}d ago"
     else:
         return dt.strftime('%b %d, %Y')
+
+
+def parse_datetime(value):
+    """Naive UTC datetime from an ISO 8601 query parameter ('Z' suffix allowed).
+
+    Values with an offset are converted to UTC; values without one are taken as UTC.
+    """
+    dt = datetime.fromisoformat(value.rstrip('Z'))
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc)
+    return dt.replace(tzinfo=None)
@@ -0,0 +1,111 @@
+import io
+import os
+import time
+import zipfile
+from urllib.parse import quote
+
+READ_SIZE = 64 * 1024
+
+# Content that is already compressed gains nothing from DEFLATE
+STORED_MIME_PREFIXES = (
+    'image/jpeg', 'image/png', 'image/gif', 'image/webp',
+    'video/', 'audio/',
+    'application/zip', 'application/x-rar', 'application/vnd.rar', 'application/x-7z',
+    'application/gzip', 'application/x-bzip',
+    'application/vnd.openxmlformats-officedocument', 'application/pdf',
+)
+
+
+class _Sink(io.RawIOBase):
+    """Write-only, unseekable buffer that zipfile writes into and the generator drains."""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _compress_type(mime_type):
+    if mime_type and mime_type.startswith(STORED_MIME_PREFIXES):
+        return zipfile.ZIP_STORED
+    return zipfile.ZIP_DEFLATED
+
+
+def _safe_part(name):
+    name = name.replace('/', '_').replace('\\', '_')
+    return '_' if name in ('', '.', '..') else name
+
+
+def build_entries(roots, items):
+    """Map the roots and their loaded descendants to (arcname, path, mime_type) tuples.
+
+    items must contain every row of the subtrees (see tree.collect_subtree);
+    folders become path prefixes and duplicate names get a numeric suffix.
+    """
+    by_id = {f.id: f for f in items}
+    root_ids = {f.id for f in roots}
+    arcnames = {}
+    used = set()
+
+    def arcname(f):
+        if f.id not in arcnames:
+            parent = by_id.get(f.parent_id)
+            prefix = '' if f.id in root_ids or parent is None else arcname(parent) + '/'
+            base = prefix + _safe_part(f.name)
+            candidate, counter = base, 2
+            while candidate in used:
+                stem, ext = os.path.splitext(base)
+                candidate = f"{stem} ({counter}){ext}"
+                counter += 1
+            used.add(candidate)
+            arcnames[f.id] = candidate
+        return arcnames[f.id]
+
+    for f in roots:
+        arcname(f)
+    entries = []
+    for f in sorted(items, key=lambda f: f.name):
+        if f.is_folder or not f.storage_path:
+            continue
+        entries.append((arcname(f), f.storage_path, f.mime_type))
+    return entries
+
+
+def iter_zip(entries):
+    """Yield a ZIP archive of entries chunk by chunk with bounded memory."""
+    sink = _Sink()
+    with zipfile.ZipFile(sink, 'w', allowZip64=True) as zf:
+        for name, path, mime_type in entries:
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            info = zipfile.ZipInfo(name, date_time=time.localtime(max(st.st_mtime, 315532800))[:6])
+            info.file_size = st.st_size  # lets zipfile pick ZIP64 up front for huge members
+            info.compress_type = _compress_type(mime_type)
+            with open(path, 'rb') as src, zf.open(info, 'w') as dst:
+                while block := src.read(READ_SIZE):
+                    dst.write(block)
+                    data = sink.drain()
+                    if data:
+                        yield data
+            data = sink.drain()
+            if data:
+                yield data
+    yield sink.drain()
+
+
+def content_disposition(filename):
+    ascii_name = filename.encode('ascii', 'ignore').decode().replace('"', '') or 'download.zip'
+    return f"attachment; filename=\"{ascii_name}\"; filename*=UTF-8''{quote(filename)}"
@@ -1,7 +1,10 @@
+import io
 import pytest
 import os
+from collections import namedtuple
 import jwt
 from datetime import datetime, timezone, timedelta
+from sqlalchemy import event
 from werkzeug.security import generate_password_hash
 from src import create_app
 from src.extensions import db as _db
@@ -13,6 +16,8 @@ def app():
     os.environ['DATABASE_URL'] = 'sqlite:///:memory:'
     os.environ['UPLOAD_FOLDER'] = '/tmp/cloudspace_test_uploads'
     os.environ['RATELIMIT_ENABLED'] = 'False'
+    os.environ['TASK_WORKERS'] = '0'
+    os.environ['ACTIVITY_FLUSH_SECONDS'] = '0'
     os.makedirs('/tmp/cloudspace_test_uploads/files', exist_ok=True)
     os.makedirs('/tmp/cloudspace_test_uploads/avatars', exist_ok=True)
     os.makedirs('/tmp/cloudspace_test_uploads/previews', exist_ok=True)
@@ -69,3 +74,74 @@ def auth_headers(app, test_user):
             algorithm='HS256',
         )
         return {'Authorization': f'Bearer {token}'}
+
+
+@pytest.fixture(scope='function')
+def upload(client, auth_headers):
+    """upload(name, content, parent_id) stores a file as the test user and returns its id."""
+    def _upload(name='notes.txt', content=b'hello', parent_id=None):
+        data = {'file': (io.BytesIO(content), name)}
+        if parent_id:
+            data['parent_id'] = parent_id
+        res = client.post('/api/files/upload', headers=auth_headers, data=data, content_type='multipart/form-data')
+        assert res.status_code == 201
+        return res.get_json()['id']
+    return _upload
+
+
+@pytest.fixture(scope='function')
+def new_folder(client, auth_headers):
+    """new_folder(name, parent_id) creates a folder as the test user and returns its id."""
+    def _new_folder(name, parent_id=None):
+        res = client.post('/api/drive/folders', json={'name': name, 'parent_id': parent_id}, headers=auth_headers)
+        assert res.status_code == 201
+        return res.get_json()['id']
+    return _new_folder
+
+
+HistoryWalk = namedtuple('HistoryWalk', 'ids pages total')
+
+
+@pytest.fixture(scope='function')
+def walk_history(client, auth_headers):
+    """walk_history(query, limit) follows /api/activity/history cursors to the end."""
+    def _walk(query='', limit=7):
+        ids, cursor, pages = [], None, 0
+        while True:
+            url = f'/api/activity/history?limit={limit}{query}' + (f'&cursor={cursor}' if cursor else '')
+            body = client.get(url, headers=auth_headers).get_json()
+            ids += [e['id'] for group in body['groups'] for e in group['events']]
+            pages += 1
+            assert body['has_more'] == (body['next_cursor'] is not None)
+            cursor = body['next_cursor']
+            if not cursor:
+                return HistoryWalk(ids, pages, body['total'])
+    return _walk
+
+
+class StatementLog:
+    """Context manager recording the SQL executed on an engine while open."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.sql = []
+
+    @property
+    def count(self):
+        return len(self.sql)
+
+    def _on_execute(self, conn, cursor, statement, *args):
+        self.sql.append(statement)
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._on_execute)
+
+
+@pytest.fixture(scope='function')
+def statements(db):
+    """Factory for StatementLog on the test engine: `with statements() as log:`."""
+    return lambda: StatementLog(db.engine)
@@ -0,0 +1,103 @@
+import time
+from datetime import datetime, timezone
+from src import activity
+from src.extensions import db
+from src.models import ActivityLog, File
+from src.routes.history import totals_cache
+
+
+def _queries(client, auth_headers, statements, url):
+    db.session.expire_all()
+    totals_cache.clear()
+    with statements() as counter:
+        assert client.get(url, headers=auth_headers).status_code == 200
+    return counter.count
+
+
+ENDPOINTS = ['/api/dashboard/activity?limit=30', '/api/activity/history', '/api/files/recent']
+
+
+def test_feeds_use_constant_queries_per_page(client, auth_headers, statements, upload):
+    upload('first.txt')
+    small = [_queries(client, auth_headers, statements, url) for url in ENDPOINTS]
+
+    for i in range(12):
+        upload(f'more {i}.txt')
+    large = [_queries(client, auth_headers, statements, url) for url in ENDPOINTS]
+    assert large == small
+
+
+def test_feeds_keep_order_and_tolerate_missing_files(client, auth_headers, test_user, upload):
+    names = [f'doc {i}.txt' for i in range(3)]
+    ids = [upload(name) for name in names]
+    db.session.add(ActivityLog(user_id=test_user, file_id='gone', action='file_viewed'))
+    db.session.commit()
+
+    feed = client.get('/api/dashboard/activity?limit=10', headers=auth_headers).get_json()['activities']
+    assert [a['target'] for a in feed] == ['a file'] + names[::-1]
+    assert feed[0]['user']['name'] == 'You'
+
+    history = client.get('/api/activity/history', headers=auth_headers).get_json()
+    events = [e for group in history['groups'] for e in group['events']]
+    assert [e['target_id'] for e in events] == ['gone'] + ids[::-1]
+    assert events[0]['target'] == 'un élément'
+
+    client.delete(f'/api/files/{ids[1]}', headers=auth_headers)
+    recent = client.get('/api/files/recent', headers=auth_headers).get_json()
+    assert [f['id'] for group in recent['groups'] for f in group['files']] == [ids[2], ids[0]]
+
+
+def _actions(user_id):
+    db.session.expire_all()
+    return [a.action for a in ActivityLog.query.filter_by(user_id=user_id).order_by(ActivityLog.created_at)]
+
+
+def test_sink_flushes_by_size_and_on_shutdown(app, db, test_user):
+    sink = activity.ActivitySink(app, batch_size=3, interval=60)
+    sink.put([activity._row(test_user, 'file_viewed', None, None, datetime.now(timezone.utc)) for _ in range(2)])
+    assert _actions(test_user) == []
+
+    sink.put([activity._row(test_user, 'file_downloaded', None, None, datetime.now(timezone.utc))])
+    deadline = time.monotonic() + 5
+    while len(_actions(test_user)) < 3 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert len(_actions(test_user)) == 3
+
+    sink.put([activity._row(test_user, 'file_viewed', None, None, datetime.now(timezone.utc))])
+    sink.shutdown()
+    assert len(_actions(test_user)) == 4
+
+
+def test_buffered_events_wait_for_commit(app, db, test_user):
+    f = File(name='draft.txt', owner_id=test_user, icon='description', icon_color='text-slate-500')
+    db.session.add(f)
+    activity.record(test_user, 'file_uploaded', f)
+    db.session.rollback()
+    assert _actions(test_user) == []
+
+    f = File(name='draft.txt', owner_id=test_user, icon='description', icon_color='text-slate-500')
+    db.session.add(f)
+    activity.record(test_user, 'file_uploaded', f)
+    activity.record(test_user, 'file_trashed', f)
+    assert [a.action for a in db.session.new if isinstance(a, ActivityLog)] == ['file_trashed']
+    db.session.commit()
+    assert sorted(_actions(test_user)) == ['file_trashed', 'file_uploaded']
+    assert {a.file_id for a in ActivityLog.query.filter_by(user_id=test_user)} == {f.id}
+
+
+def test_download_is_logged_once_per_transfer(client, auth_headers, test_user, upload):
+    file_id = upload('clip.txt')
+    url = f'/api/files/{file_id}/download'
+    assert client.get(url, headers=auth_headers).status_code == 200
+    assert client.get(url, headers={**auth_headers, 'Range': 'bytes=0-3'}).status_code == 206
+    assert client.get(url, headers={**auth_headers, 'Range': 'bytes=4-'}).status_code == 206
+    assert client.get(url + '?inline=true', headers=auth_headers).status_code == 200
+    assert _actions(test_user) == ['file_uploaded', 'file_downloaded', 'file_downloaded', 'file_viewed']
+
+
+def test_folder_creation_is_linked_to_folder(client, auth_headers, test_user):
+    res = client.post('/api/drive/folders', headers=auth_headers, json={'name': 'Plans'})
+    assert res.status_code == 201
+    db.session.expire_all()
+    log = ActivityLog.query.filter_by(user_id=test_user, action='folder_created').one()
+    assert log.file_id == res.get_json()['id']
@@ -0,0 +1,83 @@
+import os
+import hashlib
+from src.extensions import db
+from src.models import Blob, File
+
+
+def test_identical_uploads_share_one_blob(client, auth_headers, upload):
+    content = b'shared design asset\n' * 50
+    first = upload('a.txt', content)
+    second = upload('b.txt', content)
+
+    f1 = db.session.get(File, first)
+    f2 = db.session.get(File, second)
+    assert f1.storage_path == f2.storage_path
+    blob = db.session.get(Blob, hashlib.sha256(content).hexdigest())
+    assert blob.ref_count == 2
+
+
+def test_copy_is_metadata_only_and_purge_releases(client, auth_headers, upload):
+    content = b'copy me by reference\n' * 20
+    uploaded = upload('doc.txt', content)
+    sha = hashlib.sha256(content).hexdigest()
+
+    res = client.post(f"/api/files/{uploaded}/copy", json={}, headers=auth_headers)
+    assert res.status_code == 201
+    copy_id = res.get_json()['id']
+    assert db.session.get(File, copy_id).storage_path == db.session.get(File, uploaded).storage_path
+    assert db.session.get(Blob, sha).ref_count == 2
+
+    path = db.session.get(Blob, sha).storage_path
+    for file_id in (uploaded, copy_id):
+        client.delete(f'/api/files/{file_id}', headers=auth_headers)
+        res = client.delete(f'/api/trash/{file_id}', headers=auth_headers)
+        assert res.status_code == 200
+
+    db.session.expire_all()
+    assert db.session.get(Blob, sha) is None
+    assert not os.path.exists(path)
+
+
+def test_instant_upload_probe(client, auth_headers, upload):
+    content = b'already on the server\n' * 30
+    upload('doc.txt', content)
+    sha = hashlib.sha256(content).hexdigest()
+
+    res = client.post('/api/files/upload/instant', json={
+        'name': 'again.txt', 'sha256': sha, 'size': len(content),
+    }, headers=auth_headers)
+    assert res.status_code == 201
+    assert res.get_json()['instant'] is True
+
+    res = client.post('/api/files/upload/instant', json={
+        'name': 'missing.txt', 'sha256': '0' * 64, 'size': 10,
+    }, headers=auth_headers)
+    assert res.status_code == 404
+
+
+def test_collect_unlinks_before_its_delete_commits(app, db, monkeypatch, tmp_path):
+    from src import blobstore
+    content = b'collected while stored again\n'
+    sha = hashlib.sha256(content).hexdigest()
+    tmp = tmp_path / 'first'
+    tmp.write_bytes(content)
+    path = blobstore.store(str(tmp), sha, len(content))
+    db.session.commit()
+    blobstore.release(sha)
+    db.session.commit()
+
+    # store() waits on the row lock, so the unlink must happen inside the DELETE's transaction
+    removals = {}
+    real_remove = os.remove
+    monkeypatch.setattr(os, 'remove', lambda p: (removals.setdefault(p, db.session().in_transaction()), real_remove(p)))
+    assert blobstore.collect([sha]) == 1
+    assert removals[path] is True
+
+    tmp = tmp_path / 'second'
+    tmp.write_bytes(content)
+    assert blobstore.store(str(tmp), sha, len(content)) == path
+    db.session.commit()
+    assert not tmp.exists()
+    with open(path, 'rb') as fh:
+        assert fh.read() == content
+    assert db.session.get(Blob, sha).ref_count == 1
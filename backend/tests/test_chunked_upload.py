@@ -0,0 +1,141 @@
+def _start(client, auth_headers, name='notes.txt', size=0):
+    res = client.post('/api/files/uploads', json={'name': name, 'size': size}, headers=auth_headers)
+    assert res.status_code == 201
+    return res.get_json()
+
+
+def _put(client, auth_headers, session_id, data, start, total):
+    headers = dict(auth_headers)
+    headers['Content-Range'] = f'bytes {start}-{start + len(data) - 1}/{total}'
+    return client.put(f'/api/files/uploads/{session_id}', data=data, headers=headers)
+
+
+def test_session_requires_auth(client):
+    res = client.post('/api/files/uploads', json={'name': 'a.txt', 'size': 3})
+    assert res.status_code == 401
+
+
+def test_session_rejects_oversize(client, auth_headers):
+    res = client.post('/api/files/uploads', json={'name': 'big.txt', 'size': 200 * 1024 * 1024},
+                      headers=auth_headers)
+    assert res.status_code == 413
+
+
+def test_chunks_out_of_order_then_commit(client, auth_headers):
+    content = b'Hello, resumable CloudSpace upload!\n' * 10
+    session = _start(client, auth_headers, size=len(content))
+    half = len(content) // 2
+
+    res = _put(client, auth_headers, session['id'], content[half:], half, len(content))
+    assert res.status_code == 200
+    assert res.get_json()['offset'] == 0
+
+    status = client.get(f"/api/files/uploads/{session['id']}", headers=auth_headers).get_json()
+    assert status['received'] == [[half, len(content)]]
+
+    res = _put(client, auth_headers, session['id'], content[:half], 0, len(content))
+    assert res.get_json()['offset'] == len(content)
+
+    res = client.post(f"/api/files/uploads/{session['id']}/commit", headers=auth_headers)
+    assert res.status_code == 201
+    body = res.get_json()
+    assert body['name'] == 'notes.txt'
+    assert body['size'] == len(content)
+
+    res = client.get(f"/api/files/{body['id']}/download", headers=auth_headers)
+    assert res.data == content
+
+
+def test_commit_incomplete_session(client, auth_headers):
+    session = _start(client, auth_headers, size=10)
+    _put(client, auth_headers, session['id'], b'12345', 0, 10)
+
+    res = client.post(f"/api/files/uploads/{session['id']}/commit", headers=auth_headers)
+    assert res.status_code == 409
+    assert res.get_json()['offset'] == 5
+
+
+def test_abort_session(client, auth_headers):
+    session = _start(client, auth_headers, size=4)
+    res = client.delete(f"/api/files/uploads/{session['id']}", headers=auth_headers)
+    assert res.status_code == 200
+    res = client.get(f"/api/files/uploads/{session['id']}", headers=auth_headers)
+    assert res.status_code == 404
+
+
+def test_only_one_commit_claims_a_session(client, auth_headers):
+    from src.extensions import db
+    from src.models import UploadSession
+    from src.routes.uploads import _claim_session
+    session = _start(client, auth_headers, size=5)
+    _put(client, auth_headers, session['id'], b'12345', 0, 5)
+
+    row = db.session.get(UploadSession, session['id'])
+    assert _claim_session(row)
+    # What a concurrent commit sees once the first claim is in
+    assert not _claim_session(row)
+    db.session.rollback()
+
+    res = client.post(f"/api/files/uploads/{session['id']}/commit", headers=auth_headers)
+    assert res.status_code == 201
+    res = client.post(f"/api/files/uploads/{session['id']}/commit", headers=auth_headers)
+    assert res.status_code == 404
+
+
+def test_commit_over_quota_keeps_the_session(client, auth_headers, test_user):
+    from src.extensions import db
+    from src.models import User
+    session = _start(client, auth_headers, size=5)
+    _put(client, auth_headers, session['id'], b'12345', 0, 5)
+    db.session.get(User, test_user).storage_limit = 0
+    db.session.commit()
+
+    res = client.post(f"/api/files/uploads/{session['id']}/commit", headers=auth_headers)
+    assert res.status_code == 413
+    status = client.get(f"/api/files/uploads/{session['id']}", headers=auth_headers)
+    assert status.status_code == 200
+    assert status.get_json()['received'] == [[0, 5]]
+
+
+def test_open_sessions_count_against_quota(client, auth_headers, test_user):
+    from src.extensions import db
+    from src.models import User
+    db.session.get(User, test_user).storage_limit = 100
+    db.session.commit()
+
+    _start(client, auth_headers, size=60)
+    res = client.post('/api/files/uploads', json={'name': 'b.txt', 'size': 60}, headers=auth_headers)
+    assert res.status_code == 413
+    _start(client, auth_headers, name='c.txt', size=40)
+
+
+def test_expired_sessions_are_swept(app, client, auth_headers):
+    import os
+    from datetime import datetime
+    from src.extensions import db
+    from src.models import UploadSession
+    stale = _start(client, auth_headers, size=4)
+    row = db.session.get(UploadSession, stale['id'])
+    path = row.storage_path
+    row.expires_at = datetime(2000, 1, 1)
+    db.session.commit()
+
+    assert '1 expired upload sessions removed' in app.test_cli_runner().invoke(args=['purge-upload-sessions']).output
+    assert db.session.get(UploadSession, stale['id']) is None
+    assert not os.path.exists(path)
+
+
+def test_account_deletion_removes_sessions(client, auth_headers):
+    import os
+    from src.extensions import db
+    from src.models import UploadChunk, UploadSession
+    session = _start(client, auth_headers, size=10)
+    _put(client, auth_headers, session['id'], b'12345', 0, 10)
+    path = db.session.get(UploadSession, session['id']).storage_path
+
+    res = client.delete('/api/user/account', json={'password': 'testpassword'}, headers=auth_headers)
+    assert res.status_code == 200
+    db.session.expire_all()
+    assert UploadSession.query.count() == 0
+    assert UploadChunk.query.count() == 0
+    assert not os.path.exists(path)
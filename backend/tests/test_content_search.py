@@ -0,0 +1,49 @@
+from src import content_index
+from src.extensions import db
+
+
+def _search(client, auth_headers, q, **params):
+    res = client.get('/api/search', query_string={'q': q, 'scope': 'content', **params}, headers=auth_headers)
+    assert res.status_code == 200
+    return res.get_json()['results']
+
+
+def test_content_search_with_snippets(client, auth_headers, upload):
+    upload('notes.txt', b'Meeting notes: the quarterly forecast looks strong.\n')
+    upload('data.csv', b'region,forecast\nnorth,12\n')
+    upload('other.txt', b'nothing relevant here\n')
+
+    results = _search(client, auth_headers, 'forecast')
+    assert {r['name'] for r in results} == {'notes.txt', 'data.csv'}
+    notes = next(r for r in results if r['name'] == 'notes.txt')
+    start, end = notes['highlights'][0]
+    assert notes['snippet'][start:end] == 'forecast'
+
+    assert [r['name'] for r in _search(client, auth_headers, 'quarterly forecast')] == ['notes.txt']
+    assert _search(client, auth_headers, 'forecast', type='image') == []
+
+
+def test_large_files_are_indexed_in_chunks(client, auth_headers, monkeypatch, upload):
+    monkeypatch.setattr(content_index, 'CHUNK_CHARS', 1024)
+    body = (b'lorem ipsum dolor ' * 200) + b'needle ' + (b'sit amet ' * 200)
+    file_id = upload('big.txt', body)
+
+    docs = content_index.backend().docs
+    chunks = db.session.execute(docs.select().where(docs.c.file_id == file_id)).all()
+    assert len(chunks) > 5 and all(len(c.body) <= 1024 for c in chunks)
+
+    results = _search(client, auth_headers, 'needle')
+    assert [r['id'] for r in results] == [file_id]
+    assert 'needle' in results[0]['snippet']
+
+
+def test_copies_share_text_and_deletes_drop_it(client, auth_headers, upload):
+    file_id = upload('a.txt', b'unique marmalade recipe\n')
+    copy_id = client.post(f'/api/files/{file_id}/copy', json={}, headers=auth_headers).get_json()['id']
+    assert {r['id'] for r in _search(client, auth_headers, 'marmalade')} == {file_id, copy_id}
+
+    client.delete(f'/api/files/{copy_id}', headers=auth_headers)
+    assert [r['id'] for r in _search(client, auth_headers, 'marmalade')] == [file_id]
+    client.delete(f'/api/trash/{copy_id}', headers=auth_headers)
+    docs = content_index.backend().docs
+    assert db.session.execute(docs.select().where(docs.c.file_id == copy_id)).first() is None
@@ -0,0 +1,72 @@
+import jwt
+from datetime import datetime, timezone, timedelta
+from werkzeug.security import generate_password_hash
+from src.extensions import db
+from src.models import ActivityLog, User
+
+
+def _other_user(app):
+    user = User(first_name='Other', last_name='Person', email='other@cloudspace.test',
+                password_hash=generate_password_hash('x'), is_verified=True)
+    db.session.add(user)
+    db.session.commit()
+    token = jwt.encode(
+        {'sub': user.id, 'type': 'access', 'iat': datetime.now(timezone.utc),
+         'exp': datetime.now(timezone.utc) + timedelta(hours=1)},
+        app.config['SECRET_KEY'], algorithm='HS256',
+    )
+    return {'Authorization': f'Bearer {token}'}
+
+
+def test_stats_are_one_query_then_cached(client, auth_headers, statements, upload):
+    upload('a.txt')
+    with statements() as first:
+        stats = client.get('/api/dashboard/stats', headers=auth_headers).get_json()
+    assert stats['total_files'] == 1
+    assert stats['total_files_change'] == '+1 this week'
+    assert len([s for s in first.sql if 'shared_file' in s]) == 1
+
+    with statements() as second:
+        assert client.get('/api/dashboard/stats', headers=auth_headers).get_json() == stats
+    assert not [s for s in second.sql if 'file' in s]
+
+
+def test_writes_invalidate_cached_stats(app, client, auth_headers, upload):
+    other_headers = _other_user(app)
+    doc = upload('a.txt')
+    upload('b.txt')
+
+    def stats(headers=auth_headers):
+        return client.get('/api/dashboard/stats', headers=headers).get_json()
+
+    assert stats()['total_files'] == 2
+    assert stats(other_headers)['shared_files'] == 0
+
+    client.post(f'/api/files/{doc}/share', json={'email': 'other@cloudspace.test'}, headers=auth_headers)
+    assert stats(other_headers)['shared_files'] == 1
+    assert stats(other_headers)['shared_files_change'] == '+1 this week'
+
+    client.delete(f'/api/files/{doc}', headers=auth_headers)
+    after_trash = stats()
+    assert (after_trash['total_files'], after_trash['trash_items']) == (1, 1)
+    assert after_trash['trash_auto_delete'] == '30d'
+
+    client.delete(f'/api/trash/{doc}', headers=auth_headers)
+    assert stats()['trash_items'] == 0
+
+
+def test_quick_access_skips_trashed_files_and_repeats(client, auth_headers, test_user, upload):
+    first = upload('first.txt')
+    second = upload('second.txt')
+    third = upload('third.txt')
+    now = datetime.now(timezone.utc)
+    db.session.add_all([
+        ActivityLog(user_id=test_user, file_id=first, action='file_viewed', created_at=now + timedelta(minutes=i))
+        for i in range(3)
+    ])
+    db.session.commit()
+    client.delete(f'/api/files/{second}', headers=auth_headers)
+
+    files = client.get('/api/dashboard/quick-access', headers=auth_headers).get_json()['files']
+    assert [f['id'] for f in files] == [first, third]
+    assert files[0]['subtitle'].startswith('Opened')
@@ -0,0 +1,87 @@
+import hashlib
+
+CONTENT = b''.join(b'line %05d of a long log\n' % i for i in range(440))
+
+
+def test_download_has_strong_etag_and_revalidates(client, auth_headers, upload):
+    file_id = upload('server.log.txt', CONTENT)
+    res = client.get(f'/api/files/{file_id}/download', headers=auth_headers)
+    assert res.status_code == 200
+    assert res.headers['Accept-Ranges'] == 'bytes'
+    assert res.headers['ETag'] == f'"{hashlib.sha256(CONTENT).hexdigest()}"'
+
+    res = client.get(f'/api/files/{file_id}/download', headers={
+        **auth_headers, 'If-None-Match': res.headers['ETag'],
+    })
+    assert res.status_code == 304
+    assert res.data == b''
+
+    res = client.get(f'/api/files/{file_id}/download', headers={
+        **auth_headers, 'If-Modified-Since': res.headers.get('Last-Modified') or 'Fri, 01 Jan 2100 00:00:00 GMT',
+    })
+    assert res.status_code == 304
+
+
+def test_single_range_and_if_range(client, auth_headers, upload):
+    file_id = upload('server.log.txt', CONTENT)
+    etag = f'"{hashlib.sha256(CONTENT).hexdigest()}"'
+
+    res = client.get(f'/api/files/{file_id}/download', headers={**auth_headers, 'Range': 'bytes=100-199'})
+    assert res.status_code == 206
+    assert res.headers['Content-Range'] == f'bytes 100-199/{len(CONTENT)}'
+    assert res.data == CONTENT[100:200]
+
+    res = client.get(f'/api/files/{file_id}/download', headers={
+        **auth_headers, 'Range': 'bytes=-10', 'If-Range': etag,
+    })
+    assert res.status_code == 206
+    assert res.data == CONTENT[-10:]
+
+    res = client.get(f'/api/files/{file_id}/download', headers={
+        **auth_headers, 'Range': 'bytes=0-9', 'If-Range': '"stale"',
+    })
+    assert res.status_code == 200
+    assert res.data == CONTENT
+
+
+def test_multi_range(client, auth_headers, upload):
+    file_id = upload('server.log.txt', CONTENT)
+    res = client.get(f'/api/files/{file_id}/download', headers={
+        **auth_headers, 'Range': 'bytes=0-9,5000-5009,-4',
+    })
+    assert res.status_code == 206
+    assert res.mimetype == 'multipart/byteranges'
+    body = res.get_data()
+    assert int(res.headers['Content-Length']) == len(body)
+    assert b'Content-Range: bytes 0-9/11000' in body
+    assert CONTENT[5000:5010] in body
+    assert b'Content-Range: bytes 10996-10999/11000' in body
+
+    # Overlapping ranges are coalesced into a plain 206
+    res = client.get(f'/api/files/{file_id}/download', headers={
+        **auth_headers, 'Range': 'bytes=0-99,50-149',
+    })
+    assert res.status_code == 206
+    assert res.data == CONTENT[:150]
+
+    res = client.get(f'/api/files/{file_id}/download', headers={
+        **auth_headers, 'Range': 'bytes=20000-20010,30000-',
+    })
+    assert res.status_code == 416
+
+
+def test_accel_redirect_offload(app, client, auth_headers, upload):
+    file_id = upload('server.log.txt', CONTENT)
+    app.config['ACCEL_REDIRECT_PREFIX'] = '/_protected/'
+    try:
+        res = client.get(f'/api/files/{file_id}/download', headers=auth_headers)
+        assert res.status_code == 200
+        assert res.data == b''
+        assert res.headers['X-Accel-Redirect'].startswith('/_protected/blobs/')
+        assert res.headers['Content-Disposition'].startswith('attachment;')
+
+        other = client.get(f'/api/files/{file_id}/download')
+        assert other.status_code == 401
+        assert 'X-Accel-Redirect' not in other.headers
+    finally:
+        app.config['ACCEL_REDIRECT_PREFIX'] = ''
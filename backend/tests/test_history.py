@@ -0,0 +1,47 @@
+from datetime import datetime, timedelta
+from sqlalchemy import text
+from src.extensions import db
+from src.models import ActivityLog
+
+
+def _log(user_id, count, action='file_viewed', start=datetime(2026, 3, 1, 12, 0)):
+    # Pairs of rows share a timestamp so pages must break ties on id
+    rows = [ActivityLog(user_id=user_id, action=action, created_at=start + timedelta(minutes=i // 2))
+            for i in range(count)]
+    db.session.add_all(rows)
+    db.session.commit()
+    return rows
+
+
+def test_history_cursor_walks_every_row_once(client, auth_headers, test_user, walk_history):
+    rows = _log(test_user, 20)
+    expected = [r.id for r in sorted(rows, key=lambda r: (r.created_at, r.id), reverse=True)]
+    ids, pages, total = walk_history()
+    assert ids == expected
+    assert (pages, total) == (3, 20)
+
+    res = client.get('/api/activity/history?cursor=garbage', headers=auth_headers)
+    assert res.status_code == 400
+
+
+def test_history_filters_by_action_and_date(client, auth_headers, test_user, walk_history):
+    _log(test_user, 10)
+    shared = _log(test_user, 4, action='file_shared')
+    ids, _, total = walk_history('&action=file_shared')
+    assert sorted(ids) == sorted(r.id for r in shared) and total == 4
+
+    ids, _, _ = walk_history('&after=2026-03-01T12:02:00Z&before=2026-03-01T12:04:00Z')
+    assert len(ids) == 4  # minutes 2 and 3 of the views; the shares end at minute 1
+    offset, _, _ = walk_history('&after=2026-03-01T14:02:00%2B02:00&before=2026-03-01T14:04:00%2B02:00')
+    assert offset == ids
+
+    res = client.get('/api/activity/history?after=yesterday', headers=auth_headers)
+    assert res.status_code == 400
+
+
+def test_history_page_is_an_index_range(db):
+    plan = ' '.join(row[3] for row in db.session.execute(text(
+        "EXPLAIN QUERY PLAN SELECT * FROM activity_log WHERE user_id = 'u' AND (created_at < '2026-01-01'"
+        " OR (created_at = '2026-01-01' AND id < 'x')) ORDER BY created_at DESC, id DESC LIMIT 31"
+    )))
+    assert 'ix_activity_user_created' in plan and 'TEMP B-TREE' not in plan
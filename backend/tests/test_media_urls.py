@@ -0,0 +1,31 @@
+from unittest.mock import patch
+
+
+def test_listings_return_stable_signed_urls(client, auth_headers, upload):
+    upload('notes.txt', b'plain text body\n')
+    first = client.get('/api/drive/contents', headers=auth_headers).get_json()['files'][0]['media_url']
+    second = client.get('/api/drive/contents', headers=auth_headers).get_json()['files'][0]['media_url']
+    assert first == second
+    assert '&sig=' in first
+
+
+def test_signed_url_serves_without_user_lookup(client, auth_headers, upload):
+    upload('notes.txt', b'plain text body\n')
+    url = client.get('/api/drive/contents', headers=auth_headers).get_json()['files'][0]['media_url']
+
+    with patch('src.auth.db.session.get', side_effect=AssertionError('user lookup')):
+        res = client.get(url)
+    assert res.status_code == 200
+    assert res.data == b'plain text body\n'
+    assert res.headers['Cache-Control'].startswith('public, max-age=')
+
+
+def test_tampered_or_expired_url_rejected(client, auth_headers, test_user, upload):
+    file_id = upload('notes.txt', b'plain text body\n')
+    url = client.get('/api/drive/contents', headers=auth_headers).get_json()['files'][0]['media_url']
+
+    assert client.get(url.replace(f'o={test_user}', 'o=someone-else')).status_code == 403
+    assert client.get(url[:-1] + ('0' if url[-1] != '0' else '1')).status_code == 403
+    with patch('src.auth.time.time', return_value=10 ** 11):
+        assert client.get(url).status_code == 403
+    assert client.get(f'/api/files/{file_id}/media').status_code == 403
@@ -0,0 +1,44 @@
+import io
+from PIL import Image
+from src.extensions import db
+from src.models import File
+
+
+def _png(size=(1600, 1200)):
+    buf = io.BytesIO()
+    Image.new('RGB', size, (30, 120, 200)).save(buf, 'PNG')
+    return buf.getvalue()
+
+
+def test_upload_generates_thumbnail(client, auth_headers, upload):
+    file_id = upload('photo.png', _png())
+    assert db.session.get(File, file_id).preview_url == f'/api/files/{file_id}/thumbnail'
+
+    image = client.get('/api/files/gallery', headers=auth_headers).get_json()['images'][0]
+    res = client.get(image['thumbnail_url'])
+    assert res.status_code == 200
+    assert res.mimetype == 'image/webp'
+    assert res.headers['Cache-Control'].startswith('public')
+    thumb = Image.open(io.BytesIO(res.data))
+    assert max(thumb.size) == 320
+    assert len(res.data) < image['size'] / 10
+
+
+def test_unreadable_image_has_no_preview(client, auth_headers, upload):
+    file_id = upload('broken.png', _png()[:60])
+    assert db.session.get(File, file_id).preview_url is None
+
+
+def test_backfill_command(app, client, auth_headers, upload):
+    from datetime import datetime
+    file_id = upload('photo.png', _png((400, 300)))
+    f = db.session.get(File, file_id)
+    f.preview_url = None
+    f.updated_at = datetime(2020, 1, 1)
+    db.session.commit()
+
+    result = app.test_cli_runner().invoke(args=['backfill-previews'])
+    assert '1 previews generated' in result.output
+    f = db.session.get(File, file_id)
+    assert f.preview_url
+    assert f.updated_at == datetime(2020, 1, 1)
@@ -0,0 +1,54 @@
+import os
+from datetime import datetime, timedelta, timezone
+import pytest
+from src.extensions import db
+from src.models import ActivityLog
+from src import retention
+
+
+@pytest.fixture
+def archive_dir(app, tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, 'ACTIVITY_ARCHIVE_FOLDER', str(tmp_path))
+    monkeypatch.setitem(app.config, 'ACTIVITY_RETENTION_DAYS', 30)
+    return tmp_path
+
+
+def _log(user_id, days_ago, count, action='file_viewed'):
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    rows = [ActivityLog(user_id=user_id, action=action, created_at=now - timedelta(days=days_ago, minutes=i))
+            for i in range(count)]
+    db.session.add_all(rows)
+    db.session.commit()
+    return [(r.created_at, r.id) for r in rows]
+
+
+def test_archive_moves_old_rows_and_history_reads_through(app, test_user, archive_dir, walk_history):
+    keys = _log(test_user, 1, 3) + _log(test_user, 40, 5) + _log(test_user, 100, 3, action='file_shared')
+    expected = [i for _, i in sorted(keys, reverse=True)]
+
+    result = app.test_cli_runner().invoke(args=['archive-activity'])
+    assert '8 activity rows archived' in result.output
+    assert ActivityLog.query.filter_by(user_id=test_user).count() == 3
+    assert len(os.listdir(archive_dir / test_user)) >= 2
+
+    assert walk_history(limit=4).ids == expected
+    assert walk_history('&action=file_shared', limit=4).ids == expected[-3:]
+    assert app.test_cli_runner().invoke(args=['archive-activity']).output.startswith('0 activity rows')
+
+
+def test_archive_survives_a_repeated_batch(app, test_user, archive_dir):
+    _log(test_user, 60, 2)
+    rows = db.session.execute(ActivityLog.__table__.select()).all()
+    # A crash between writing the archive and deleting the rows
+    retention._append(test_user, retention.month_start(rows[0].created_at), rows)
+    retention.archive(retention.horizon())
+    assert len(retention.read_archive(test_user, 10)) == 2
+
+
+def test_deleting_the_account_removes_its_archive(app, client, auth_headers, test_user, archive_dir):
+    _log(test_user, 60, 2)
+    retention.archive(retention.horizon())
+    assert (archive_dir / test_user).exists()
+    res = client.delete('/api/user/account', json={'password': 'testpassword'}, headers=auth_headers)
+    assert res.status_code == 200
+    assert not (archive_dir / test_user).exists()
@@ -0,0 +1,107 @@
+from sqlalchemy import text
+from src.extensions import db
+
+
+def _search(client, auth_headers, q):
+    res = client.get('/api/search', query_string={'q': q}, headers=auth_headers)
+    assert res.status_code == 200
+    return [r['name'] for r in res.get_json()['results']]
+
+
+def test_results_are_ranked_by_relevance(client, auth_headers, upload):
+    for name in ('old budget notes.txt', 'budget.txt', 'budgets 2024.txt', 'q3 budget.txt', 'nobudget.txt'):
+        upload(name)
+    assert _search(client, auth_headers, 'BUDGET') == [
+        'budget.txt', 'budgets 2024.txt', 'q3 budget.txt', 'old budget notes.txt', 'nobudget.txt',
+    ]
+    assert _search(client, auth_headers, '100%') == []
+
+
+def test_index_follows_rename_trash_and_delete(client, auth_headers, upload):
+    file_id = upload('draft.txt')
+    assert _search(client, auth_headers, 'draft') == ['draft.txt']
+
+    client.put(f'/api/files/{file_id}/rename', json={'name': 'final.txt'}, headers=auth_headers)
+    assert _search(client, auth_headers, 'draft') == []
+    assert _search(client, auth_headers, 'final') == ['final.txt']
+
+    client.delete(f'/api/files/{file_id}', headers=auth_headers)
+    assert _search(client, auth_headers, 'final') == []
+    client.delete(f'/api/trash/{file_id}', headers=auth_headers)
+    remaining = db.session.execute(text('SELECT count(*) FROM file_search_docs WHERE file_id = :i'), {'i': file_id})
+    assert remaining.scalar() == 0
+
+
+def test_short_queries_and_other_users(client, auth_headers, app, upload):
+    from werkzeug.security import generate_password_hash
+    from src.models import File, User
+    other = User(first_name='O', last_name='U', email='other@cloudspace.test', password_hash=generate_password_hash('x'))
+    db.session.add(other)
+    db.session.flush()
+    db.session.add(File(name='report.txt', owner_id=other.id, icon='description', icon_color='text-slate-500'))
+    db.session.commit()
+
+    upload('ab notes.txt')
+    assert _search(client, auth_headers, 'ab') == ['ab notes.txt']
+    assert _search(client, auth_headers, 'report') == []
+
+
+def test_match_uses_the_fts_index(db):
+    plan = db.session.execute(text(
+        "EXPLAIN QUERY PLAN SELECT file_id FROM file_search_docs JOIN file_search "
+        "ON file_search.rowid = file_search_docs.docid WHERE file_search MATCH '\"budget\"'"
+    )).fetchall()
+    assert any('VIRTUAL TABLE INDEX' in row[-1] for row in plan)
+
+
+def test_attribute_and_subtree_filters(client, auth_headers, upload):
+    folder = client.post('/api/drive/folders', json={'name': 'Projects'}, headers=auth_headers).get_json()['id']
+    inside = upload('plan.txt', parent_id=folder)
+    outside = upload('plan b.txt')
+    client.put(f'/api/files/{outside}/star', headers=auth_headers)
+
+    def ids(**params):
+        res = client.get('/api/search', query_string=params, headers=auth_headers)
+        assert res.status_code == 200
+        return {r['id'] for r in res.get_json()['results']}
+
+    assert ids(q='plan', folder=folder) == {inside}
+    assert ids(starred='true') == {outside}
+    assert ids(q='plan', starred='false') == {inside}
+    assert ids(q='plan', min_size=1, max_size=100) == {inside, outside}
+    assert ids(q='plan', min_size=1000) == set()
+    assert ids(q='plan', created_after='2000-01-01T00:00:00Z', modified_before='2999-01-01') == {inside, outside}
+    assert ids(q='plan', owner='others') == set()
+    assert client.get('/api/search', query_string={'min_size': 'big'}, headers=auth_headers).status_code == 400
+    assert client.get('/api/search', query_string={'folder': 'nope'}, headers=auth_headers).status_code == 404
+
+
+def test_filters_are_served_by_indexes(app, db, test_user):
+    from werkzeug.datastructures import MultiDict
+    from src.models import File
+    from src.routes.search import _filters
+    folder = File(name='root', is_folder=True, owner_id=test_user, icon='folder', icon_color='x')
+    db.session.add(folder)
+    db.session.commit()
+
+    combinations = [
+        ({'folder': folder.id}, 'ix_file_search_path'),
+        ({'min_size': '10', 'max_size': '20'}, 'ix_file_search_size'),
+        ({'modified_after': '2024-01-01'}, 'ix_file_search_updated'),
+        ({'created_after': '2024-01-01', 'created_before': '2024-02-01'}, 'ix_file_search_created'),
+        ({'starred': 'true'}, 'ix_file_search_starred'),
+        ({'locked': 'true'}, 'ix_file_search_locked'),
+        ({'type': 'image'}, 'ix_file_search_mime'),
+        ({'owner': 'others'}, 'ix_shared_file_with'),
+        ({'folder': folder.id, 'min_size': '10'}, 'ix_file_search_'),
+        ({'starred': 'true', 'modified_after': '2024-01-01'}, 'ix_file_search_starred'),
+    ]
+    for args, index in combinations:
+        label = ' + '.join(args)
+        criteria, error = _filters(MultiDict(args), test_user)
+        assert error is None
+        stmt = db.select(File.id).where(*criteria).order_by(File.updated_at.desc()).limit(30)
+        sql = str(stmt.compile(db.engine, compile_kwargs={'literal_binds': True}))
+        plan = ' | '.join(row[-1] for row in db.session.execute(text('EXPLAIN QUERY PLAN ' + sql)))
+        assert 'SCAN file' not in plan.replace('SCAN file_', ''), f'{label}: {plan}'
+        assert index in plan, f'{label}: {plan}'
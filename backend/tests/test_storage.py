@@ -0,0 +1,59 @@
+import io
+from PIL import Image
+from src.extensions import db
+from src.models import StorageUsage, User
+
+
+def _png():
+    buf = io.BytesIO()
+    Image.new('RGB', (40, 30), (30, 120, 200)).save(buf, 'PNG')
+    return buf.getvalue()
+
+
+def _usage(user_id):
+    rows = StorageUsage.query.filter_by(user_id=user_id).all()
+    return {r.category: (r.files, r.bytes) for r in rows if r.files}
+
+
+def _breakdown(client, auth_headers):
+    body = client.get('/api/user/storage', headers=auth_headers).get_json()
+    return body['used'], {b['type']: b['size'] for b in body['breakdown']}
+
+
+def test_counters_follow_upload_copy_and_purge(client, auth_headers, test_user, upload):
+    png = _png()
+    image = upload('photo.png', png)
+    doc = upload('notes.txt', b'0123456789')
+    client.post(f'/api/files/{doc}/copy', json={}, headers=auth_headers)
+    assert _usage(test_user) == {'Images': (1, len(png)), 'Documents': (2, 20)}
+
+    used, sizes = _breakdown(client, auth_headers)
+    assert used == len(png) + 20
+    assert sizes == {'Images': len(png), 'Videos': 0, 'Documents': 20, 'Spreadsheets': 0, 'Other': 0}
+
+    # Trashed files still take up quota; purging releases them
+    client.delete(f'/api/files/{doc}', headers=auth_headers)
+    assert _usage(test_user)['Documents'] == (2, 20)
+    client.delete(f'/api/trash/{doc}', headers=auth_headers)
+    assert _usage(test_user) == {'Images': (1, len(png)), 'Documents': (1, 10)}
+
+    client.delete(f'/api/files/{image}', headers=auth_headers)
+    client.delete('/api/trash', headers=auth_headers)
+    assert _usage(test_user) == {'Documents': (1, 10)}
+    assert _breakdown(client, auth_headers) == (10, {'Images': 0, 'Videos': 0, 'Documents': 10,
+                                                     'Spreadsheets': 0, 'Other': 0})
+
+
+def test_reconcile_reports_and_repairs_drift(app, client, auth_headers, test_user, upload):
+    upload('notes.txt', b'0123456789')
+    runner = app.test_cli_runner()
+    assert '0 users out of date' in runner.invoke(args=['reconcile-storage']).output
+
+    db.session.get(StorageUsage, (test_user, 'Documents')).bytes = 999
+    db.session.get(User, test_user).storage_used = 5
+    db.session.commit()
+    output = runner.invoke(args=['reconcile-storage', '--repair']).output
+    assert f'drift: {test_user}' in output
+    assert '1 users out of date, repaired' in output
+    assert _usage(test_user) == {'Documents': (1, 10)}
+    assert db.session.get(User, test_user).storage_used == 10
@@ -0,0 +1,44 @@
+from src import suggest
+
+
+def _suggest(client, auth_headers, q, limit=8):
+    res = client.get('/api/search/suggest', query_string={'q': q, 'limit': limit}, headers=auth_headers)
+    assert res.status_code == 200
+    return [s['name'] for s in res.get_json()['suggestions']]
+
+
+def test_prefix_and_word_completions(client, auth_headers, upload):
+    for name in ('Budget 2024.txt', 'budget-notes.txt', 'q3_budget.txt', 'receipts.txt'):
+        upload(name)
+    assert _suggest(client, auth_headers, 'bud') == ['Budget 2024.txt', 'budget-notes.txt', 'q3_budget.txt']
+    assert _suggest(client, auth_headers, 'not') == ['budget-notes.txt']
+    assert _suggest(client, auth_headers, 'bud', limit=1) == ['Budget 2024.txt']
+    assert _suggest(client, auth_headers, 'zzz') == []
+
+
+def test_index_follows_create_rename_and_trash(client, auth_headers, upload):
+    file_id = upload('draft.txt')
+    assert _suggest(client, auth_headers, 'dr') == ['draft.txt']  # built here
+
+    folder = client.post('/api/drive/folders', json={'name': 'Drawings'}, headers=auth_headers)
+    assert _suggest(client, auth_headers, 'dr') == ['draft.txt', 'Drawings']
+
+    client.put(f'/api/files/{file_id}/rename', json={'name': 'final.txt'}, headers=auth_headers)
+    assert _suggest(client, auth_headers, 'dr') == ['Drawings']
+    assert _suggest(client, auth_headers, 'fin') == ['final.txt']
+
+    client.delete(f"/api/files/{folder.get_json()['id']}", headers=auth_headers)
+    assert _suggest(client, auth_headers, 'dr') == []
+    client.post(f"/api/trash/{folder.get_json()['id']}/restore", headers=auth_headers)
+    assert _suggest(client, auth_headers, 'dr') == ['Drawings']
+
+
+def test_cache_evicts_least_recently_used(app):
+    cache = suggest.SuggestCache()
+    small = suggest._UserIndex(suggest._entries('1', 'a.txt', False), 0)
+    for owner_id in ('u1', 'u2', 'u3'):
+        cache._users[owner_id] = small
+        cache._size += small.size
+    cache._users.move_to_end('u1')
+    cache._evict(small.size * 2, keep='u1')
+    assert list(cache._users) == ['u3', 'u1']
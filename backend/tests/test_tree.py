@@ -0,0 +1,272 @@
+import io
+from sqlalchemy import text
+from src.extensions import db
+from src.models import File
+
+
+def _chain(new_folder, depth, prefix='level'):
+    ids = []
+    parent_id = None
+    for i in range(depth):
+        parent_id = new_folder(f'{prefix} {i}', parent_id)
+        ids.append(parent_id)
+    return ids
+
+
+def test_paths_follow_parents(new_folder):
+    a, b, c = _chain(new_folder, 3)
+    assert db.session.get(File, c).path == f'/{a}/{b}/{c}/'
+
+
+def test_breadcrumbs_and_details_do_not_walk_parents(client, auth_headers, statements, new_folder):
+    ids = _chain(new_folder, 15)
+    short = _chain(new_folder, 2, 'short')
+    db.session.expire_all()
+
+    with statements() as deep:
+        res = client.get(f'/api/drive/contents?parent_id={ids[-1]}', headers=auth_headers)
+    crumbs = res.get_json()['breadcrumbs']
+    assert [c['id'] for c in crumbs] == [None] + ids
+
+    db.session.expire_all()
+    with statements() as shallow:
+        client.get(f'/api/drive/contents?parent_id={short[-1]}', headers=auth_headers)
+    assert deep.count == shallow.count
+
+    res = client.get(f'/api/files/{ids[-1]}', headers=auth_headers)
+    assert res.get_json()['path'] == '/My Drive/' + '/'.join(f'level {i}' for i in range(14))
+
+
+def test_move_rewrites_subtree_and_rejects_cycles(client, auth_headers, new_folder):
+    a, b, c = _chain(new_folder, 3)
+    other = new_folder('Other')
+
+    res = client.post(f'/api/files/{a}/move', json={'destination_id': c}, headers=auth_headers)
+    assert res.status_code == 400
+
+    res = client.post(f'/api/files/{b}/move', json={'destination_id': other}, headers=auth_headers)
+    assert res.status_code == 200
+    db.session.expire_all()
+    assert db.session.get(File, b).path == f'/{other}/{b}/'
+    assert db.session.get(File, c).path == f'/{other}/{b}/{c}/'
+    assert db.session.get(File, a).path == f'/{a}/'
+
+
+def test_restore_into_trashed_folder_goes_to_root(client, auth_headers, new_folder):
+    a, b = _chain(new_folder, 2)
+    client.delete(f'/api/files/{b}', headers=auth_headers)
+    client.delete(f'/api/files/{a}', headers=auth_headers)
+
+    res = client.post(f'/api/trash/{b}/restore', headers=auth_headers)
+    assert res.status_code == 200
+    db.session.expire_all()
+    restored = db.session.get(File, b)
+    assert restored.parent_id is None
+    assert restored.path == f'/{b}/'
+
+
+def _project(new_folder, upload, width):
+    root = new_folder('Project')
+    for i in range(width):
+        sub = new_folder(f'part {i}', root)
+        upload(f'a{i}.txt', b'same bytes\n', sub)
+        upload(f'b{i}.txt', f'unique {i}\n'.encode(), sub)
+    return root
+
+
+def test_subtree_trash_restore_purge_are_set_based(client, auth_headers, test_user, statements, upload, new_folder):
+    from src.models import Blob, User
+    small = _project(new_folder, upload, 1)
+    client.delete(f'/api/files/{small}', headers=auth_headers)
+    client.delete(f'/api/trash/{small}', headers=auth_headers)
+    db.session.get(User, test_user).storage_used = 0
+    db.session.commit()
+
+    root = _project(new_folder, upload, 6)
+    total = db.session.get(User, test_user).storage_used
+    db.session.expire_all()
+
+    with statements() as trash:
+        assert client.delete(f'/api/files/{root}', headers=auth_headers).status_code == 200
+    assert File.query.filter_by(owner_id=test_user, is_trashed=False).count() == 0
+    assert trash.count < 10
+
+    assert client.post(f'/api/trash/{root}/restore', headers=auth_headers).status_code == 200
+    assert File.query.filter_by(owner_id=test_user, is_trashed=True).count() == 0
+
+    client.delete(f'/api/files/{root}', headers=auth_headers)
+    db.session.expire_all()
+    with statements() as purge:
+        res = client.delete(f'/api/trash/{root}', headers=auth_headers)
+    assert res.get_json()['freed'] == total
+    assert purge.count < 20
+    db.session.expire_all()
+    assert File.query.filter_by(owner_id=test_user).count() == 0
+    assert Blob.query.count() == 0
+    assert db.session.get(User, test_user).storage_used == 0
+
+
+def _rollups(file_id):
+    f = db.session.get(File, file_id)
+    db.session.refresh(f)
+    return f.child_count, f.tree_file_count, f.tree_size
+
+
+def test_folder_rollups_follow_every_change(app, client, auth_headers, upload, new_folder):
+    a, b = _chain(new_folder, 2)
+    other = new_folder('Other')
+    upload('one.txt', b'12345', b)
+    upload('two.txt', b'1234567890', a)
+    assert _rollups(a) == (2, 2, 15)
+    assert _rollups(b) == (1, 1, 5)
+
+    client.post(f'/api/files/{b}/move', json={'destination_id': other}, headers=auth_headers)
+    assert _rollups(a) == (1, 1, 10)
+    assert _rollups(other) == (1, 1, 5)
+
+    client.delete(f'/api/files/{b}', headers=auth_headers)
+    assert _rollups(other) == (0, 0, 0)
+    client.post(f'/api/trash/{b}/restore', headers=auth_headers)
+    assert _rollups(other) == (1, 1, 5)
+
+    listing = client.get('/api/drive/contents', headers=auth_headers).get_json()
+    by_name = {f['name']: f for f in listing['folders']}
+    assert by_name['Other']['items_count'] == 1
+    assert by_name['Other']['size'] == 5
+
+    runner = app.test_cli_runner()
+    assert '0 folders out of date' in runner.invoke(args=['verify-rollups']).output
+    db.session.get(File, other).tree_size = 999
+    db.session.commit()
+    assert '1 folders out of date, repaired' in runner.invoke(args=['verify-rollups', '--repair']).output
+    assert _rollups(other) == (1, 1, 5)
+
+
+def test_bookkeeping_keeps_modified_times(client, auth_headers, upload, new_folder):
+    from datetime import datetime
+    a, b = _chain(new_folder, 2)
+    inner = upload('inner.txt', b'12345', parent_id=b)
+    other = new_folder('Other')
+    old = datetime(2020, 1, 1)
+    File.query.filter(File.id.in_([a, b, inner, other])).update({'updated_at': old}, synchronize_session=False)
+    db.session.commit()
+
+    upload('new.txt', b'123', parent_id=b)
+    client.post(f'/api/files/{b}/move', json={'destination_id': other}, headers=auth_headers)
+    db.session.expire_all()
+    assert [db.session.get(File, i).updated_at for i in (a, inner, other)] == [old] * 3
+    assert db.session.get(File, b).updated_at > old
+
+
+def test_new_items_need_a_live_folder_of_the_owner(client, auth_headers, upload, new_folder):
+    from werkzeug.security import generate_password_hash
+    from src.models import User
+    stranger = User(first_name='O', last_name='U', email='other@cloudspace.test', password_hash=generate_password_hash('x'))
+    db.session.add(stranger)
+    db.session.flush()
+    foreign = File(name='Theirs', is_folder=True, owner_id=stranger.id, icon='folder', icon_color='x')
+    db.session.add(foreign)
+    db.session.commit()
+    foreign_id = foreign.id
+    trashed = new_folder('Binned')
+    client.delete(f'/api/files/{trashed}', headers=auth_headers)
+    own = upload('mine.txt', b'12345')
+
+    for parent_id in (foreign_id, trashed, 'missing'):
+        data = {'file': (io.BytesIO(b'12345'), 'probe.txt'), 'parent_id': parent_id}
+        res = client.post('/api/files/upload', headers=auth_headers, data=data, content_type='multipart/form-data')
+        assert res.status_code == 404
+        res = client.post('/api/drive/folders', json={'name': 'Probe', 'parent_id': parent_id}, headers=auth_headers)
+        assert res.status_code == 404
+        res = client.post(f'/api/files/{own}/copy', json={'destination_id': parent_id}, headers=auth_headers)
+        assert res.status_code == 404
+        res = client.post('/api/files/uploads', json={'name': 'probe.txt', 'size': 5, 'parent_id': parent_id},
+                          headers=auth_headers)
+        assert res.status_code == 404
+    assert _rollups(foreign_id) == (0, 0, 0)
+    assert _rollups(trashed) == (0, 0, 0)
+
+
+def test_chunked_commit_rechecks_the_folder(client, auth_headers, new_folder):
+    folder = new_folder('Target')
+    session = client.post('/api/files/uploads', json={'name': 'late.txt', 'size': 5, 'parent_id': folder},
+                          headers=auth_headers).get_json()
+    client.put(f'/api/files/uploads/{session["id"]}', data=b'12345',
+               headers={**auth_headers, 'Content-Range': 'bytes 0-4/5'})
+    client.delete(f'/api/files/{folder}', headers=auth_headers)
+    res = client.post(f'/api/files/uploads/{session["id"]}/commit', headers=auth_headers)
+    assert res.status_code == 404
+    assert _rollups(folder) == (0, 0, 0)
+
+
+def test_listing_counts_need_no_query_per_folder(client, auth_headers, statements, new_folder):
+    for i in range(8):
+        new_folder(f'folder {i}')
+    db.session.expire_all()
+    with statements() as many:
+        client.get('/api/drive/contents', headers=auth_headers)
+
+    root = new_folder('Solo')
+    new_folder('only child', root)
+    db.session.expire_all()
+    with statements() as one:
+        client.get(f'/api/drive/contents?parent_id={root}', headers=auth_headers)
+    assert many.count <= one.count
+
+
+def test_folder_tree_is_one_query_and_depth_limited(client, auth_headers, statements, new_folder):
+    a, b, c = _chain(new_folder, 3, 'tree')
+    other = new_folder('tree side', a)
+    client.post('/api/files/upload', data={'file': (io.BytesIO(b'x'), 'note.txt'), 'parent_id': a},
+                headers=auth_headers, content_type='multipart/form-data')
+
+    db.session.expire_all()
+    with statements() as q:
+        res = client.get(f'/api/drive/tree?root={a}', headers=auth_headers)
+    assert q.count <= 4  # auth, version, root path, tree
+    folders = res.get_json()['folders']
+    assert [f['id'] for f in folders][0] == a
+    assert {f['id']: f['parent_id'] for f in folders} == {a: folders[0]['parent_id'], b: a, c: b, other: a}
+
+    res = client.get(f'/api/drive/tree?root={a}&depth=1', headers=auth_headers)
+    nodes = {f['id']: f for f in res.get_json()['folders']}
+    assert set(nodes) == {a, b, other}
+    assert nodes[b]['has_children'] and not nodes[other]['has_children']
+
+    top = client.get('/api/drive/tree?depth=1', headers=auth_headers).get_json()['folders']
+    assert a in {f['id'] for f in top} and all(f['parent_id'] is None for f in top)
+
+
+def test_folder_tree_version_changes_with_structure(client, auth_headers, new_folder):
+    a, b = _chain(new_folder, 2, 'versioned')
+    res = client.get('/api/drive/tree', headers=auth_headers)
+    etag = res.headers['ETag']
+    assert client.get('/api/drive/tree', headers={**auth_headers, 'If-None-Match': etag}).status_code == 304
+
+    # Files do not affect the tree
+    client.post('/api/files/upload', data={'file': (io.BytesIO(b'x'), 'note.txt'), 'parent_id': b},
+                headers=auth_headers, content_type='multipart/form-data')
+    assert client.get('/api/drive/tree', headers={**auth_headers, 'If-None-Match': etag}).status_code == 304
+
+    changes = [
+        lambda: client.put(f'/api/files/{b}/rename', json={'name': 'renamed'}, headers=auth_headers),
+        lambda: client.post(f'/api/files/{b}/move', json={'destination_id': None}, headers=auth_headers),
+        lambda: client.delete(f'/api/files/{b}', headers=auth_headers),
+        lambda: client.post(f'/api/trash/{b}/restore', headers=auth_headers),
+    ]
+    for change in changes:
+        assert change().status_code == 200
+        res = client.get('/api/drive/tree', headers={**auth_headers, 'If-None-Match': etag})
+        assert res.status_code == 200
+        etag = res.headers['ETag']
+
+
+def test_folder_tree_is_a_covering_index_scan(db):
+    for subtree in ('', "AND path >= '/a/' AND path < '/a0' "):
+        plan = db.session.execute(text(
+            'EXPLAIN QUERY PLAN SELECT id, parent_id, name FROM file '
+            f'WHERE owner_id = :o AND is_folder = 1 AND is_trashed = 0 {subtree}ORDER BY path'
+        ), {'o': 'x'}).fetchall()
+        detail = ' '.join(row[-1] for row in plan)
+        assert 'COVERING INDEX ix_file_folder_tree' in detail
+        assert 'TEMP B-TREE' not in detail
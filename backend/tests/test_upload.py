@@ -57,3 +57,93 @@ def test_download_not_found(client, auth_headers):
     """GET /api/files/<bad-id>/download → 404."""
     res = client.get('/api/files/00000000-0000-0000-0000-000000000000/download', headers=auth_headers)
     assert res.status_code == 404
+
+
+def test_upload_stores_exact_bytes_and_digest(client, auth_headers):
+    """The single-pass ingest writes the body once and reports its SHA-256."""
+    import hashlib
+    content = b'line of text\n' * 1000
+    data = {'file': (io.BytesIO(content), 'lines.txt'), 'parent_id': 'null'}
+    res = client.post('/api/files/upload', headers=auth_headers, data=data, content_type='multipart/form-data')
+    assert res.status_code == 201
+    body = res.get_json()
+    assert body['size'] == len(content)
+    assert body['sha256'] == hashlib.sha256(content).hexdigest()
+
+    res = client.get(f"/api/files/{body['id']}/download", headers=auth_headers)
+    assert res.data == content
+
+
+def test_upload_over_max_size_leaves_no_file(client, auth_headers, app, test_user, monkeypatch):
+    """A body over MAX_FILE_SIZE is rejected mid-stream and the temp file removed."""
+    import os
+    from src.routes import files
+    monkeypatch.setattr(files, 'MAX_FILE_SIZE', 1024)
+    data = {'file': (io.BytesIO(b'x' * 4096), 'big.txt')}
+    res = client.post('/api/files/upload', headers=auth_headers, data=data, content_type='multipart/form-data')
+    assert res.status_code == 413
+
+    user_dir = os.path.join(app.config['UPLOAD_FOLDER'], 'files', test_user)
+    leftovers = [n for n in os.listdir(user_dir) if n.endswith('.part')] if os.path.isdir(user_dir) else []
+    assert leftovers == []
+
+
+def test_upload_over_quota_rejected_before_body(client, auth_headers, test_user):
+    """A user already at quota gets 413 without the body being consumed."""
+    from src.models import User
+    from src.extensions import db
+    user = db.session.get(User, test_user)
+    user.storage_used = user.storage_limit
+    db.session.commit()
+
+    data = {'file': (io.BytesIO(b'hello'), 'hello.txt')}
+    res = client.post('/api/files/upload', headers=auth_headers, data=data, content_type='multipart/form-data')
+    assert res.status_code == 413
+
+
+def test_upload_preflight(client, auth_headers):
+    res = client.post('/api/files/upload/preflight', json={'name': 'a.txt', 'size': 10}, headers=auth_headers)
+    assert res.status_code == 200
+    assert res.get_json()['ok'] is True
+
+    res = client.post('/api/files/upload/preflight', json={'name': 'a.txt', 'size': 200 * 1024 * 1024},
+                      headers=auth_headers)
+    assert res.status_code == 413
+
+    res = client.post('/api/files/upload/preflight', json={'name': 'a.exe', 'size': 10}, headers=auth_headers)
+    assert res.status_code == 400
+
+
+def test_details_reads_persisted_sha1(client, auth_headers):
+    """The details endpoint returns the checksum recorded at upload time."""
+    import hashlib
+    content = b'checksum me\n'
+    data = {'file': (io.BytesIO(content), 'sum.txt')}
+    file_id = client.post('/api/files/upload', headers=auth_headers, data=data,
+                          content_type='multipart/form-data').get_json()['id']
+
+    res = client.get(f'/api/files/{file_id}', headers=auth_headers)
+    assert res.status_code == 200
+    assert res.get_json()['sha1'] == hashlib.sha1(content).hexdigest()
+
+
+def test_fill_checksums_command(app, client, auth_headers):
+    """Files stored before checksums were persisted get them from the CLI."""
+    import hashlib
+    from src.extensions import db
+    from src.models import File
+    content = b'legacy file\n'
+    data = {'file': (io.BytesIO(content), 'old.txt')}
+    file_id = client.post('/api/files/upload', headers=auth_headers, data=data,
+                          content_type='multipart/form-data').get_json()['id']
+    from datetime import datetime
+    f = db.session.get(File, file_id)
+    f.sha1 = None
+    f.updated_at = datetime(2020, 1, 1)
+    db.session.commit()
+
+    result = app.test_cli_runner().invoke(args=['fill-checksums'])
+    assert '1 files checked' in result.output
+    f = db.session.get(File, file_id)
+    assert f.sha1 == hashlib.sha1(content).hexdigest()
+    assert f.updated_at == datetime(2020, 1, 1)
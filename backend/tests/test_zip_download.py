@@ -0,0 +1,29 @@
+import io
+import zipfile
+
+
+def test_folder_zip_streams_whole_subtree(client, auth_headers, upload, new_folder):
+    root = new_folder('Project')
+    sub = new_folder('Assets', root)
+    upload('readme.txt', b'top level notes\n', root)
+    upload('data.json', b'{"nested": true}', sub)
+
+    res = client.get(f'/api/files/{root}/download-zip', headers=auth_headers)
+    assert res.status_code == 200
+    assert res.mimetype == 'application/zip'
+    assert not res.is_sequence  # streamed, not buffered
+
+    zf = zipfile.ZipFile(io.BytesIO(res.get_data()))
+    assert sorted(zf.namelist()) == ['Project/Assets/data.json', 'Project/readme.txt']
+    assert zf.read('Project/Assets/data.json') == b'{"nested": true}'
+
+
+def test_selection_zip(client, auth_headers, upload):
+    a = upload('a.txt', b'first file\n')
+    b = upload('b.txt', b'second file\n')
+
+    res = client.post('/api/files/download-zip', json={'ids': [a, b]}, headers=auth_headers)
+    assert res.status_code == 200
+    zf = zipfile.ZipFile(io.BytesIO(res.get_data()))
+    assert sorted(zf.namelist()) == ['a.txt', 'b.txt']
+    assert zf.testzip() is None
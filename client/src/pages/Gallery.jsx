@@ -2,7 +2,7 @@ import { useState, useEffect, useRef } from 'react'
 import { apiFetch } from '../lib/api'
 
 function PhotoCard({ photo, gridSize, onClick }) {
-  const imgUrl = `/api/files/${photo.id}/download?inline=true`
+  const imgUrl = photo.thumbnail_url || photo.media_url
 
   return (
     <div
@@ -36,7 +36,7 @@ function PhotoCard({ photo, gridSize, onClick }) {
 
 function Lightbox({ photo, onClose, onPrev, onNext }) {
   if (!photo) return null
-  const imgUrl = `/api/files/${photo.id}/download?inline=true`
+  const imgUrl = photo.media_url
 
   return (
     <div className="fixed inset-0 z-50 bg-black/80 backdrop-blur-sm flex items-center justify-center" onClick={onClose}>
@@ -93,7 +93,7 @@ const gridSizes = {
 }
 
 function MosaicCard({ photo, onClick }) {
-  const imgUrl = `/api/files/${photo.id}/download?inline=true`
+  const imgUrl = photo.thumbnail_url || photo.media_url
   return (
     <div
       onClick={() => onClick(photo)}
@@ -4,14 +4,13 @@ import { apiFetch } from '../lib/api'
 export default function History() {
   const [groups, setGroups] = useState([])
   const [loading, setLoading] = useState(true)
-  const [page, setPage] = useState(1)
-  const [hasMore, setHasMore] = useState(false)
+  const [cursor, setCursor] = useState(null)
   const [loadingMore, setLoadingMore] = useState(false)
 
-  const fetchPage = useCallback((p, append = false) => {
+  const fetchPage = useCallback((after, append = false) => {
     const setter = append ? setLoadingMore : setLoading
     setter(true)
-    apiFetch(`/api/activity/history?page=${p}`)
+    apiFetch(`/api/activity/history${after ? `?cursor=${encodeURIComponent(after)}` : ''}`)
       .then(r => r.json())
       .then(data => {
         if (append) {
@@ -30,18 +29,14 @@ export default function History() {
         } else {
           setGroups(data.groups || [])
         }
-        setHasMore(data.has_more || false)
+        setCursor(data.next_cursor || null)
       })
       .finally(() => setter(false))
   }, [])
 
-  useEffect(() => { fetchPage(1) }, [fetchPage])
+  useEffect(() => { fetchPage(null) }, [fetchPage])
 
-  const loadMore = () => {
-    const next = page + 1
-    setPage(next)
-    fetchPage(next, true)
-  }
+  const loadMore = () => fetchPage(cursor, true)
 
   return (
     <div className="flex-1 overflow-y-auto p-6">
@@ -101,7 +96,7 @@ export default function History() {
         ))}
       </div>
 
-      {hasMore && (
+      {cursor && (
         <div className="mt-8 flex justify-center pb-8">
           <button
             onClick={loadMore}
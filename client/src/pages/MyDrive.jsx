@@ -435,7 +435,7 @@ function FolderCard({ folder, onOpen, onAction }) {
 }
 
 function FileCard({ file, onPreview, onAction }) {
-  const token = getAccessToken()
+  const mediaUrl = file.media_url || `/api/files/${file.id}/download?inline=true&token=${getAccessToken()}`
   const isImage = file.has_content && file.mime_type?.startsWith('image/')
   const isVideo = file.has_content && file.mime_type?.startsWith('video/')
   return (
@@ -445,11 +445,11 @@ function FileCard({ file, onPreview, onAction }) {
     >
       <div className={`aspect-[4/3] ${file.icon_bg} rounded-md mb-2 flex items-center justify-center overflow-hidden border border-slate-100 dark:border-border-dark relative`}>
         {isImage ? (
-          <img src={`/api/files/${file.id}/download?inline=true&token=${token}`} alt={file.name} className="w-full h-full object-cover group-hover:scale-105 transition-transform duration-300" />
+          <img src={file.thumbnail_url || mediaUrl} alt={file.name} className="w-full h-full object-cover group-hover:scale-105 transition-transform duration-300" />
         ) : isVideo ? (
           <>
             <VideoThumbnail
-              src={`/api/files/${file.id}/download?inline=true&token=${token}`}
+              src={mediaUrl}
               className="w-full h-full object-cover group-hover:scale-105 transition-transform duration-300"
             />
             <div className="absolute inset-0 flex items-center justify-center bg-black/25 group-hover:bg-black/15 transition-colors">